@@ -8,16 +8,25 @@ from telegram.ext import Application, CommandHandler, ContextTypes, Updater
 import asyncio
 import threading
 from loguru import logger
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 import uvicorn
 from sub import connect_and_subscribe, connect_and_subscribe_task
-from utils.gmgn import follow_wallet, unfollow_wallet, get_following_wallets
+from utils.gmgn_async import follow_wallet, unfollow_wallet, get_following_wallets
 from sub import fetch_valid_token
-from databases.database import create_tables
-from config.conf import bot_token, private_key_dict, access_token_dict, admin_list
+from databases.database import create_tables, close_db
+from utils import metrics
+from config.conf import bot_token, private_key_dict, access_token_dict, admin_list, telegram_base_url, metrics_port, metrics_host
 
 ALLOWED_USER_IDS = admin_list
 
+api = FastAPI()
+
+
+@api.get("/metrics")
+async def get_metrics():
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
+
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     logger.info(f"User {update.effective_user.id} started the bot.")
@@ -36,10 +45,8 @@ async def add_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
             
             not_full_wallet = None
             for self_wallet_address in access_token_dict.keys():
-                access_token = access_token_dict.get(self_wallet_address, None)
-                if access_token is None:
-                    access_token = await fetch_valid_token(wallet_address=self_wallet_address)
-                folling_wallets = get_following_wallets(token=access_token, self_wallet_address=self_wallet_address)
+                access_token = await fetch_valid_token(wallet_address=self_wallet_address)
+                folling_wallets = await get_following_wallets(token=access_token, self_wallet_address=self_wallet_address)
                 if wallet_address in folling_wallets:
                     await update.message.reply_text("Wallet already added. You don't need to add it again.")
                     return
@@ -47,8 +54,8 @@ async def add_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
                 if following_num < 100 and not_full_wallet is None:
                     not_full_wallet = self_wallet_address
 
-            access_token = access_token_dict.get(not_full_wallet, None)
-            result = follow_wallet(wallet_address=wallet_address, self_wallet_address=not_full_wallet, token=access_token)
+            access_token = await fetch_valid_token(wallet_address=not_full_wallet)
+            result = await follow_wallet(wallet_address=wallet_address, self_wallet_address=not_full_wallet, token=access_token)
             await update.message.reply_text(f"Wallet subscribed successfully to wallet address: {not_full_wallet}" if result else "Failed to add wallet.")
         else:  
             await update.message.reply_text('Usage: /add <wallet_address>')  
@@ -65,19 +72,17 @@ async def delete_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             
             followed_by_wallet = None
             for self_wallet_address in access_token_dict.keys():
-                access_token = access_token_dict.get(self_wallet_address, None)
-                if access_token is None:
-                    access_token = await fetch_valid_token(wallet_address=self_wallet_address)
-                folling_wallets = get_following_wallets(token=access_token, self_wallet_address=self_wallet_address)
+                access_token = await fetch_valid_token(wallet_address=self_wallet_address)
+                folling_wallets = await get_following_wallets(token=access_token, self_wallet_address=self_wallet_address)
                 if wallet_address in folling_wallets:
                     followed_by_wallet = self_wallet_address
                     break
             if followed_by_wallet is None:
                 await update.message.reply_text("Wallet not found.")
                 return
-            access_token = access_token_dict.get(followed_by_wallet, None)
+            access_token = await fetch_valid_token(wallet_address=followed_by_wallet)
             
-            result = unfollow_wallet(wallet_address=wallet_address, self_wallet_address=followed_by_wallet, token=access_token)
+            result = await unfollow_wallet(wallet_address=wallet_address, self_wallet_address=followed_by_wallet, token=access_token)
             await update.message.reply_text(f"Wallet removed successfully from wallet address: {followed_by_wallet}" if result else "Failed to remove wallet.")
         else:  
             await update.message.reply_text('Usage: /rm <wallet_address>')  
@@ -89,10 +94,8 @@ async def get_wallet_nums(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if update.effective_user.id in ALLOWED_USER_IDS:  
         args = context.args  
         for wallet_address in access_token_dict.keys():
-            access_token = access_token_dict.get(wallet_address, None)
-            if access_token is None:
-                access_token = await fetch_valid_token(wallet_address=wallet_address)
-            folling_wallets = get_following_wallets(token=access_token, self_wallet_address=wallet_address)
+            access_token = await fetch_valid_token(wallet_address=wallet_address)
+            folling_wallets = await get_following_wallets(token=access_token, self_wallet_address=wallet_address)
             following_num = len(folling_wallets)
             logger.info(f"Wallet {wallet_address} has {following_num} following wallets.")
             await update.message.reply_text(f"Wallet {wallet_address} has {following_num} following wallets.")
@@ -101,7 +104,10 @@ async def get_wallet_nums(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
 
 async def main():
-    application = Application.builder().token(bot_token).build()
+    builder = Application.builder().token(bot_token)
+    if telegram_base_url:
+        builder = builder.base_url(telegram_base_url)
+    application = builder.build()
     
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("add", add_wallet))
@@ -128,6 +134,13 @@ async def main():
 
         # Start the connect_and_subscribe_task concurrently
         connect_and_subscribe = asyncio.create_task(connect_and_subscribe_task(application.bot))
+
+        # Prometheus /metrics
+        metrics_server = None
+        if metrics_port:
+            metrics_server = uvicorn.Server(uvicorn.Config(api, host=metrics_host, port=metrics_port, log_level="warning"))
+            asyncio.create_task(metrics_server.serve())
+            logger.info(f"Serving metrics on http://{metrics_host}:{metrics_port}/metrics")
         
         # Keep the event loop running until you want to shut down
         try:
@@ -136,7 +149,10 @@ async def main():
             await application.updater.stop()
             await application.stop()
             connect_and_subscribe.cancel()  # Cancel the connect and subscribe task
+            if metrics_server is not None:
+                metrics_server.should_exit = True
             await application.shutdown()
+            await close_db()
 
    
 if __name__ == '__main__':
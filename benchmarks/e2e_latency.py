@@ -0,0 +1,338 @@
+"""端到端延迟压测：websocket推送进入 -> Telegram消息发出
+
+启动本地替身服务（benchmarks/fake_upstream.py）、转发服务（gmgn_wallets_signal.py）和消费端
+（sub.connect_and_subscribe_task），按配置的速率推送合成事件，统计每个速率下的
+p50/p95/p99延迟、吞吐量、每个信号的GMGN请求数以及转发服务和消费端的内存，结果写入JSON文件。
+
+    python benchmarks/e2e_latency.py --rates 1,5,20 --duration 60 --profile benchmarks/profiles/flaky.json
+    python benchmarks/e2e_latency.py --rates 5 --compare benchmarks/results/e2e-baseline.json
+
+延迟为替身服务推送事件到收到sendMessage的时间，每个事件使用新的token，并关闭策略过滤（IF_FILTER=0），
+保证每个事件都会产生一条推送。
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+import tempfile
+from datetime import datetime
+
+import base58
+import httpx
+import nacl.signing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+# 替身服务中属于gmgn的接口，用于统计每个信号的gmgn请求数
+GMGN_ENDPOINTS = {
+    "login_nonce",
+    "login",
+    "gas_price",
+    "token_info",
+    "kline",
+    "trades",
+    "follow",
+    "following_wallets",
+    "tag_wallet_count",
+    "rank",
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def fake_accounts(count):
+    """生成压测用的钱包，替身服务不校验签名"""
+    private_keys, addresses = [], []
+    for _ in range(count):
+        signing_key = nacl.signing.SigningKey.generate()
+        verify_key = bytes(signing_key.verify_key)
+        private_keys.append(base58.b58encode(bytes(signing_key) + verify_key).decode())
+        addresses.append(base58.b58encode(verify_key).decode())
+    return private_keys, addresses
+
+
+def bench_env(fake_port, relay_port, accounts, workers):
+    private_keys, addresses = fake_accounts(accounts)
+    base = f"127.0.0.1:{fake_port}"
+    env = dict(os.environ)
+    env.update(
+        {
+            "GMGN_API_BASE": f"http://{base}",
+            "GMGN_WS_URL": f"ws://{base}/stream",
+            "DBOT_API_BASE": f"http://{base}",
+            "TELEGRAM_BASE_URL": f"http://{base}/bot",
+            "TELEGRAM_BOT_TOKEN": "123456:fake",
+            "CHANNEL_ID": "-1001",
+            "ADMIN_LIST": "1",
+            "TIMEZONE": os.getenv("TIMEZONE", "Asia/Shanghai"),
+            "PRIVATE_KEY_BASE58_LIST": ",".join(private_keys),
+            "WALLET_ADDRESS_LIST": ",".join(addresses),
+            "WALLET_SIGNAL_SERVER": "127.0.0.1",
+            "WALLET_SIGNAL_PORT": str(relay_port),
+            "IF_FILTER": "0",
+            "REPEAT_PUSH": "1",
+            "TRADE_TYPE": "-1",
+            "SHADOW_STRATEGIES": "",
+            "CAPTURE_DIR": "",
+            "TOKEN_CACHE_FILE": "",
+            "PYTHONUNBUFFERED": "1",
+        }
+    )
+    if workers:
+        env["ENRICH_WORKERS"] = str(workers)
+    return env
+
+
+def process_memory(pid):
+    """进程当前的常驻内存和峰值（MB），从/proc读取，非Linux返回None"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return None
+    return {
+        "rss_mb": round(int(fields["VmRSS"].split()[0]) / 1024, 1),
+        "peak_rss_mb": round(int(fields["VmHWM"].split()[0]) / 1024, 1),
+    }
+
+
+def percentile(values, q):
+    """线性插值的分位数，q为0~100"""
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def summarize(rate, duration, stats, started_at, processes):
+    """根据替身服务的统计计算单个速率的结果"""
+    messages = [message for message in stats["messages"] if message["latency"] is not None]
+    latencies = [message["latency"] * 1000 for message in messages]
+    endpoints = stats["endpoints"]
+    gmgn_calls = sum(item["requests"] for name, item in endpoints.items() if name in GMGN_ENDPOINTS)
+    delivered = len(messages)
+    elapsed = max(message["received_at"] for message in messages) - started_at if messages else 0
+    return {
+        "rate": rate,
+        "duration": duration,
+        "events": stats["events"],
+        "delivered": delivered,
+        "lost": stats["events"] - delivered,
+        "throughput": round(delivered / elapsed, 3) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "mean": sum(latencies) / delivered if delivered else None,
+            "max": max(latencies) if latencies else None,
+        },
+        "gmgn_calls": gmgn_calls,
+        "gmgn_calls_per_signal": round(gmgn_calls / delivered, 3) if delivered else None,
+        "endpoints": endpoints,
+        "memory": {name: process_memory(process.pid) for name, process in processes.items()},
+    }
+
+
+class Bench:
+    """压测用到的子进程和替身服务的管理接口"""
+
+    def __init__(self, args):
+        self.args = args
+        self.fake_port = free_port()
+        self.relay_port = free_port()
+        self.env = bench_env(self.fake_port, self.relay_port, args.accounts, args.workers)
+        self.fake_url = f"http://127.0.0.1:{self.fake_port}"
+        self.log_dir = args.log_dir or tempfile.mkdtemp(prefix="e2e-latency-")
+        os.makedirs(self.log_dir, exist_ok=True)
+        self.processes = {}
+        self.client = httpx.AsyncClient(base_url=self.fake_url, timeout=30)
+
+    def spawn(self, name, command):
+        log = open(os.path.join(self.log_dir, f"{name}.log"), "w")
+        self.processes[name] = subprocess.Popen(command, cwd=ROOT, env=self.env, stdout=log, stderr=subprocess.STDOUT)
+
+    def start(self):
+        fake = [sys.executable, "benchmarks/fake_upstream.py", "--port", str(self.fake_port), "--unique-tokens"]
+        fake += ["--history-trades", str(self.args.history_trades)]
+        if self.args.profile:
+            fake += ["--profile", self.args.profile]
+        self.spawn("fake", fake)
+        self.spawn("relay", [sys.executable, "gmgn_wallets_signal.py"])
+        self.spawn("consumer", [sys.executable, "benchmarks/e2e_latency.py", "--consumer"])
+
+    async def stop(self):
+        await self.client.aclose()
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def check_alive(self):
+        for name, process in self.processes.items():
+            if process.poll() is not None:
+                raise RuntimeError(f"{name} exited with code {process.returncode}, see {self.log_dir}/{name}.log")
+
+    async def stats(self):
+        return (await self.client.get("/_fake/stats")).json()
+
+    async def wait_ready(self, timeout=60):
+        """等待转发服务所有账号订阅上游，并且消费端能收到推送"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            self.check_alive()
+            try:
+                if (await self.stats())["streams"] >= self.args.accounts:
+                    break
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+        else:
+            raise RuntimeError(f"Relay did not subscribe in {timeout}s, see {self.log_dir}")
+        while time.time() < deadline:
+            self.check_alive()
+            await self.client.post("/_fake/emit")
+            await asyncio.sleep(1)
+            if any(message["latency"] is not None for message in (await self.stats())["messages"]):
+                return
+        raise RuntimeError(f"Consumer did not deliver in {timeout}s, see {self.log_dir}")
+
+    async def run_rate(self, rate):
+        """按rate（事件/秒）推送duration秒，等待处理完成后返回结果"""
+        await self.client.post("/_fake/reset")
+        # 速率较高时每个tick批量推送，减少管理接口的请求数
+        tick = max(1 / rate, 0.05)
+        per_tick = rate * tick
+        started_at = time.time()
+        start = time.perf_counter()
+        emitted = 0
+        while time.perf_counter() - start < self.args.duration:
+            due = int((time.perf_counter() - start) / tick * per_tick) + 1 - emitted
+            if due > 0:
+                await self.client.post("/_fake/emit", params={"count": due})
+                emitted += due
+            await asyncio.sleep(tick)
+        deadline = time.time() + self.args.drain
+        while time.time() < deadline:
+            self.check_alive()
+            stats = await self.stats()
+            if sum(1 for message in stats["messages"] if message["latency"] is not None) >= stats["events"]:
+                break
+            await asyncio.sleep(0.5)
+        return summarize(rate, self.args.duration, await self.stats(), started_at, self.processes)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def print_run(run, baseline=None):
+    latency = run["latency_ms"]
+    line = (
+        f"rate {run['rate']}/s: delivered {run['delivered']}/{run['events']}, "
+        f"p50 {latency['p50'] or 0:.1f}ms, p95 {latency['p95'] or 0:.1f}ms, p99 {latency['p99'] or 0:.1f}ms, "
+        f"throughput {run['throughput']}/s, gmgn calls/signal {run['gmgn_calls_per_signal']}, "
+        f"memory {run['memory']}"
+    )
+    print(line)
+    if baseline is None:
+        return
+    for key in ("p50", "p95", "p99"):
+        before, after = baseline["latency_ms"][key], latency[key]
+        if before and after:
+            print(f"    {key}: {before:.1f}ms -> {after:.1f}ms ({(after - before) / before:+.1%})")
+
+
+async def run_bench(args):
+    bench = Bench(args)
+    rates = [float(rate) for rate in args.rates.split(",")]
+    print(f"Logs: {bench.log_dir}")
+    bench.start()
+    runs = []
+    try:
+        await bench.wait_ready()
+        for rate in rates:
+            run = await bench.run_rate(rate)
+            runs.append(run)
+            print_run(run)
+    finally:
+        await bench.stop()
+
+    result = {
+        "label": args.label or git_revision(),
+        "git_revision": git_revision(),
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "rates": rates,
+            "duration": args.duration,
+            "accounts": args.accounts,
+            "workers": args.workers,
+            "history_trades": args.history_trades,
+            "profile": json.load(open(args.profile)) if args.profile else {},
+        },
+        "runs": runs,
+    }
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", f"e2e-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {run["rate"]: run for run in json.load(f)["runs"]}
+        print(f"Compared with {args.compare}:")
+        for run in runs:
+            print_run(run, baseline.get(run["rate"], None))
+
+
+async def run_consumer():
+    """消费端子进程：连接本地转发服务，推送发到替身服务的Telegram接口"""
+    from telegram import Bot
+    from config.conf import bot_token, telegram_base_url
+    import sub
+
+    async with Bot(bot_token, base_url=telegram_base_url) as bot:
+        await sub.connect_and_subscribe_task(bot)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端延迟压测：websocket推送 -> Telegram消息")
+    parser.add_argument("--rates", default="1,5,10", help="逗号分隔的推送速率（事件/秒），依次压测")
+    parser.add_argument("--duration", type=float, default=30, help="每个速率推送的时长（秒）")
+    parser.add_argument("--drain", type=float, default=30, help="推送结束后等待处理完成的最长时间（秒）")
+    parser.add_argument("--profile", default=None, help="替身服务的故障配置文件")
+    parser.add_argument("--accounts", type=int, default=2, help="gmgn账号数量（每个账号一个上游连接）")
+    parser.add_argument("--workers", type=int, default=0, help="ENRICH_WORKERS，0表示使用默认值")
+    parser.add_argument("--history-trades", type=int, default=30, help="每个token的交易历史条数")
+    parser.add_argument("--label", default=None, help="结果标签，默认为当前git版本")
+    parser.add_argument("--output", default=None, help="结果JSON文件，默认写入benchmarks/results/")
+    parser.add_argument("--compare", default=None, help="与之前的结果文件比较延迟")
+    parser.add_argument("--log-dir", default=None, help="子进程日志目录，默认为临时目录")
+    parser.add_argument("--consumer", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.consumer:
+        asyncio.run(run_consumer())
+    else:
+        asyncio.run(run_bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,516 @@
+"""GMGN / dbot / Telegram 的本地替身服务，用于离线压测
+
+提供utils/gmgn.py、trade/dbot.py用到的REST接口，gmgn_wallets_signal.py使用的websocket推送（/stream），
+以及Telegram Bot API（/bot{token}/{method}）。每个接口的延迟、错误率和429比例可以单独配置。
+
+    python benchmarks/fake_upstream.py --port 9000 --profile benchmarks/profiles/flaky.json --event-rate 5
+
+然后把bot指向替身服务：
+    GMGN_API_BASE=http://127.0.0.1:9000 GMGN_WS_URL=ws://127.0.0.1:9000/stream
+    DBOT_API_BASE=http://127.0.0.1:9000 TELEGRAM_BASE_URL=http://127.0.0.1:9000/bot
+
+管理接口：POST /_fake/emit 推送事件，GET /_fake/stats 请求统计，GET|POST /_fake/profile 查看/修改故障配置，
+POST /_fake/reset 清空统计。
+"""
+import re
+import json
+import time
+import uuid
+import base64
+import random
+import asyncio
+import argparse
+from collections import deque
+import uvicorn
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
+from loguru import logger
+
+# 未配置的接口使用default，default未配置的字段使用DEFAULT_PROFILE
+DEFAULT_PROFILE = {"latency_ms": 0, "jitter_ms": 0, "error_rate": 0.0, "rate_limit_rate": 0.0, "retry_after": 1}
+
+# 替身服务生成的token地址，推送到Telegram的消息中按该格式找回token，用于计算端到端延迟
+TOKEN_PATTERN = re.compile(r"Fake[0-9a-f]{32}pump")
+
+
+def fake_token_address():
+    return f"Fake{uuid.uuid4().hex}pump"
+
+
+def fake_jwt(ttl=2 * 60 * 60):
+    """未签名的JWT，只用于让token_manager解析过期时间"""
+
+    def encode(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+
+    return f"{encode({'alg': 'none'})}.{encode({'exp': int(time.time() + ttl)})}.fake"
+
+
+class FakeUpstream:
+    """替身服务的状态：故障配置、请求统计、推送的事件以及收到的Telegram消息"""
+
+    def __init__(self, profiles=None, history_trades=30, wallets=10, tokens=20, unique_tokens=False, max_messages=100000):
+        self.profiles = profiles or {}
+        self.history_trades = history_trades
+        self.wallets = [f"Wallet{index:040d}" for index in range(wallets)]
+        self.token_pool = [fake_token_address() for _ in range(tokens)]
+        self.unique_tokens = unique_tokens
+        self.following = set()
+        self.streams = set()
+        self.stats = {}
+        # token -> 最后一次推送的时间
+        self.emitted = {}
+        self.messages = deque(maxlen=max_messages)
+        self.events = 0
+
+    def profile(self, endpoint):
+        return {**DEFAULT_PROFILE, **self.profiles.get("default", {}), **self.profiles.get(endpoint, {})}
+
+    def _count(self, endpoint, key):
+        stats = self.stats.setdefault(endpoint, {"requests": 0, "errors": 0, "rate_limited": 0})
+        stats[key] += 1
+
+    async def inject(self, endpoint, kind="gmgn"):
+        """按接口配置注入延迟和故障，需要返回故障响应时返回该响应，否则返回None"""
+        self._count(endpoint, "requests")
+        profile = self.profile(endpoint)
+        delay = profile["latency_ms"] + random.uniform(0, profile["jitter_ms"])
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        roll = random.random()
+        if roll < profile["rate_limit_rate"]:
+            self._count(endpoint, "rate_limited")
+            return rate_limited_response(kind, profile["retry_after"])
+        if roll < profile["rate_limit_rate"] + profile["error_rate"]:
+            self._count(endpoint, "errors")
+            return error_response(kind)
+        return None
+
+    def reset(self):
+        self.stats = {}
+        self.emitted = {}
+        self.messages.clear()
+        self.events = 0
+
+    def new_activity(self, token_address=None):
+        """生成一条关注钱包的买入推送"""
+        if token_address is None:
+            token_address = fake_token_address() if self.unique_tokens else random.choice(self.token_pool)
+        now = time.time()
+        self.emitted[token_address] = now
+        self.events += 1
+        token = token_data(token_address)
+        return {
+            "event_type": "buy",
+            "wallet_address": random.choice(self.wallets),
+            "token_address": token_address,
+            "token": {
+                "address": token_address,
+                "symbol": token_address[4:8].upper(),
+                "name": f"Fake {token_address[4:8]}",
+                "total_supply": token["total_supply"],
+            },
+            "timestamp": int(now),
+            "price_usd": f"{token['price']:.10f}",
+            "price_change": round(random.uniform(-0.2, 2.0), 4),
+            "cost_usd": round(random.uniform(50, 2000), 2),
+            "is_open_or_close": 1,
+            "tx_hash": uuid.uuid4().hex,
+            "token_amount": str(random.randint(10**5, 10**7)),
+        }
+
+    async def broadcast(self, activities):
+        """推送给所有/stream连接；每个账号一个连接，同一笔交易会推送多次，与gmgn一致"""
+        message = json.dumps({"channel": "following_wallet_activity", "data": activities})
+        for websocket in list(self.streams):
+            try:
+                await websocket.send_text(message)
+            except Exception:
+                self.streams.discard(websocket)
+
+    async def emit(self, count=1, token_address=None):
+        for _ in range(count):
+            await self.broadcast([self.new_activity(token_address)])
+        return count
+
+    async def run_emitter(self, rate):
+        """按固定速率（事件/秒）推送事件"""
+        interval = 1 / rate
+        next_time = time.perf_counter()
+        while True:
+            next_time += interval
+            await self.emit()
+            await asyncio.sleep(max(next_time - time.perf_counter(), 0))
+
+    def record_message(self, chat_id, text):
+        received_at = time.time()
+        match = TOKEN_PATTERN.search(text or "")
+        token_address = match.group(0) if match else None
+        emitted_at = self.emitted.get(token_address, None)
+        self.messages.append(
+            {
+                "chat_id": chat_id,
+                "token_address": token_address,
+                "received_at": received_at,
+                "latency": received_at - emitted_at if emitted_at is not None else None,
+            }
+        )
+        return len(self.messages)
+
+    def summary(self):
+        return {
+            "endpoints": self.stats,
+            "events": self.events,
+            "streams": len(self.streams),
+            "messages": list(self.messages),
+        }
+
+
+def rate_limited_response(kind, retry_after):
+    headers = {"Retry-After": str(retry_after)}
+    if kind == "telegram":
+        content = {
+            "ok": False,
+            "error_code": 429,
+            "description": f"Too Many Requests: retry after {retry_after}",
+            "parameters": {"retry_after": retry_after},
+        }
+    elif kind == "dbot":
+        content = {"err": True, "res": None, "message": "too many requests"}
+    else:
+        content = {"code": 429, "msg": "too many requests"}
+    return JSONResponse(content, status_code=429, headers=headers)
+
+
+def error_response(kind):
+    if kind == "telegram":
+        content = {"ok": False, "error_code": 500, "description": "Internal Server Error"}
+    elif kind == "dbot":
+        content = {"err": True, "res": None, "message": "internal error"}
+    else:
+        content = {"code": 500, "msg": "internal error"}
+    return JSONResponse(content, status_code=500)
+
+
+def token_data(token_address):
+    """按token地址生成固定的token信息，同一个token多次请求结果一致"""
+    rng = random.Random(token_address)
+    now = int(time.time())
+    creation_timestamp = now - rng.randint(60, 6 * 60 * 60)
+    return {
+        "address": token_address,
+        "price": rng.uniform(1e-6, 1e-3),
+        "total_supply": "1000000000",
+        "creation_timestamp": creation_timestamp,
+        "open_timestamp": creation_timestamp + rng.randint(0, 600),
+        "holder_count": rng.randint(10, 5000),
+        "top_10_holder_rate": f"{rng.uniform(0.1, 0.6):.4f}",
+        "pool_info": {"initial_quote_reserve": "79.005359057"},
+        "net_in_volume_1m": round(rng.uniform(-5000, 20000), 2),
+        "net_in_volume_5m": round(rng.uniform(-5000, 50000), 2),
+        "net_in_volume_1h": round(rng.uniform(-5000, 100000), 2),
+        "renounced_mint": 1,
+        "renounced_freeze_account": 1,
+        "burn_ratio": "1",
+        "burn_status": "burn",
+        "dexscr_ad": 0,
+        "dexscr_update_link": 0,
+        "cto_flag": 0,
+    }
+
+
+def trade_history(token_address, wallets, count):
+    """按token地址生成固定的关注钱包交易历史（最新的在前）"""
+    rng = random.Random(f"history-{token_address}")
+    price = token_data(token_address)["price"]
+    now = int(time.time())
+    history = []
+    for index in range(count):
+        event = "buy" if rng.random() < 0.7 else "sell"
+        bought = rng.uniform(1e5, 1e7)
+        sold = rng.uniform(0, bought) if event == "sell" else 0.0
+        history.append(
+            {
+                "maker": rng.choice(wallets),
+                "event": event,
+                "timestamp": now - index * rng.randint(5, 60),
+                "price_usd": f"{price * rng.uniform(0.3, 1.0):.10f}",
+                "balance": f"{bought - sold:.2f}",
+                "history_bought_amount": f"{bought:.2f}",
+                "history_sold_amount": f"{sold:.2f}",
+                "is_open_or_close": 1 if index == count - 1 else 0,
+                "tx_hash": f"{token_address}-{index}",
+                "token_amount": f"{bought:.2f}",
+                "cost_usd": f"{rng.uniform(50, 2000):.2f}",
+            }
+        )
+    return history
+
+
+upstream = FakeUpstream()
+app = FastAPI(title="fake gmgn/dbot/telegram upstream")
+
+
+# ---------------- gmgn ----------------
+
+
+@app.get("/defi/auth/v1/login_nonce")
+async def login_nonce(address: str = ""):
+    if (failure := await upstream.inject("login_nonce")) is not None:
+        return failure
+    return {"code": 0, "msg": "success", "data": {"nonce": uuid.uuid4().hex}}
+
+
+@app.post("/defi/auth/v1/login")
+async def login():
+    if (failure := await upstream.inject("login")) is not None:
+        return failure
+    return {"code": 0, "msg": "success", "data": {"access_token": fake_jwt()}}
+
+
+@app.get("/defi/quotation/v1/chains/{chain}/gas_price")
+async def gas_price(chain: str):
+    if (failure := await upstream.inject("gas_price")) is not None:
+        return failure
+    return {
+        "code": 0,
+        "msg": "success",
+        "data": {"last_block": int(time.time()), "high": "0.001", "average": "0.0005", "low": "0.0001", "eth_usd_price": "150.00"},
+    }
+
+
+@app.get("/defi/quotation/v1/tokens/sol/{token_address}")
+async def token_info(token_address: str):
+    if (failure := await upstream.inject("token_info")) is not None:
+        return failure
+    token = token_data(token_address)
+    token.pop("price")
+    return {"code": 0, "msg": "success", "data": {"token": token}}
+
+
+@app.get("/defi/quotation/v1/tokens/kline/sol/{token_address}")
+async def kline(token_address: str, request: Request):
+    if (failure := await upstream.inject("kline")) is not None:
+        return failure
+    start = int(request.query_params.get("from", 0))
+    end = int(request.query_params.get("to", 0))
+    price = token_data(token_address)["price"]
+    candles = [
+        {"time": str(timestamp * 1000), "open": str(price), "close": str(price), "high": str(price), "low": str(price), "volume": "0"}
+        for timestamp in range(start, end, 60)
+    ][-500:]
+    return {"code": 0, "msg": "success", "data": candles}
+
+
+@app.get("/defi/quotation/v1/trades/{network}/{token_address}")
+async def trades(network: str, token_address: str, limit: int = 100, cursor: str = ""):
+    if (failure := await upstream.inject("trades")) is not None:
+        return failure
+    history = trade_history(token_address, upstream.wallets, upstream.history_trades)
+    offset = int(cursor) if cursor else 0
+    page = history[offset: offset + limit]
+    next_cursor = str(offset + limit) if offset + limit < len(history) else ""
+    return {"code": 0, "msg": "success", "data": {"history": page, "next": next_cursor}}
+
+
+@app.post("/defi/quotation/v1/follow/{network}/{action}")
+async def follow(network: str, action: str, request: Request):
+    if (failure := await upstream.inject("follow")) is not None:
+        return failure
+    payload = await request.json()
+    if action == "follow_wallet":
+        upstream.following.add(payload["address"])
+    elif action == "unfollow_wallet":
+        upstream.following.discard(payload["address"])
+    return {"code": 0, "msg": "success", "data": {}}
+
+
+@app.get("/defi/quotation/v1/follow/{network}/following_wallets")
+async def following_wallets(network: str):
+    if (failure := await upstream.inject("following_wallets")) is not None:
+        return failure
+    followings = [{"address": address} for address in sorted(upstream.following)]
+    return {"code": 0, "msg": "success", "data": {"followings": followings}}
+
+
+@app.get("/defi/quotation/v1/tokens/tag_wallet_count/{network}/{token_address}")
+async def tag_wallet_count(network: str, token_address: str):
+    if (failure := await upstream.inject("tag_wallet_count")) is not None:
+        return failure
+    return {"code": 0, "msg": "success", "data": {"smart_wallets": 0, "fresh_wallets": 0, "renowned_wallets": 0, "sniper_wallets": 0}}
+
+
+@app.get("/defi/quotation/v1/rank/{network}/wallets/{period}")
+async def rank(network: str, period: str):
+    if (failure := await upstream.inject("rank")) is not None:
+        return failure
+    return {"code": 0, "msg": "success", "data": {"rank": [{"wallet_address": address} for address in upstream.wallets]}}
+
+
+@app.websocket("/stream")
+async def stream(websocket: WebSocket):
+    """gmgn推送：客户端发送subscribe后开始接收事件，ping回复pong"""
+    if (failure := await upstream.inject("stream")) is not None:
+        await websocket.close(code=1013)
+        return
+    await websocket.accept()
+    try:
+        while True:
+            message = json.loads(await websocket.receive_text())
+            action = message.get("action", None)
+            if action == "subscribe":
+                upstream.streams.add(websocket)
+            elif action == "ping":
+                await websocket.send_text(json.dumps({"type": "pong"}))
+    except (WebSocketDisconnect, ValueError):
+        pass
+    finally:
+        upstream.streams.discard(websocket)
+
+
+# ---------------- dbot ----------------
+
+
+@app.get("/account/wallets")
+async def dbot_wallets(type: str = "solana"):
+    if (failure := await upstream.inject("dbot_wallets", kind="dbot")) is not None:
+        return failure
+    return {"err": False, "res": [{"id": "fake-wallet", "type": type, "address": upstream.wallets[0]}]}
+
+
+@app.post("/automation/swap_order")
+@app.post("/simulator/sim_swap_order")
+@app.post("/simulator/limit_orders")
+async def dbot_order(request: Request):
+    endpoint = "dbot_" + request.url.path.rsplit("/", 1)[-1]
+    if (failure := await upstream.inject(endpoint, kind="dbot")) is not None:
+        return failure
+    return {"err": False, "res": {"id": uuid.uuid4().hex}}
+
+
+# ---------------- telegram ----------------
+
+
+async def telegram_params(request):
+    """python-telegram-bot以表单提交参数，非字符串参数为JSON编码"""
+    if request.headers.get("content-type", "").startswith("application/json"):
+        return await request.json()
+    params = dict(request.query_params)
+    form = await request.form()
+    for key, value in form.items():
+        try:
+            params[key] = json.loads(value)
+        except (TypeError, ValueError):
+            params[key] = value
+    return params
+
+
+@app.api_route("/bot{token}/{method}", methods=["GET", "POST"])
+async def telegram(token: str, method: str, request: Request):
+    params = await telegram_params(request)
+    if method == "getUpdates":
+        # 长轮询，没有更新时等待到超时
+        await asyncio.sleep(min(float(params.get("timeout", 0) or 0), 10))
+        return {"ok": True, "result": []}
+    if method == "getMe":
+        return {
+            "ok": True,
+            "result": {
+                "id": 1,
+                "is_bot": True,
+                "first_name": "fake",
+                "username": "fake_bot",
+                "can_join_groups": True,
+                "can_read_all_group_messages": False,
+                "supports_inline_queries": False,
+            },
+        }
+    if method == "getMyCommands":
+        return {"ok": True, "result": []}
+    if (failure := await upstream.inject("telegram", kind="telegram")) is not None:
+        return failure
+    if method == "sendMessage":
+        message_id = upstream.record_message(params.get("chat_id", None), params.get("text", ""))
+        return {
+            "ok": True,
+            "result": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": int(params.get("chat_id", 0)), "type": "channel"},
+                "text": params.get("text", ""),
+            },
+        }
+    return {"ok": True, "result": True}
+
+
+# ---------------- 管理接口 ----------------
+
+
+@app.post("/_fake/emit")
+async def fake_emit(count: int = 1, token_address: str = None):
+    return {"emitted": await upstream.emit(count, token_address)}
+
+
+@app.get("/_fake/stats")
+async def fake_stats():
+    return upstream.summary()
+
+
+@app.get("/_fake/profile")
+async def fake_get_profile():
+    return upstream.profiles
+
+
+@app.post("/_fake/profile")
+async def fake_set_profile(request: Request):
+    """按接口合并故障配置，例如 {"trades": {"latency_ms": 300, "rate_limit_rate": 0.1}}"""
+    for endpoint, profile in (await request.json()).items():
+        upstream.profiles.setdefault(endpoint, {}).update(profile)
+    return upstream.profiles
+
+
+@app.post("/_fake/reset")
+async def fake_reset():
+    upstream.reset()
+    return {"ok": True}
+
+
+async def serve(host="127.0.0.1", port=9000, event_rate=0.0):
+    """在当前事件循环中运行替身服务，压测脚本可以在同一个进程中启动"""
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    emitter = asyncio.create_task(upstream.run_emitter(event_rate)) if event_rate > 0 else None
+    try:
+        await server.serve()
+    finally:
+        if emitter is not None:
+            emitter.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GMGN/dbot/Telegram本地替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--profile", default=None, help="故障配置JSON文件：接口名 -> {latency_ms, jitter_ms, error_rate, rate_limit_rate}")
+    parser.add_argument("--event-rate", type=float, default=0.0, help="每秒推送的事件数，0表示只通过/_fake/emit推送")
+    parser.add_argument("--tokens", type=int, default=20, help="推送事件使用的token数量")
+    parser.add_argument("--unique-tokens", action="store_true", help="每个事件使用新的token")
+    parser.add_argument("--history-trades", type=int, default=30, help="每个token的交易历史条数")
+    args = parser.parse_args()
+
+    global upstream
+    profiles = {}
+    if args.profile:
+        with open(args.profile) as f:
+            profiles = json.load(f)
+    upstream = FakeUpstream(
+        profiles=profiles,
+        history_trades=args.history_trades,
+        tokens=args.tokens,
+        unique_tokens=args.unique_tokens,
+    )
+    logger.info(f"Fake upstream on http://{args.host}:{args.port}, profiles: {profiles}")
+    asyncio.run(serve(args.host, args.port, event_rate=args.event_rate))
+
+
+if __name__ == "__main__":
+    main()
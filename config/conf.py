@@ -8,8 +8,29 @@ load_dotenv()
 import sys
 from loguru import logger
 
+# 日志：LOG_LEVEL为默认级别，LOG_LEVELS按模块设置级别（如 "utils.gmgn_async=WARNING,gmgn_wallets_signal=DEBUG"）
+log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
+log_levels = {
+    name.strip(): level.strip().upper()
+    for name, level in (item.split('=', 1) for item in os.getenv('LOG_LEVELS', '').split(',') if '=' in item)
+}
+# 为1时以INFO级别输出完整的推送、gmgn响应和交易信息，不需要同时调低LOG_LEVEL（数据量很大，只在排查问题时打开）
+log_payloads = int(os.getenv('LOG_PAYLOADS', 0))
+# 每个事件都会输出的高频日志，每N条只输出1条，1表示全部输出
+log_sample_every = max(int(os.getenv('LOG_SAMPLE_EVERY', 10)), 1)
+# 日志写入后台队列由单独的线程输出，不阻塞事件循环；LOG_JSON为1时输出JSON格式的结构化日志
+log_enqueue = int(os.getenv('LOG_ENQUEUE', 1))
+log_json = int(os.getenv('LOG_JSON', 0))
+
 logger.remove(0)
-logger.add(sys.stderr, level="INFO", colorize=True)
+logger.add(
+    sys.stderr,
+    level=min([log_level, *log_levels.values()], key=lambda level: logger.level(level).no),
+    filter={"": log_level, **log_levels},
+    colorize=not log_json,
+    serialize=bool(log_json),
+    enqueue=bool(log_enqueue),
+)
 
 from curl_cffi import requests
 
@@ -37,6 +58,25 @@ for private_key, wallet_address in zip(PRIVATE_KEY_BASE58_LIST, WALLET_ADDRESS_L
     following_wallets_nums[wallet_address] = 0
     sessions[wallet_address] = requests.Session(ja3=ja3_text, akamai=akamai_text, headers={'User-Agent': user_agent})
 
+# cloudflare cookie(__cf_bm)的有效期（秒），过期或遇到403时才重新预热
+cf_clearance_ttl = float(os.getenv('CF_CLEARANCE_TTL', 1500))
+
+# 异步gmgn客户端：单次请求超时时间（秒），以及每个账号连接池的最大并发连接数
+gmgn_request_timeout = float(os.getenv('GMGN_REQUEST_TIMEOUT', 10))
+gmgn_max_clients = int(os.getenv('GMGN_MAX_CLIENTS', 10))
+# 并发获取各账号交易历史时，单个账号的最长等待时间（秒），超时的账号结果被忽略
+history_account_timeout = float(os.getenv('HISTORY_ACCOUNT_TIMEOUT', 8))
+# 分页获取交易历史时提前停止的条件：已获取到N次最近买入，或交易时间早于当前N分钟；0表示获取全部历史
+history_max_buys = int(os.getenv('HISTORY_MAX_BUYS', 0))
+history_horizon_minutes = float(os.getenv('HISTORY_HORIZON_MINUTES', 0))
+
+# 上游服务地址，离线压测时可以指向本地的benchmarks/fake_upstream.py
+gmgn_api_base = os.getenv('GMGN_API_BASE', 'https://gmgn.ai').rstrip('/')
+gmgn_ws_url = os.getenv('GMGN_WS_URL', 'wss://ws.gmgn.ai/stream')
+dbot_api_base = os.getenv('DBOT_API_BASE', 'https://api-bot-v1.dbotx.com').rstrip('/')
+# Telegram Bot API地址（如 http://127.0.0.1:9000/bot），为空时使用官方地址
+telegram_base_url = os.getenv('TELEGRAM_BASE_URL', '')
+
 
 bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
 
@@ -54,6 +94,11 @@ min_market_cap = float(os.getenv('MIN_MARKET_CAP', 0))
 # 过滤创建时间，单位min
 max_ceate_time = int(os.getenv('MAX_CEATE_TIME', 0))
 
+# 预过滤：单笔交易金额范围（美元，0表示不限），以及不推送的token黑名单（逗号分隔）
+min_cost_usd = float(os.getenv('MIN_COST_USD', 0))
+max_cost_usd = float(os.getenv('MAX_COST_USD', 0))
+token_deny_list = {token.strip() for token in os.getenv('TOKEN_DENY_LIST', '').split(',') if token.strip()}
+
 filter_dex_socials = int(os.getenv('FILTER_DEX_SOCIALS', 0))
 filter_dex_ads = int(os.getenv('FILTER_DEX_ADS', 0))
 
@@ -66,6 +111,14 @@ repeat_push = int(os.getenv('REPEAT_PUSH', 1))
 trade_monitor = int(os.getenv('TRADE_TYPE', -1))
 
 strategy = int(os.getenv('STRATEGY', -1))
+# 规则文件定义的策略（JSON），配置后替代STRATEGY选择的策略；策略2默认使用strategy/rules/strategy_2.json
+strategy_rules_file = os.getenv('STRATEGY_RULES_FILE', '')
+# 影子策略（逗号分隔的策略编号或规则文件路径）：与当前策略使用同一次enrichment的数据评估，只记录结果不推送
+shadow_strategies = [
+    int(item) if item.strip().lstrip('-').isdigit() else item.strip()
+    for item in os.getenv('SHADOW_STRATEGIES', '').split(',')
+    if item.strip()
+]
 
 
 dbot_token = os.getenv('DBOT_TOKEN')
@@ -74,8 +127,69 @@ dbot_wallet_id = os.getenv('DBOT_WALLET_ID', None)
 wallet_signal_server = os.getenv('WALLET_SIGNAL_SERVER', 'localhost')
 wallet_signal_port = int(os.getenv('WALLET_SIGNAL_PORT', 8000))
 wallet_signal_route = os.getenv('WALLET_SIGNAL_ROUTE', '/wallet_signal')
+# bot的Prometheus /metrics端口，0表示不启动；转发服务直接在WALLET_SIGNAL_PORT上提供/metrics
+metrics_port = int(os.getenv('METRICS_PORT', 9090))
+# /metrics监听的地址，指标中带有账号钱包地址，默认只允许本机访问；
+# 为本机地址时，转发服务的/metrics也只响应本机的请求
+metrics_host = os.getenv('METRICS_HOST', '127.0.0.1')
+
+# token信息缓存：静态字段（供应量、创建时间、权限等）与变化字段（净流入、持有人数等）的缓存时间（秒）
+token_info_static_ttl = float(os.getenv('TOKEN_INFO_STATIC_TTL', 6 * 60 * 60))
+token_info_volatile_ttl = float(os.getenv('TOKEN_INFO_VOLATILE_TTL', 15))
+token_info_cache_size = int(os.getenv('TOKEN_INFO_CACHE_SIZE', 5000))
+# 是否把静态字段缓存到sqlite，重启后仍可使用
+token_info_cache_db = int(os.getenv('TOKEN_INFO_CACHE_DB', 0))
+
+# 根据websocket推送增量维护每个token的交易账本，只在冷启动、发现缺口（包括转发服务的gap通知）或超过LEDGER_RESYNC_SECONDS时通过REST对账
+# 默认关闭：gap通知需要转发服务和bot同时升级，确认两边都支持后再打开
+ledger_enabled = int(os.getenv('LEDGER_ENABLED', 0))
+ledger_max_tokens = int(os.getenv('LEDGER_MAX_TOKENS', 2000))
+ledger_resync_seconds = float(os.getenv('LEDGER_RESYNC_SECONDS', 600))
+
+# 交易数不少于该值时，parse_history使用numpy列式实现；0表示不使用（默认不使用，
+# 从dict列表构建列的开销使其在常见规模下并不比逐条解析快）
+parse_history_numpy_threshold = int(os.getenv('PARSE_HISTORY_NUMPY_THRESHOLD', 0))
+
+# 信号处理worker数量，以及最多缓冲的待处理事件数
+enrich_workers = int(os.getenv('ENRICH_WORKERS', 4))
+enrich_queue_size = int(os.getenv('ENRICH_QUEUE_SIZE', 200))
+# 同一个token的合并窗口（秒）：处理中到达的事件在处理结束后立即合并处理，刚处理完窗口内到达的事件等窗口结束后合并处理，0表示逐条处理
+enrich_coalesce_window = float(os.getenv('ENRICH_COALESCE_WINDOW', 2))
+
+# 转发服务按交易去重：最多记录的交易数，以及去重的时间窗口（秒）
+relay_dedupe_size = int(os.getenv('RELAY_DEDUPE_SIZE', 20000))
+relay_dedupe_window = float(os.getenv('RELAY_DEDUPE_WINDOW', 600))
+# 转发服务每个本地订阅者的发送队列长度
+relay_subscriber_queue_size = int(os.getenv('RELAY_SUBSCRIBER_QUEUE_SIZE', 1000))
+# 订阅者发送队列满时的处理策略：drop_oldest（丢弃最旧的消息）、drop_pongs（优先丢弃pong）、disconnect（断开慢订阅者）
+relay_overflow_policy = os.getenv('RELAY_OVERFLOW_POLICY', 'drop_oldest')
+# 转发服务上游断线重连的指数退避初始/最大间隔（秒），以及上游token url的轮换周期（秒）
+relay_backoff_base = float(os.getenv('RELAY_BACKOFF_BASE', 1))
+relay_backoff_max = float(os.getenv('RELAY_BACKOFF_MAX', 60))
+relay_url_max_age = float(os.getenv('RELAY_URL_MAX_AGE', 60 * 60))
+# 本地客户端与转发服务之间的帧编码：raw（原样转发上游JSON）或msgpack（需要安装msgpack）
+relay_encoding = os.getenv('RELAY_ENCODING', 'raw')
+# 本地连接的permessage-deflate压缩：deflate 或 none（同机部署时关闭压缩可以节省CPU）
+relay_compression = os.getenv('RELAY_COMPRESSION', 'deflate')
+# 转发服务统计信息的输出间隔（秒）
+relay_stats_interval = float(os.getenv('RELAY_STATS_INTERVAL', 60))
+
+# 录制模式：CAPTURE_DIR不为空时，把websocket推送和GMGN的HTTP响应写入该目录（gzip JSONL分段），用于离线回放（回放不执行交易，不录制dbot）
+capture_dir = os.getenv('CAPTURE_DIR', '')
+capture_segment_records = int(os.getenv('CAPTURE_SEGMENT_RECORDS', 10000))
 
 DATABASE_FILE = "data/data.db"
+# 数据库写入后延迟提交：最多等待DB_COMMIT_INTERVAL秒，或累计DB_COMMIT_BATCH次写入后提交一次
+db_commit_interval = float(os.getenv('DB_COMMIT_INTERVAL', 1))
+db_commit_batch = int(os.getenv('DB_COMMIT_BATCH', 100))
+
+# gmgn access token的本地缓存文件，重启后未过期的token可直接使用
+token_cache_file = os.getenv('TOKEN_CACHE_FILE', 'data/tokens.json')
+# token过期前多少秒开始后台刷新；无法从token中解析过期时间时使用的默认有效期（秒）
+token_refresh_ahead = float(os.getenv('TOKEN_REFRESH_AHEAD', 10 * 60))
+token_default_ttl = float(os.getenv('TOKEN_DEFAULT_TTL', 2 * 60 * 60))
+# 登录失败后多少秒内不再重新登录，期间的刷新请求直接返回失败结果，避免gmgn故障时并发的401触发多次登录
+token_login_cooldown = float(os.getenv('TOKEN_LOGIN_COOLDOWN', 5))
 
 if os.path.dirname(DATABASE_FILE) and not os.path.exists(os.path.dirname(DATABASE_FILE)):
     os.makedirs(os.path.dirname(DATABASE_FILE))
@@ -1,61 +1,178 @@
 import aiosqlite
 import os
+import asyncio
 import pandas as pd
 from loguru import logger
-from config.conf import DATABASE_FILE
+from config.conf import DATABASE_FILE, db_commit_interval, db_commit_batch
+
+# 整个进程共用一个连接，sqlite3会缓存每个连接上参数化语句的预编译结果
+_db = None
+_db_lock = asyncio.Lock()
+# 未提交的写入次数，以及延迟提交的任务
+_pending_writes = 0
+_commit_task = None
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS token_notify (
+        id INTEGER PRIMARY KEY,
+        token_id TEXT NOT NULL,
+        notify_time DATETIME NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS send_trade (
+        id INTEGER PRIMARY KEY,
+        token_id TEXT NOT NULL,
+        trade_amount REAL NOT NULL,
+        is_monitor INTEGER NOT NULL, -- comment '0: no, 1: yes',
+        trade_type INTEGER NOT NULL, -- comment '0: buy, 1: sell',
+        trade_time DATETIME NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS strategy_decision (
+        id INTEGER PRIMARY KEY,
+        token_id TEXT NOT NULL,
+        strategy TEXT NOT NULL,
+        is_shadow INTEGER NOT NULL, -- comment '0: active, 1: shadow',
+        passed INTEGER NOT NULL,
+        rule TEXT,
+        elapsed_ms REAL NOT NULL,
+        decision_time DATETIME NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS token_static_info (
+        token_id TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        update_time REAL NOT NULL
+    )
+    ''',
+    # 推送去重和交易检查都按token_id查询
+    'CREATE INDEX IF NOT EXISTS idx_token_notify_token_id ON token_notify (token_id)',
+    'CREATE INDEX IF NOT EXISTS idx_send_trade_token_id ON send_trade (token_id, is_monitor, trade_type)',
+    'CREATE INDEX IF NOT EXISTS idx_strategy_decision_token_id ON strategy_decision (token_id)',
+]
+
+
+async def get_db():
+    """返回共用的连接，第一次调用时打开连接、开启WAL并创建表和索引"""
+    global _db
+    if _db is not None:
+        return _db
+    async with _db_lock:
+        if _db is None:
+            connection = aiosqlite.connect(DATABASE_FILE)
+            # 连接线程设为daemon，没有调用close_db时也不会阻止进程退出
+            connection.daemon = True
+            db = await connection
+            await db.execute('PRAGMA journal_mode=WAL')
+            await db.execute('PRAGMA synchronous=NORMAL')
+            await db.execute('PRAGMA busy_timeout=5000')
+            for statement in SCHEMA:
+                await db.execute(statement)
+            await db.commit()
+            _db = db
+            logger.info(f"Database {DATABASE_FILE} opened")
+    return _db
+
+
+async def commit():
+    """提交所有未提交的写入"""
+    global _pending_writes
+    if _db is not None and _pending_writes:
+        _pending_writes = 0
+        await _db.commit()
+
+
+async def _commit_later():
+    global _commit_task
+    await asyncio.sleep(db_commit_interval)
+    _commit_task = None
+    try:
+        await commit()
+    except Exception as e:
+        logger.error(f"Failed to commit database: {e}")
+
+
+async def _write(sql, params, many=False):
+    """写入后不立即提交，按DB_COMMIT_INTERVAL/DB_COMMIT_BATCH批量提交
+
+    读写使用同一个连接，未提交的写入对之后的查询（例如推送去重）立即可见。
+    """
+    global _pending_writes, _commit_task
+    db = await get_db()
+    if many:
+        await db.executemany(sql, params)
+    else:
+        await db.execute(sql, params)
+    _pending_writes += 1
+    if _pending_writes >= db_commit_batch:
+        await commit()
+    elif _commit_task is None:
+        _commit_task = asyncio.create_task(_commit_later())
+
+
+async def _fetchall(sql, params):
+    db = await get_db()
+    async with db.execute(sql, params) as cursor:
+        return await cursor.fetchall()
+
+
+async def close_db():
+    """提交未提交的写入并关闭连接"""
+    global _db, _commit_task
+    if _commit_task is not None:
+        _commit_task.cancel()
+        _commit_task = None
+    if _db is not None:
+        await commit()
+        await _db.close()
+        _db = None
 
 
 async def create_tables():
     logger.info("Creating tables...")
-    async with aiosqlite.connect(DATABASE_FILE) as db:  
-        await db.execute('''  
-            CREATE TABLE IF NOT EXISTS token_notify (  
-                id INTEGER PRIMARY KEY,  
-                token_id TEXT NOT NULL,
-                notify_time DATETIME NOT NULL
-            )
-        ''')
-        
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS send_trade (
-                id INTEGER PRIMARY KEY,
-                token_id TEXT NOT NULL,
-                trade_amount REAL NOT NULL,
-                is_monitor INTEGER NOT NULL, -- comment '0: no, 1: yes',
-                trade_type INTEGER NOT NULL, -- comment '0: buy, 1: sell',
-                trade_time DATETIME NOT NULL
-            )
-        ''')
-        
-        await db.commit()
-
-async def insert_token_notify(token_id, notify_time):  
-    async with aiosqlite.connect(DATABASE_FILE) as db:  
-        await db.execute('''  
-            INSERT INTO token_notify (token_id, notify_time) VALUES (?, ?)  
-        ''', (token_id, notify_time))  
-        await db.commit()
+    await get_db()
+
+async def insert_token_notify(token_id, notify_time):
+    await _write('''
+        INSERT INTO token_notify (token_id, notify_time) VALUES (?, ?)
+    ''', (token_id, notify_time))
 
 async def get_token_notify(token_id):
-    async with aiosqlite.connect(DATABASE_FILE) as db:  
-        async with db.execute('''  
-            SELECT * FROM token_notify WHERE token_id = ?  
-        ''', (token_id,)) as cursor:  
-            return await cursor.fetchall()
-        
-        
+    return await _fetchall('''
+        SELECT * FROM token_notify WHERE token_id = ?
+    ''', (token_id,))
+
+
 async def insert_send_trade(token_id, trade_amount, is_monitor, trade_type, trade_time):
-    async with aiosqlite.connect(DATABASE_FILE) as db:
-        await db.execute('''
-            INSERT INTO send_trade (token_id, trade_amount, is_monitor, trade_type, trade_time) VALUES (?, ?, ?, ?, ?)
-        ''', (token_id, trade_amount, is_monitor, trade_type, trade_time))
-        await db.commit()
+    await _write('''
+        INSERT INTO send_trade (token_id, trade_amount, is_monitor, trade_type, trade_time) VALUES (?, ?, ?, ?, ?)
+    ''', (token_id, trade_amount, is_monitor, trade_type, trade_time))
 
 async def get_send_trade(token_id, is_monitor=0, trade_type=0):
-    async with aiosqlite.connect(DATABASE_FILE) as db:
-        sql = f'''
-        SELECT * FROM send_trade WHERE token_id = '{token_id}' AND is_monitor = '{is_monitor}' AND trade_type = '{trade_type}'
-        '''
-        async with db.execute(sql) as cursor:
-            trade_history = await cursor.fetchall()
-            return trade_history
\ No newline at end of file
+    return await _fetchall('''
+        SELECT * FROM send_trade WHERE token_id = ? AND is_monitor = ? AND trade_type = ?
+    ''', (token_id, is_monitor, trade_type))
+
+
+async def upsert_token_static_info(token_id, data, update_time):
+    await _write('''
+        INSERT OR REPLACE INTO token_static_info (token_id, data, update_time) VALUES (?, ?, ?)
+    ''', (token_id, data, update_time))
+
+async def get_token_static_info(token_id):
+    db = await get_db()
+    async with db.execute('''
+        SELECT data, update_time FROM token_static_info WHERE token_id = ?
+    ''', (token_id,)) as cursor:
+        return await cursor.fetchone()
+
+
+async def insert_strategy_decisions(decisions):
+    """批量记录策略评估结果，decisions为 (token_id, strategy, is_shadow, passed, rule, elapsed_ms, decision_time) 的列表"""
+    await _write('''
+        INSERT INTO strategy_decision (token_id, strategy, is_shadow, passed, rule, elapsed_ms, decision_time) VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', decisions, many=True)
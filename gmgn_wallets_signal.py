@@ -1,160 +1,430 @@
 import asyncio
 import json
 import uuid
-import datetime
+import time
+import random
+from http import HTTPStatus
 from loguru import logger
 import traceback
 from websockets.asyncio.server import serve
 from websockets.asyncio.client import connect as ws_connect
 from websockets.exceptions import ConnectionClosedError
 from config.conf import access_token_dict, private_key_dict
-from utils.gmgn import get_gmgn_token
+from utils.gmgn import clearance
+from utils.token_manager import token_manager
+from utils.dedupe import ActivityDeduper
+from utils import fastjson
+from utils import metrics
+from utils import log
+from urllib.parse import urlparse, parse_qs
 import config.conf as configuration
 from config.conf import (
     user_agent,
     access_token_dict,
     private_key_dict,
     wallet_signal_port,
+    relay_stats_interval,
+    relay_subscriber_queue_size,
+    relay_backoff_base,
+    relay_backoff_max,
+    relay_url_max_age,
+    relay_compression,
+    relay_overflow_policy,
     impersonate,
     ja3_text,
-    akamai_text
+    akamai_text,
+    gmgn_ws_url,
+    metrics_host,
 )
 
+LOOPBACK_HOSTS = ("127.0.0.1", "::1", "localhost")
+
 
 class GmgnWebsocketReverse:
+    """gmgn websocket转发服务
+
+    每个账号只保持一个上游连接，上游推送去重后广播给所有本地订阅者，
+    每个订阅者有自己的有界发送队列，本地客户端数量不影响上游连接数。
+    订阅者可能漏掉推送时（队列满丢弃、上游断线/重连）发送 {"type": "gap"} 控制帧，
+    upstreams_down为当前未连接的上游数量，消费端据此让交易账本重新对账。
+    """
+
     def __init__(self):
         self.websocket_urls = {}
-        self.update_websocket_urls()
+        self.url_update_time = {}
         self.remote_connections = {}
-        self.local_connections = {}
-
-    def update_websocket_urls(self):
-        """更新所有的 websocket URLs"""
-        logger.info("Updating websocket URLs...")
-        for wallet_address, wallet_token in access_token_dict.items():
-            wallet_token = get_gmgn_token(wallet_address, private_key_dict[wallet_address])
-            access_token_dict[wallet_address] = wallet_token
-            websocket_url = f"wss://ws.gmgn.ai/stream?tk={wallet_token}"
-            self.websocket_urls[wallet_address] = websocket_url
-        self.update_time = datetime.datetime.now()
-        
-    async def _schedule_cancel_all_tasks(self):
-        """定时取消所有任务，用于更新url"""
-        logger.info("Start to schedule cancel all tasks")
+        self.upstream_tasks = {}
+        # 本地订阅者: connection_id -> {"queue": 发送队列, "encoding": 帧编码, "pong": pong帧, "ws": 连接, "stats": {...}}
+        self.subscribers = {}
+        # 同一个钱包被多个账号关注、或者gmgn重复推送时，同一笔交易只转发一次
+        self.deduper = ActivityDeduper()
+        self.stats = {"frames": 0, "bytes": 0, "passthrough": 0, "reencoded": 0, "broadcast": 0, "dropped": 0, "disconnected": 0}
+        metrics.RELAY_SUBSCRIBERS.set_function(lambda: len(self.subscribers))
+        # 每个账号的上游连接统计，包括断线次数和断线总时长
+        self.upstream_stats = {
+            wallet_address: {
+                "connects": 0,
+                "outages": 0,
+                "outage_seconds": 0.0,
+                "last_outage_seconds": 0.0,
+                "down_since": None,
+            }
+            for wallet_address in private_key_dict.keys()
+        }
+
+    async def update_websocket_url(self, wallet_address, force=False):
+        """更新单个账号的websocket URL，不影响其他账号
+
+        force为True时（连续连接失败），认为当前token已失效，重新登录。
+        """
+        if force:
+            wallet_token = await token_manager.refresh(
+                wallet_address, stale_token=token_manager.current(wallet_address)
+            )
+        else:
+            wallet_token = await token_manager.get_token(wallet_address)
+        self.websocket_urls[wallet_address] = f"{gmgn_ws_url}?tk={wallet_token}"
+        self.url_update_time[wallet_address] = time.time()
+
+    def url_expired(self, wallet_address):
+        return time.time() - self.url_update_time.get(wallet_address, 0) >= relay_url_max_age
+
+    def start(self):
+        """为每个账号启动一个上游连接任务"""
+        for wallet_address in private_key_dict.keys():
+            if wallet_address not in self.upstream_tasks:
+                self.upstream_tasks[wallet_address] = asyncio.create_task(self.run_upstream(wallet_address))
+
+    async def _report_stats(self):
+        """定时输出转发统计信息"""
         while True:
-            await asyncio.sleep(60 * 60)
-            try:
-                for connection_id, connection in self.local_connections.items():
-                    tasks = connection["tasks"]
-                    for task in tasks["reverse"]:
-                        task.cancel()
-                    tasks["forward"].cancel()
-                    logger.info(f"Cancelled all tasks for connection {connection_id}")
-                
-                # 清空self.local_connections
-                self.local_connections.clear()
-            except Exception as e:
-                traceback.print_exc()
+            await asyncio.sleep(relay_stats_interval)
+            logger.info(
+                f"Relay dedupe stats: {self.deduper.stats}, duplicate rate: {self.deduper.duplicate_rate():.2%}"
+            )
+            logger.info(
+                f"Relay hub stats: {self.stats}, upstreams: {len(self.remote_connections)}, subscribers: {len(self.subscribers)}"
+            )
+            for connection_id, subscriber in self.subscribers.items():
+                logger.info(
+                    f"Subscriber ({connection_id}) queue depth: {subscriber['queue'].qsize()}, stats: {subscriber['stats']}"
+                )
+            for wallet_address, stats in self.upstream_stats.items():
+                logger.info(f"Upstream ({wallet_address}) stats: {stats}")
 
-    async def handle_local_connection(self, local_ws):
-        """处理本地 WebSocket 连接，接收并转发消息"""
-        logger.info("Local WebSocket connected.")
-        connection_id = str(uuid.uuid4())
+    def backoff_delay(self, attempt):
+        """指数退避 + 随机抖动，避免所有账号同时重连"""
+        delay = min(relay_backoff_max, relay_backoff_base * (2 ** attempt))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def upstreams_down(self):
+        return len(self.upstream_stats) - len(self.remote_connections)
+
+    def gap_frame(self, reason, encoding):
+        return fastjson.encode_frame({"type": "gap", "reason": reason, "upstreams_down": self.upstreams_down()}, encoding)
+
+    def notify_gap(self, reason):
+        """通知所有订阅者可能漏掉了推送"""
+        logger.info(f"Notify subscribers of gap: {reason}, upstreams down: {self.upstreams_down()}")
+        for connection_id, subscriber in list(self.subscribers.items()):
+            self.enqueue(connection_id, subscriber, self.gap_frame(reason, subscriber["encoding"]))
+
+    def _mark_down(self, wallet_address):
+        stats = self.upstream_stats[wallet_address]
+        if stats["down_since"] is None:
+            stats["down_since"] = time.time()
+
+    def _mark_up(self, wallet_address):
+        stats = self.upstream_stats[wallet_address]
+        stats["connects"] += 1
+        if stats["down_since"] is not None:
+            outage = time.time() - stats["down_since"]
+            stats["outages"] += 1
+            stats["outage_seconds"] += outage
+            stats["last_outage_seconds"] = outage
+            stats["down_since"] = None
+            logger.info(f"Remote WebSocket ({wallet_address}) recovered after {outage:.1f}s")
+
+    async def _connect_upstream(self, wallet_address, refresh_url=False):
+        if refresh_url or self.url_expired(wallet_address):
+            logger.info(f"Updating websocket URL for {wallet_address}")
+            await self.update_websocket_url(wallet_address, force=refresh_url)
+        return await self.create_remote_connection(wallet_address, self.websocket_urls[wallet_address])
+
+    async def _wait_url_expired(self, wallet_address):
+        remaining = relay_url_max_age - (time.time() - self.url_update_time.get(wallet_address, 0))
+        await asyncio.sleep(max(remaining, 0))
+
+    async def run_upstream(self, wallet_address):
+        """独立维护一个账号的上游连接
+
+        断线后按指数退避重连，连续失败时重新登录；url到期时先用新url建立连接再关闭旧连接，
+        整个过程不影响其他账号的上游连接和本地客户端。
+        """
+        attempt = 0
+        remote_conn = None
         while True:
             try:
-                now_time = datetime.datetime.now()
-                if (now_time - self.update_time).seconds > 60 * 5:
-                    logger.info("Websocket URLs need to be updated, updating now...")
-                    self.update_websocket_urls()
-                this_connection_urls = self.websocket_urls.copy()
-                # 建立远程 WebSocket 连接
-                await self.create_remote_connections(this_connection_urls)
-                # 启动正向和反向任务
-                connection_tasks = {
-                    "forward": asyncio.create_task(self.forward(local_ws)),
-                    "reverse": [asyncio.create_task(self.reverse(local_ws, wallet_address, remote_ws)) 
-                                for wallet_address, remote_ws in self.remote_connections.items()]
-                }
-                self.local_connections[connection_id] = {
-                    "local_ws": local_ws,
-                    "remote_connections": self.remote_connections,
-                    "tasks": connection_tasks
-                }
-                # 等待所有任务结束
-                # await asyncio.gather(connection_tasks["forward"], *connection_tasks['reverse'])
-                tasks = connection_tasks["reverse"] + [connection_tasks["forward"]]
-                done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                if remote_conn is None:
+                    remote_conn = await self._connect_upstream(wallet_address, refresh_url=attempt >= 2)
+                # url轮换时旧连接仍在，不算断线
+                recovered = wallet_address not in self.remote_connections
+                self.remote_connections[wallet_address] = remote_conn
+                self._mark_up(wallet_address)
+                if recovered:
+                    self.notify_gap("upstream_up")
+                attempt = 0
+                tasks = [
+                    asyncio.create_task(self.reverse(wallet_address, remote_conn)),
+                    asyncio.create_task(self.upstream_heartbeat(wallet_address, remote_conn)),
+                ]
+                rotate_task = asyncio.create_task(self._wait_url_expired(wallet_address))
+                done, pending = await asyncio.wait(tasks + [rotate_task], return_when=asyncio.FIRST_COMPLETED)
+                old_conn = remote_conn
+                remote_conn = None
+                if rotate_task in done:
+                    # url到期，先建立新连接再关闭旧连接，避免断流
+                    logger.info(f"Rotating remote WebSocket ({wallet_address}) with a new url")
+                    try:
+                        remote_conn = await self._connect_upstream(wallet_address, refresh_url=True)
+                    except Exception as e:
+                        logger.error(f"Failed to rotate remote WebSocket ({wallet_address}): {e}")
                 for task in pending:
-                    logger.info(f"Cancel task {task}")
                     task.cancel()
-                if connection_id in self.local_connections:
-                    self.local_connections.pop(connection_id)
-                
-                logger.info(f"All tasks finished for connection {connection_id}")
+                await old_conn.close()
+                if remote_conn is not None:
+                    continue
+                logger.info(f"Remote WebSocket ({wallet_address}) finished, reconnecting...")
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                traceback.print_exc()
-                await asyncio.sleep(2)
+                logger.error(f"Remote WebSocket ({wallet_address}) error: {e}")
+            if self.remote_connections.pop(wallet_address, None) is not None:
+                self.notify_gap("upstream_down")
+            self._mark_down(wallet_address)
+            delay = self.backoff_delay(attempt)
+            attempt += 1
+            logger.info(f"Reconnecting remote WebSocket ({wallet_address}) in {delay:.1f}s, attempt {attempt}")
+            await asyncio.sleep(delay)
 
-    async def create_remote_connections(self, this_connection_urls):
-        """为每个钱包地址创建远程WebSocket连接"""
-        logger.info(f"Creating remote connections for {this_connection_urls.keys()}")
-        for wallet_address, websocket_url in this_connection_urls.items():
-            try:
-                configuration.sessions[wallet_address].get(
-                    "https://gmgn.ai/defi/quotation/v1/chains/sol/gas_price",
-                    # impersonate=impersonate,
-                )
-                cookie = configuration.sessions[wallet_address].cookies.get_dict()
-                additional_headers = {}
-                additional_headers['Cookie'] = '; '.join([f"{k}={v}" for k, v in cookie.items()])
-                remote_conn = await ws_connect(websocket_url, origin="https://gmgn.ai", additional_headers=additional_headers, user_agent_header=user_agent)
-                self.remote_connections[wallet_address] = remote_conn
-                subscribe(remote_conn)
-                logger.info(f"Connected to remote WebSocket ({wallet_address})")
-            except Exception as e:
-                logger.error(f"Failed to connect to {websocket_url}: {str(e)}")
+    async def create_remote_connection(self, wallet_address, websocket_url):
+        """为钱包地址创建远程WebSocket连接并订阅"""
+        logger.info(f"Creating remote connection for {wallet_address}")
+        # 刷新cookie是同步的HTTP请求，放到线程中执行，避免阻塞其他上游连接和本地转发
+        await asyncio.to_thread(clearance.ensure, wallet_address, configuration.sessions[wallet_address])
+        cookie = configuration.sessions[wallet_address].cookies.get_dict()
+        additional_headers = {}
+        additional_headers['Cookie'] = '; '.join([f"{k}={v}" for k, v in cookie.items()])
+        remote_conn = await ws_connect(websocket_url, origin="https://gmgn.ai", additional_headers=additional_headers, user_agent_header=user_agent)
+        await subscribe(remote_conn)
+        logger.info(f"Connected to remote WebSocket ({wallet_address})")
+        return remote_conn
+
+    async def upstream_heartbeat(self, wallet_address, remote_conn):
+        """上游心跳，由hub统一发送，不再转发本地客户端的ping"""
+        while True:
+            await remote_conn.send(json.dumps({"action": "ping"}))
+            await asyncio.sleep(30)
+
+    def _request_encoding(self, local_ws):
+        """本地客户端通过连接参数 ?encoding=raw|msgpack 协商帧编码"""
+        try:
+            query = parse_qs(urlparse(local_ws.request.path).query)
+        except Exception:
+            return fastjson.ENCODING_RAW
+        requested = query.get("encoding", [fastjson.ENCODING_RAW])[0]
+        encoding = fastjson.resolve_encoding(requested)
+        if encoding != requested:
+            logger.warning(f"Unsupported encoding {requested}, fallback to {encoding}")
+        return encoding
+
+    async def handle_local_connection(self, local_ws):
+        """处理本地 WebSocket 连接，注册为订阅者并发送广播消息"""
+        connection_id = str(uuid.uuid4())
+        encoding = self._request_encoding(local_ws)
+        logger.info(f"Local WebSocket connected: {connection_id}, encoding: {encoding}")
+        subscriber = {
+            "queue": asyncio.Queue(maxsize=relay_subscriber_queue_size),
+            "encoding": encoding,
+            "pong": fastjson.encode_frame({"type": "pong"}, encoding),
+            "ws": local_ws,
+            "stats": {"sent": 0, "dropped": 0, "max_depth": 0},
+            # 丢弃过推送，下一次发送前先发送gap帧
+            "gap": False,
+        }
+        self.subscribers[connection_id] = subscriber
+        # 告知新订阅者当前有几个上游未连接
+        self.enqueue(connection_id, subscriber, self.gap_frame("subscribed", encoding))
+        tasks = [
+            asyncio.create_task(self.send_to_local(local_ws, subscriber)),
+            asyncio.create_task(self.forward(local_ws, connection_id, subscriber)),
+        ]
+        try:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+        finally:
+            self.subscribers.pop(connection_id, None)
+            logger.info(f"Local WebSocket disconnected: {connection_id}")
 
-    async def forward(self, local_ws):
-        """处理本地到远程 WebSocket 的消息转发"""
+    def _drop(self, subscriber, count=1):
+        subscriber["stats"]["dropped"] += count
+        self.stats["dropped"] += count
+        metrics.RELAY_DROPPED.inc(count)
+
+    def _drop_queued_pongs(self, subscriber):
+        """丢弃队列中排队的pong，返回丢弃的数量"""
+        queue = subscriber["queue"]
+        frames = []
+        while not queue.empty():
+            frames.append(queue.get_nowait())
+        kept = [frame for frame in frames if frame is not subscriber["pong"]]
+        for frame in kept:
+            queue.put_nowait(frame)
+        return len(frames) - len(kept)
+
+    def _disconnect_slow(self, connection_id, subscriber):
+        """断开消费过慢的订阅者，客户端重连后从最新的推送开始接收"""
+        if self.subscribers.pop(connection_id, None) is None:
+            # 已经在断开中
+            return
+        self.stats["disconnected"] += 1
+        logger.warning(f"Disconnect slow subscriber {connection_id}, queue depth: {subscriber['queue'].qsize()}")
+        asyncio.create_task(subscriber["ws"].close(code=1013, reason="subscriber too slow"))
+
+    def enqueue(self, connection_id, subscriber, frame):
+        """放入订阅者队列，不会阻塞上游读取；队列满时按RELAY_OVERFLOW_POLICY处理
+
+        drop_oldest: 丢弃最旧的消息；drop_pongs: 优先丢弃pong，没有pong时丢弃最旧的消息；
+        disconnect: 断开该订阅者。
+        """
+        queue = subscriber["queue"]
+        if queue.full():
+            if relay_overflow_policy == "disconnect":
+                self._disconnect_slow(connection_id, subscriber)
+                return
+            if relay_overflow_policy == "drop_pongs":
+                if frame is subscriber["pong"]:
+                    self._drop(subscriber)
+                    return
+                dropped = self._drop_queued_pongs(subscriber)
+                if dropped:
+                    self._drop(subscriber, dropped)
+            if queue.full():
+                if queue.get_nowait() is not subscriber["pong"]:
+                    subscriber["gap"] = True
+                self._drop(subscriber)
+        queue.put_nowait(frame)
+        if queue.qsize() > subscriber["stats"]["max_depth"]:
+            subscriber["stats"]["max_depth"] = queue.qsize()
+
+    def broadcast(self, message, raw=None):
+        """广播给所有订阅者，raw为上游原始帧；每种编码只编码一次"""
+        self.stats["broadcast"] += 1
+        if raw is not None:
+            self.stats["passthrough"] += 1
+        else:
+            self.stats["reencoded"] += 1
+        frames = {}
+        # disconnect策略下enqueue可能移除订阅者，遍历副本
+        for connection_id, subscriber in list(self.subscribers.items()):
+            encoding = subscriber["encoding"]
+            frame = frames.get(encoding, None)
+            if frame is None:
+                frame = fastjson.encode_frame(message, encoding, raw=raw)
+                frames[encoding] = frame
+            self.enqueue(connection_id, subscriber, frame)
+
+    async def send_to_local(self, local_ws, subscriber):
+        queue = subscriber["queue"]
+        while True:
+            message = await queue.get()
+            if subscriber["gap"]:
+                subscriber["gap"] = False
+                await local_ws.send(self.gap_frame("dropped", subscriber["encoding"]))
+            await local_ws.send(message)
+            subscriber["stats"]["sent"] += 1
+
+    async def forward(self, local_ws, connection_id, subscriber):
+        """处理本地客户端发来的消息：上游订阅和心跳由hub维护，本地ping直接回复pong"""
         logger.info("Forward WebSocket task started")
         try:
             async for message in local_ws:
-                logger.info(f"Local WebSocket received: {message}")
-                # import pdb; pdb.set_trace()
-                message_json = json.dumps(message) if isinstance(message, dict) else message
-                for wallet_address, remote_conn in self.remote_connections.items():
-                    await remote_conn.send(message_json)
-                    logger.info(f"Forwarded message to remote WebSocket ({wallet_address}): {message_json}")
+                log.payload("Local WebSocket received: {}", message)
+                try:
+                    message_json = fastjson.loads(message)
+                except Exception:
+                    continue
+                if message_json.get("action", None) == "ping":
+                    self.enqueue(connection_id, subscriber, subscriber["pong"])
         except ConnectionClosedError as e:
             logger.error(f"Local WebSocket connection closed: {str(e)}")
 
-    async def reverse(self, local_ws, wallet_address, remote_conn):
-        """处理远程到本地 WebSocket 的消息转发"""
+    async def reverse(self, wallet_address, remote_conn):
+        """接收远程消息，去重后广播给所有本地订阅者
+
+        消息没有被去重修改时原样转发上游的帧，不重新序列化。
+        """
         logger.info(f"Reverse WebSocket task started for {wallet_address}")
         try:
             async for message in remote_conn:
-                logger.info(f"Remote WebSocket ({wallet_address}) received: {message}")
-                message_json = json.loads(message)
-                await local_ws.send(json.dumps(message_json))
-                logger.info(f"Sent message to local WebSocket: {message_json}")
+                start = time.perf_counter()
+                self.stats["frames"] += 1
+                self.stats["bytes"] += len(message)
+                try:
+                    message_json = fastjson.loads(message)
+                except Exception as e:
+                    # 单个无法解析的帧直接丢弃，不断开上游连接
+                    logger.warning(f"Drop invalid frame from {wallet_address}: {e}, frame: {message[:200]!r}")
+                    continue
+                if not isinstance(message_json, dict):
+                    logger.warning(f"Drop non-object frame from {wallet_address}: {message[:200]!r}")
+                    continue
+                if message_json.get("type", None) == "pong":
+                    # 上游心跳回复，不需要转发
+                    continue
+                filtered = self.deduper.filter_message(message_json)
+                if filtered is None:
+                    logger.debug("Drop duplicate message from {}", wallet_address)
+                    continue
+                self.broadcast(filtered, raw=message if filtered is message_json else None)
+                metrics.observe_stage("relay_forward", time.perf_counter() - start)
         except ConnectionClosedError as e:
             logger.error(f"Remote WebSocket ({wallet_address}) connection closed: {str(e)}")
 
 
+def process_request(connection, request):
+    """/metrics返回Prometheus指标，其他路径按websocket连接处理"""
+    if urlparse(request.path).path != "/metrics":
+        return None
+    if metrics_host in LOOPBACK_HOSTS and connection.remote_address[0] not in ("127.0.0.1", "::1"):
+        # 指标中带有账号钱包地址，METRICS_HOST为本机地址时不对外提供
+        return connection.respond(HTTPStatus.FORBIDDEN, "Forbidden\n")
+    content, content_type = metrics.render()
+    response = connection.respond(HTTPStatus.OK, content.decode("utf-8"))
+    del response.headers["Content-Type"]
+    response.headers["Content-Type"] = content_type
+    return response
+
+
 async def websocket_server(reverse_proxy: GmgnWebsocketReverse):
     """启动 WebSocket 服务器"""
     async def handler(websocket):
         await reverse_proxy.handle_local_connection(websocket)
 
-    # 创建定时任务_schedule_cancel_all_tasks
-    asyncio.create_task(reverse_proxy._schedule_cancel_all_tasks())
+    reverse_proxy.start()
+    asyncio.create_task(token_manager.run_background_refresh())
+    asyncio.create_task(reverse_proxy._report_stats())
 
     logger.info(f"Starting WebSocket server on ws://localhost:{wallet_signal_port}")
-    async with serve(handler, "0.0.0.0", int(wallet_signal_port)):
+    compression = None if relay_compression == "none" else relay_compression
+    async with serve(
+        handler, "0.0.0.0", int(wallet_signal_port), compression=compression, process_request=process_request
+    ):
         await asyncio.Future()  # 保持服务器运行
 
 
-def subscribe(remote_conn):
+async def subscribe(remote_conn):
     """订阅 WebSocket 频道"""
     session_id = str(uuid.uuid4())
     payload = {
@@ -163,7 +433,7 @@ def subscribe(remote_conn):
         "id": session_id,
         "data": {"chain": "sol"},
     }
-    asyncio.create_task(remote_conn.send(json.dumps(payload)))
+    await remote_conn.send(json.dumps(payload))
     logger.info(f"Subscribed with session ID: {session_id}")
 
 
@@ -0,0 +1,187 @@
+import os
+from config.conf import time_zone
+os.environ['TZ'] = time_zone
+
+import sys
+import time
+import json
+import asyncio
+import argparse
+import traceback
+from loguru import logger
+from utils import capture
+from utils import clock
+from utils.capture import read_capture, ReplayResponder
+from utils import gmgn_async
+from utils.pipeline import EnrichPipeline
+from utils.prefilter import PreFilter
+from utils.shadow import strategy_runner
+from utils.token_manager import token_manager
+from utils.util import generate_markdown
+from config.conf import (
+    private_key_dict,
+    access_token_dict,
+    ledger_enabled,
+    enrich_workers,
+    enrich_queue_size,
+    enrich_coalesce_window,
+)
+
+
+class ReplayPipeline(EnrichPipeline):
+    """合并窗口按录制时间（clock）而不是真实时间结束，回放速度不影响合并结果"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # token -> 按录制时间的释放时间
+        self.delayed = {}
+
+    def _schedule(self, delay, token_address):
+        self.delayed[token_address] = clock.now() + delay
+
+    def release(self, now=None):
+        """释放窗口已结束的token，now为None时全部释放"""
+        for token_address, release_at in list(self.delayed.items()):
+            if now is None or release_at <= now:
+                del self.delayed[token_address]
+                self.queue.put_nowait(token_address)
+
+
+def prepare_replay(records):
+    """HTTP请求全部从录制数据返回，不登录、不录制、不写token缓存文件"""
+    capture.writer = None
+    capture.replayer = ReplayResponder(records)
+    token_manager.token_file = None
+    for wallet_address in private_key_dict.keys():
+        token_manager.tokens[wallet_address] = {"token": "replay", "expires_at": float("inf")}
+        access_token_dict[wallet_address] = "replay"
+
+
+async def replay(directory, speed=0.0, output=None):
+    """按录制顺序把websocket推送送入 预过滤 -> 信号处理流水线(parse_token_info/filter_token) -> generate_markdown
+
+    与sub.listen一样经过EnrichPipeline（相同的worker数和合并窗口），缓存、账本和合并窗口使用录制时间作为时钟。
+    speed为0时尽快回放，每条推送处理完再送入下一条，结果是确定的，可以用于回归比对；
+    speed为1时按录制时的节奏回放，其余值为倍速，此时处理中的事件合并情况与真实处理速度有关。
+    """
+    records = list(read_capture(directory))
+    prepare_replay(records)
+    prefilter = PreFilter(gmgn_async.token_info_cache, strategy_types=strategy_runner.strategies)
+    stats = {"frames": 0, "events": 0, "signals": 0, "errors": 0}
+    signals = []
+
+    # 时钟为当前回放到的推送的录制时间
+    replay_time = {"now": None}
+    clock.set_clock(lambda: replay_time["now"] if replay_time["now"] is not None else time.time())
+
+    gass_price = await gmgn_async.get_gas_price()
+
+    async def handle(item):
+        ts, follow_data = item
+        token_address = follow_data["token_address"]
+        try:
+            parsed_result = await gmgn_async.parse_token_info(follow_data, gass_price=gass_price)
+            if parsed_result is None:
+                return
+            markdown = generate_markdown(parsed_result)
+        except Exception as e:
+            stats["errors"] += 1
+            logger.error(f"Replay failed for token {token_address}: {e}")
+            traceback.print_exc()
+            return
+        stats["signals"] += 1
+        signals.append(
+            {
+                "ts": ts,
+                "token_address": token_address,
+                "strategy": parsed_result.get("strategy", None),
+                "markdown": markdown,
+            }
+        )
+
+    pipeline = ReplayPipeline(
+        handle,
+        workers=enrich_workers,
+        max_pending=enrich_queue_size,
+        coalesce_window=enrich_coalesce_window,
+    )
+    pipeline.start()
+
+    first_ts = None
+    start = time.perf_counter()
+    for record in records:
+        if record["kind"] != "ws":
+            continue
+        if first_ts is None:
+            first_ts = record["ts"]
+        if speed > 0:
+            delay = (record["ts"] - first_ts) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        replay_time["now"] = record["ts"]
+        pipeline.release(record["ts"])
+        if speed <= 0:
+            await pipeline.queue.join()
+        stats["frames"] += 1
+        message = record["data"]
+        if not isinstance(message, dict) or message.get("type", None) == "pong":
+            continue
+        if message.get("type", None) == "gap":
+            gmgn_async.trade_ledger.mark_all_stale(degraded=message.get("upstreams_down", 0) > 0)
+            continue
+        if "data" not in message or len(message["data"]) == 0:
+            continue
+        if ledger_enabled:
+            for activity in message["data"]:
+                try:
+                    if not prefilter.is_denied(activity["token_address"]):
+                        gmgn_async.trade_ledger.record(activity)
+                except Exception as e:
+                    logger.error(f"Failed to record activity to ledger: {e}")
+        follow_data = message["data"][0]
+        token_address = follow_data["token_address"]
+        if not prefilter.check(token_address, follow_data):
+            continue
+        stats["events"] += 1
+        pipeline.submit(token_address, (record["ts"], follow_data))
+
+    # 处理合并窗口中剩余的事件
+    await pipeline.queue.join()
+    pipeline.release()
+    await pipeline.queue.join()
+    await pipeline.stop()
+    clock.set_clock(None)
+    elapsed = time.perf_counter() - start
+
+    if output:
+        # worker并发处理，按录制时间排序后输出，便于回归比对
+        signals.sort(key=lambda signal: (signal["ts"], signal["token_address"]))
+        with open(output, "w", encoding="utf-8") as out:
+            for signal in signals:
+                out.write(json.dumps(signal, ensure_ascii=False) + "\n")
+
+    logger.info(f"Replay stats: {stats}, elapsed: {elapsed:.2f}s")
+    if elapsed > 0:
+        logger.info(
+            f"Throughput: {stats['frames'] / elapsed:.1f} frames/s, {stats['events'] / elapsed:.1f} events/s"
+        )
+    logger.info(f"Replay HTTP stats: {capture.replayer.stats}")
+    logger.info(f"Enrich pipeline stats: {pipeline.stats}")
+    logger.info(f"Token info cache stats: {gmgn_async.token_info_cache.stats}")
+    logger.info(f"Prefilter stats: {prefilter.stats}")
+    logger.info(f"Strategy stats: {strategy_runner.summary()}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放CAPTURE_DIR录制的数据，不访问网络")
+    parser.add_argument("directory", help="录制目录")
+    parser.add_argument("--speed", type=float, default=0.0, help="0为尽快回放，1为按录制时的节奏回放，其余为倍速")
+    parser.add_argument("--output", default=None, help="通过过滤的信号写入该JSONL文件，用于回归比对")
+    args = parser.parse_args()
+    stats = asyncio.run(replay(args.directory, speed=args.speed, output=args.output))
+    sys.exit(1 if stats["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import os
+import json
+import operator
+from loguru import logger
+from utils.util import judge_price_increase, token_safe_judge
+
+RULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules")
+
+# 价格上涨相关特征都来自judge_price_increase，只计算一次
+PRICE_FEATURES = (
+    "price_increase_passed",
+    "price_increase",
+    "last_buy_price",
+    "last_second_buy_price",
+    "first_buy_price",
+)
+
+
+def _price_judge(parsed_result, features):
+    values = judge_price_increase(parsed_result)
+    for name, value in zip(PRICE_FEATURES, values):
+        features.values[name] = value
+    return values
+
+
+def _buy_mc(price_feature):
+    """某次买入时的市值：买入价格 * (当前市值 / 当前价格)，与原策略2的计算方式一致"""
+
+    def compute(parsed_result, features):
+        price = features[price_feature]
+        if price is None:
+            return None
+        token_info = parsed_result["token_info"]
+        return price * (token_info["market_cap"] / token_info["price"])
+
+    return compute
+
+
+def _price_feature(index):
+    def compute(parsed_result, features):
+        return _price_judge(parsed_result, features)[index]
+
+    return compute
+
+
+# 特征名 -> (计算函数, 依赖的数据)，依赖用于声明过滤阶段需要加载的数据（见utils.util.filter_requirements）
+FEATURES = {
+    "market_cap": (lambda r, f: r["token_info"]["market_cap"], {"token_info": ("total_supply",)}),
+    "net_in_1m": (lambda r, f: r["token_info"]["net_in_volume_1m"], {"token_info": ("net_in_volume_1m",)}),
+    "net_in_5m": (lambda r, f: r["token_info"]["net_in_volume_5m"], {"token_info": ("net_in_volume_5m",)}),
+    "net_in_diff": (
+        lambda r, f: f["net_in_5m"] - f["net_in_1m"],
+        {"token_info": ("net_in_volume_1m", "net_in_volume_5m")},
+    ),
+    "all_wallets": (lambda r, f: r["trade_history"]["all_wallets"], {"history": True}),
+    "full_wallets": (lambda r, f: r["trade_history"]["full_wallets"], {"history": True}),
+    "hold_wallets": (lambda r, f: r["trade_history"]["hold_wallets"], {"history": True}),
+    "close_wallets": (lambda r, f: r["trade_history"]["close_wallets"], {"history": True}),
+    "token_safe": (
+        lambda r, f: token_safe_judge(r),
+        {"token_info": ("renounced_mint", "renounced_freeze_account", "burn_ratio", "burn_status")},
+    ),
+    "first_buy_mc": (_buy_mc("first_buy_price"), {"history": True, "token_info": ("total_supply",)}),
+    "last_buy_mc": (_buy_mc("last_buy_price"), {"history": True, "token_info": ("total_supply",)}),
+    "last_second_buy_mc": (_buy_mc("last_second_buy_price"), {"history": True, "token_info": ("total_supply",)}),
+}
+for _index, _name in enumerate(PRICE_FEATURES):
+    FEATURES[_name] = (_price_feature(_index), {"history": True})
+
+
+class Features:
+    """一次过滤中的特征值，每个特征只在首次使用时计算一次"""
+
+    def __init__(self, parsed_result):
+        self.parsed_result = parsed_result
+        self.values = {}
+
+    def __getitem__(self, name):
+        if name not in self.values:
+            self.values[name] = FEATURES[name][0](self.parsed_result, self)
+        return self.values[name]
+
+
+def _in_range(value, bounds):
+    return bounds[0] <= value < bounds[1]
+
+
+# 条件运算符，特征值为None时条件不成立（not_null除外）
+OPERATORS = {
+    "range": _in_range,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "in": lambda value, options: value in options,
+}
+
+
+def _compile_condition(expr, used_features):
+    feature = expr["feature"]
+    if feature not in FEATURES:
+        raise ValueError(f"Unknown feature: {feature}")
+    used_features.add(feature)
+    ops = [(key, value) for key, value in expr.items() if key != "feature"]
+    if not ops:
+        raise ValueError(f"Condition on {feature} has no operator")
+    checks = []
+    for key, value in ops:
+        if key == "not_null":
+            checks.append(lambda v, expected=value: (v is not None) == expected)
+            continue
+        if key not in OPERATORS:
+            raise ValueError(f"Unknown operator: {key}")
+        if key == "in":
+            value = set(value)
+        elif key == "range":
+            value = tuple(value)
+        func = OPERATORS[key]
+        checks.append(lambda v, func=func, value=value: v is not None and func(v, value))
+
+    def evaluate(features):
+        value = features[feature]
+        for check in checks:
+            if not check(value):
+                return False
+        return True
+
+    return evaluate
+
+
+def compile_expr(expr, used_features):
+    """把规则表达式编译为 features -> bool 的函数
+
+    {"all": [...]} / {"any": [...]} 按顺序短路求值，{"feature": 名称, 运算符: 值} 为单个条件。
+    """
+    if "all" in expr:
+        children = [compile_expr(child, used_features) for child in expr["all"]]
+        return lambda features: all(child(features) for child in children)
+    if "any" in expr:
+        children = [compile_expr(child, used_features) for child in expr["any"]]
+        return lambda features: any(child(features) for child in children)
+    return _compile_condition(expr, used_features)
+
+
+def _intersect(a, b):
+    """两个取值范围的交集，None表示空集"""
+    if a is None or b is None:
+        return None
+    low = b[0] if a[0] is None else a[0] if b[0] is None else max(a[0], b[0])
+    high = b[1] if a[1] is None else a[1] if b[1] is None else min(a[1], b[1])
+    if low is not None and high is not None and low > high:
+        return None
+    return (low, high)
+
+
+def _hull(bounds):
+    """多个取值范围的并集的外包范围，全部为空集时返回None"""
+    bounds = [item for item in bounds if item is not None]
+    if not bounds:
+        return None
+    low = None if any(item[0] is None for item in bounds) else min(item[0] for item in bounds)
+    high = None if any(item[1] is None for item in bounds) else max(item[1] for item in bounds)
+    return (low, high)
+
+
+def _condition_bounds(expr):
+    bounds = (None, None)
+    for key, value in expr.items():
+        if key in ("range", "in"):
+            bounds = _intersect(bounds, (min(value), max(value)))
+        elif key in ("gt", "gte"):
+            bounds = _intersect(bounds, (value, None))
+        elif key in ("lt", "lte"):
+            bounds = _intersect(bounds, (None, value))
+        elif key == "eq":
+            bounds = _intersect(bounds, (value, value))
+    return bounds
+
+
+def feature_bounds(expr, feature):
+    """表达式通过时feature可能的取值范围 (下限, 上限)，None表示该方向不限；表达式不可能通过时返回None
+
+    只做区间估计，不区分开闭区间，得到的范围只会比实际的宽，可以用于预过滤。
+    """
+    if "all" in expr:
+        bounds = (None, None)
+        for child in expr["all"]:
+            bounds = _intersect(bounds, feature_bounds(child, feature))
+        return bounds
+    if "any" in expr:
+        return _hull([feature_bounds(child, feature) for child in expr["any"]])
+    if expr["feature"] != feature:
+        return (None, None)
+    return _condition_bounds(expr)
+
+
+class RuleStrategy:
+    """从规则文件加载的策略，规则按顺序匹配，返回第一条通过的规则ID"""
+
+    def __init__(self, name, rules):
+        self.name = name
+        self.used_features = set()
+        self.rules = [(str(rule["id"]), compile_expr(rule["when"], self.used_features)) for rule in rules]
+        # 任意一条规则可能通过的市值范围，用于预过滤
+        self.market_cap_bounds = _hull([feature_bounds(rule["when"], "market_cap") for rule in rules]) or (None, None)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            config = json.load(f)
+        strategy = cls(config.get("name", os.path.basename(path)), config["rules"])
+        logger.info(f"Loaded strategy {strategy.name} with {len(strategy.rules)} rules from {path}")
+        return strategy
+
+    def requirements(self):
+        """规则用到的特征所依赖的数据"""
+        history = False
+        fields = set()
+        for feature in self.used_features:
+            dependency = FEATURES[feature][1]
+            history = history or dependency.get("history", False)
+            fields.update(dependency.get("token_info", ()))
+        fields.add("total_supply")
+        return {"history": history, "token_info": tuple(sorted(fields))}
+
+    def evaluate(self, parsed_result):
+        features = Features(parsed_result)
+        token_id = parsed_result["token_address"]
+        for rule_id, rule in self.rules:
+            if rule(features):
+                logger.info(
+                    "token: {} passed {} rule {}. Market cap: {}",
+                    token_id,
+                    self.name,
+                    rule_id,
+                    parsed_result["token_info"]["market_cap"],
+                )
+                return {"pass": True, "strategy": rule_id}
+        logger.debug("token: {} failed all {} rules.", token_id, self.name)
+        return {"pass": False, "strategy": "None"}
+
+
+_loaded = {}
+
+
+def get_rule_strategy(path):
+    """按文件路径加载并缓存编译后的策略"""
+    if path not in _loaded:
+        _loaded[path] = RuleStrategy.load(path)
+    return _loaded[path]
+
+
+def default_rules_file(strategy_type):
+    return os.path.join(RULES_DIR, f"strategy_{strategy_type}.json")
@@ -1,20 +1,36 @@
 import requests  
 import json  
+import time
 import asyncio
 import uuid  
 import websockets
 import traceback
 from loguru import logger
 from datetime import datetime, timedelta
-from utils.gmgn import get_gmgn_token, get_gas_price, parse_token_info, get_following_wallets
+from utils.gmgn import get_gas_price
+from utils import gmgn_async
+from utils.token_manager import token_manager
+from utils import fastjson
+from utils import capture
+from utils import metrics
+from utils import log
 from utils.util import generate_markdown, filter_token
 from trade.dbot import get_wallet_id, dbot_simulate_swap, dbot_swap
 from trade.trade import send_trade_with_retry
 from databases.database import insert_token_notify, get_token_notify
-from config.conf import channel_id, access_token_dict, private_key_dict, repeat_push, trade_monitor, following_wallets_nums, wallet_signal_server, wallet_signal_port, wallet_signal_route
+from utils.pipeline import EnrichPipeline
+from utils.prefilter import PreFilter
+from utils import enrich
+from utils.shadow import strategy_runner
+from config.conf import channel_id, access_token_dict, private_key_dict, repeat_push, trade_monitor, following_wallets_nums, wallet_signal_server, wallet_signal_port, wallet_signal_route, enrich_workers, enrich_queue_size, enrich_coalesce_window, ledger_enabled, relay_encoding, relay_compression, gmgn_ws_url
   
-token_expiry_duration = timedelta(hours=2)  
-token_acquired_time = None
+enrich_pipeline = None
+prefilter = PreFilter(gmgn_async.token_info_cache, strategy_types=strategy_runner.strategies)
+
+metrics.register_stats("token_info_cache_stats", "Token info cache hits, misses, coalesced and sqlite hits", gmgn_async.token_info_cache.stats)
+metrics.register_stats("prefilter_stats", "Signals passed or rejected by the prefilter, by reason", prefilter.stats)
+metrics.register_stats("enrich_load_stats", "Data loads done by lazy enrichment, by kind", enrich.stats)
+metrics.register_stats("strategy_stats", "Strategy evaluations, passes, errors and seconds spent", strategy_runner.stats, group_label="strategy")
 
 # 获取当前的sol价格
 gass_price = get_gas_price()
@@ -40,6 +56,14 @@ async def send_heartbeat(ws, wallet_address=None, access_token=None):
     while True:  
         await ws.send(json.dumps(ping_payload))  
         logger.info("Sent heartbeat")
+        # 各模块的统计在/metrics上导出，这里只在DEBUG级别输出
+        logger.debug(
+            "Stats: token info cache {}, prefilter {}, enrich loads {}, strategies {}",
+            gmgn_async.token_info_cache.stats,
+            prefilter.stats,
+            enrich.stats,
+            strategy_runner.summary(),
+        )
         # if access_token is not None:
         #     # 只是为了保证token不过期
         #     following_wallets = get_following_wallets(token=access_token, self_wallet_address=wallet_address)
@@ -51,7 +75,7 @@ async def send_heartbeat(ws, wallet_address=None, access_token=None):
 async def update_gas_price():
     global gass_price
     while True:
-        gass_price = get_gas_price()
+        gass_price = await gmgn_async.get_gas_price()
         logger.info(f"Update gas price: {gass_price}")
         await asyncio.sleep(600)
         
@@ -59,14 +83,16 @@ async def update_gas_price():
 async def send_message_with_retry(bot, channel_id, message, token_address, retries=3, timeout=1):  
     attempt = 0
     if not repeat_push:
-        history_push = await get_token_notify(token_address)
+        with metrics.stage("db_dedupe"):
+            history_push = await get_token_notify(token_address)
         if len(history_push) > 0:
             logger.info(f"Token {token_address} has been pushed, skip")
             return
     while attempt < retries:  
         try:
-            await bot.send_message(chat_id=channel_id, text=message, parse_mode="Markdown", disable_web_page_preview=True)
-            logger.info(f"Sent message: {message}")
+            with metrics.stage("telegram_send"):
+                await bot.send_message(chat_id=channel_id, text=message, parse_mode="Markdown", disable_web_page_preview=True)
+            logger.info("Sent message for token {}", token_address)
             if not repeat_push:
                 now_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 await insert_token_notify(token_address, now_time)
@@ -81,59 +107,99 @@ async def send_message_with_retry(bot, channel_id, message, token_address, retri
 
 async def send_message(bot, parsed_result, channel_id=channel_id):
     try:  
-        message = generate_markdown(parsed_result)
+        with metrics.stage("markdown"):
+            message = generate_markdown(parsed_result)
         token_address = parsed_result['token_address']
-        logger.info(f"Formatted message: {message}")  
+        log.payload("Formatted message: {}", message)
         
         if trade_monitor != -1:
-            await send_trade_with_retry(bot, channel_id, parsed_result)
+            with metrics.stage("dbot_trade"):
+                await send_trade_with_retry(bot, channel_id, parsed_result)
         await send_message_with_retry(bot, channel_id, message, token_address)  
     except Exception as e:
         logger.error(f"Unexpected error: {e}")  
         traceback.print_exc()
 
+async def handle_follow_data(follow_data, bot=None):
+    """解析交易信号并推送，由信号处理worker调用"""
+    global gass_price
+    with metrics.stage("enrich"):
+        parsed_result = await gmgn_async.parse_token_info(follow_data, gass_price=gass_price)
+    if parsed_result is None:
+        # 解析失败，或者减仓信号，不推送
+        return
+    log.payload("parsed_result: {}", parsed_result)
+    if bot is not None:
+        await send_message(bot, parsed_result, channel_id=channel_id)
+
+
+def get_enrich_pipeline(bot=None):
+    global enrich_pipeline
+    if enrich_pipeline is None:
+        enrich_pipeline = EnrichPipeline(
+            lambda follow_data: handle_follow_data(follow_data, bot=bot),
+            workers=enrich_workers,
+            max_pending=enrich_queue_size,
+            coalesce_window=enrich_coalesce_window,
+        )
+        enrich_pipeline.start()
+        metrics.register_stats(
+            "enrich_pipeline_stats",
+            "Enrich pipeline counters (submitted, dropped, coalesced, ...) and pending events",
+            lambda: {**enrich_pipeline.stats, "pending": enrich_pipeline.pending_count},
+        )
+    return enrich_pipeline
+
+
 async def listen(ws, bot=None):
+    pipeline = get_enrich_pipeline(bot)
     async for message in ws:
         try:
-            message = json.loads(message)
+            start = time.perf_counter()
+            message = fastjson.decode_frame(message)
+            metrics.observe_stage("ws_decode", time.perf_counter() - start)
+            capture.record_ws(message)
             if 'type' in message and message['type'] == 'pong':  
-                logger.info("Received ping")  
+                logger.debug("Received pong")
+                continue
+            elif message.get('type', None) == 'gap':
+                # 转发服务丢弃了推送或上游断线/重连，账本需要重新对账
+                logger.info("Relay gap: {}, upstreams down: {}", message.get('reason'), message.get('upstreams_down'))
+                gmgn_async.trade_ledger.mark_all_stale(degraded=message.get('upstreams_down', 0) > 0)
                 continue
             else:
-                logger.info(f"Received message: {message}")
+                log.payload("Received message: {}", message)
                 if 'data' not in message or len(message['data']) == 0:
                     continue
+                if ledger_enabled:
+                    # 所有推送（包括卖出）都记入交易账本，wSOL/稳定币/黑名单token不占用账本容量
+                    for activity in message['data']:
+                        try:
+                            if not prefilter.is_denied(activity['token_address']):
+                                gmgn_async.trade_ledger.record(activity)
+                        except Exception as e:
+                            logger.error(f"Failed to record activity to ledger: {e}")
                 follow_data = message['data'][0]
                 token_address = follow_data['token_address']
-                # 过滤掉稳定币的token
-                if "So11111111" in token_address or token_address == 'EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v':
-                    continue
-                global gass_price
-                parsed_result = parse_token_info(follow_data, gass_price=gass_price)
-                if parsed_result is None:
-                    # 解析失败，或者减仓信号，不推送
+                # 预过滤：卖出、稳定币/黑名单、金额和市值不可能通过策略的信号，不发请求直接丢弃
+                with metrics.stage("prefilter"):
+                    passed = prefilter.check(token_address, follow_data)
+                if not passed:
                     continue
-                logger.info(f"parsed_result: {parsed_result}")
-                if bot is not None:
-                    await send_message(bot, parsed_result, channel_id=channel_id)
+                pipeline.submit(token_address, follow_data)
         except Exception as e:
             logger.error(f"Error processing message: {e}")
             traceback.print_exc()
                 
                 
 async def fetch_valid_token(wallet_address):
-    global token_acquired_time
-    wallet_token = access_token_dict.get(wallet_address, None)
-    private_key = private_key_dict.get(wallet_address, None)
-    if wallet_token is None or datetime.now() - token_acquired_time >= token_expiry_duration:  
-        wallet_token = get_gmgn_token(wallet_address=wallet_address, private_key=private_key)
-        token_acquired_time = datetime.now()
-        access_token_dict[wallet_address] = wallet_token
-    return wallet_token
+    return await token_manager.get_token(wallet_address)
   
 async def connect_and_subscribe_task(bot=None):
     await bot.send_message(chat_id=channel_id, text="机器人启动成功！")
     gas_price_task = asyncio.create_task(update_gas_price())
+    token_refresh_task = asyncio.create_task(token_manager.run_background_refresh())
+    get_enrich_pipeline(bot)
     # for wallet_address in access_token_dict.keys():
     #     task = asyncio.create_task(connect_and_subscribe(wallet_address, bot))
     #     logger.info(f"Task created for wallet: {wallet_address}")
@@ -151,7 +217,7 @@ async def connect_and_subscribe(wallet_address, bot=None):
     while True:  
         try:  
             wallet_token = await fetch_valid_token(wallet_address)
-            websocket_url = f"wss://ws.gmgn.ai/stream?tk={wallet_token}"  
+            websocket_url = f"{gmgn_ws_url}?tk={wallet_token}"  
             async with websockets.connect(websocket_url) as ws:  
                 await subscribe(ws)  
   
@@ -174,8 +240,15 @@ async def connect_and_subscribe(wallet_address, bot=None):
 
 async def connect_local_websocket(bot=None):
     try:
-        async with websockets.connect(f"ws://{wallet_signal_server}:{wallet_signal_port}/{wallet_signal_route}") as ws:
+        compression = None if relay_compression == "none" else relay_compression
+        encoding = fastjson.resolve_encoding(relay_encoding)
+        async with websockets.connect(
+            f"ws://{wallet_signal_server}:{wallet_signal_port}/{wallet_signal_route}?encoding={encoding}",
+            compression=compression,
+        ) as ws:
             await subscribe(ws)  
+            # 断线期间可能漏掉推送，账本需要重新对账
+            gmgn_async.trade_ledger.mark_all_stale()
 
             # Create tasks for heartbeat and listening  
             heartbeat_task = asyncio.create_task(send_heartbeat(ws))
@@ -0,0 +1,39 @@
+import os
+import sys
+
+# config.conf在导入时读取这些必填配置，测试中使用假的值，不写token缓存文件
+os.environ.setdefault("PRIVATE_KEY_BASE58_LIST", "a")
+os.environ.setdefault("WALLET_ADDRESS_LIST", "W")
+os.environ.setdefault("CHANNEL_ID", "1")
+os.environ.setdefault("ADMIN_LIST", "1")
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "x")
+os.environ.setdefault("TIMEZONE", "Asia/Shanghai")
+os.environ.setdefault("LOG_ENQUEUE", "0")
+os.environ.setdefault("TOKEN_CACHE_FILE", "")
+os.environ.setdefault("TOKEN_INFO_CACHE_DB", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from utils import clock
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def fake_clock():
+    fake = FakeClock()
+    clock.set_clock(fake)
+    yield fake
+    clock.set_clock(None)
@@ -0,0 +1,420 @@
+"""重构前的实现，作为测试的参照
+
+parse_history来自基线版本的utils/gmgn.py，filter_token_strategy_2及其辅助函数来自删除前的utils/util.py
+（git show edb5852:utils/util.py），原样保留。
+"""
+import pytz
+from datetime import datetime
+from loguru import logger
+from config.conf import time_zone
+
+
+def parse_history(history, now_time=None):
+    """解析交易历史，获取每个钱包当前持仓比例，计算总购买钱包数、当前仍持仓钱包数，清仓钱包数；
+    并计算10min内购买钱包数、10min内清仓钱包数
+    """
+    result = {
+        "all_wallets": 0,
+        "full_wallets": 0,
+        "hold_wallets": 0,
+        "close_wallets": 0,
+        "10min_buys": 0,
+        "10min_close": 0,
+        "total_trades": len(history),
+        "3min_buys": 0,
+        "3min_close": 0,
+        "total_buy": 0,
+        "total_sell": 0,
+    }
+    first_trade_time = now_time
+    wallet_info = {}
+    recorded_10min_wallets = []
+    recorded_10min_buy_wallets = []
+    recorded_10min_sell_wallets = []
+    recorded_3min_wallets = []
+    recorded_3min_buy_wallets = []
+    recorded_3min_sell_wallets = []
+    for trade in history:
+        trade_time_stamp = trade["timestamp"]
+        trade_local_time = datetime.fromtimestamp(
+            trade_time_stamp, pytz.timezone(time_zone)
+        )
+
+        # 避免api时间差，过滤掉now_time之后的交易
+        if trade_local_time > now_time:
+            continue
+
+        wallet_address = trade["maker"]
+        event = trade["event"]
+        if event == "buy":
+            result["total_buy"] += 1
+        elif event == "sell":
+            result["total_sell"] += 1
+
+        is_open_or_close = trade["is_open_or_close"]
+        if is_open_or_close is None or is_open_or_close == "":
+            is_open_or_close = 0
+        is_open_or_close = int(is_open_or_close)
+        logger.info(
+            f"wallet_address: {wallet_address}, Event: {event}, is_open_or_close: {is_open_or_close}"
+        )
+        balance = (
+            float(trade["balance"])
+            if (trade["balance"] is not None) and (trade["balance"] != "")
+            else 0
+        )
+        bought_amount = float(trade["history_bought_amount"])
+        sold_amount = float(trade["history_sold_amount"])
+
+        if trade_local_time < first_trade_time:
+            first_trade_time = trade_local_time
+
+        trade_time_delta = (now_time - trade_local_time).total_seconds() / 60
+
+        if trade_time_delta <= 10.0 and trade_time_delta > 3.0:
+            if wallet_address not in recorded_10min_wallets:
+                recorded_10min_wallets.append(wallet_address)
+                if event == "buy":
+                    result["10min_buys"] += 1
+                elif event == "sell" and is_open_or_close == 1:
+                    result["10min_close"] += 1
+        if trade_time_delta <= 3.0:
+            if wallet_address not in recorded_3min_wallets:
+                recorded_3min_wallets.append(wallet_address)
+                if event == "buy":
+                    result["3min_buys"] += 1
+                elif event == "sell" and is_open_or_close == 1:
+                    result["3min_close"] += 1
+
+        if wallet_address not in wallet_info:
+            wallet_info[wallet_address] = {
+                "balance": balance,
+                "bought_amount": bought_amount,
+                "sold_amount": sold_amount,
+            }
+            if balance >= bought_amount:
+                result["full_wallets"] += 1
+            elif balance <= 1e-10:
+                result["close_wallets"] += 1
+            else:
+                result["hold_wallets"] += 1
+            result["all_wallets"] += 1
+        else:
+            continue
+    result["first_trade_time"] = first_trade_time.strftime("%Y-%m-%d %H:%M:%S")
+    return result
+
+
+def judge_price_increase(parsed_result, threshold=0.75):
+    """判断当前信号是否比上一个信号价格增加了一定比例"""
+    trade_history = parsed_result["trade_history"]
+    origin_history = parsed_result["origin_history"]
+    the_last_buy = None
+    last_second_buy = None
+    first_buy = None
+    # 如果钱包数不足2，返回False
+    if trade_history["all_wallets"] < 2:
+        return False, None, None, None, None
+    # 找到最后一次买入，倒数第二次买入，以及第一次买入
+    for i in range(len(origin_history)):
+        trade = origin_history[i]
+        event = trade["event"]
+        if event == "sell":
+            continue
+        
+        first_buy = trade
+        
+        if the_last_buy is None:
+            the_last_buy = trade
+            continue
+        if last_second_buy is None:
+            last_second_buy = trade
+            continue
+        
+        
+        
+        
+    the_last_buy_price = float(the_last_buy["price_usd"])
+
+    last_second_buy_price = float(last_second_buy["price_usd"])
+    
+    first_buy_price = float(first_buy["price_usd"])
+
+    if the_last_buy_price > 0 and last_second_buy_price > 0:
+        price_increase = the_last_buy_price / last_second_buy_price
+        if price_increase >= threshold + 1:
+            return True, price_increase, the_last_buy_price, last_second_buy_price, first_buy_price
+    return False, None, None, None, None
+
+
+def quatify_mc_and_net_change(
+    parsed_result,
+    mc_range=(0, 1e9),
+    net_in_1min_range=(0, 1e9),
+    net_in_5min_range=(0, 1e9),
+    net_in_diff_range=(0, 1e9),
+):
+    """量化市值和净流入的变化
+    其中， mc_range, net_in_1min_range, net_in_5min_range, net_in_diff_range分别是市值，1min净流入，5min净流入，5min-1min净流入的范围
+        例如: 300k以下慢拉性净流入1min净流入300-1k，5min大于3k小于5k
+        quatify_mc_and_net_change(parsed_result, mc_range=(0, 300000),
+                                        net_in_1min_range=(300, 1000), net_in_5min_range=(3000, 5000))
+    """
+    token_info = parsed_result["token_info"]
+    markect_cap = token_info["market_cap"]
+    net_in_volume_1m = token_info["net_in_volume_1m"]
+    net_in_volume_5m = token_info["net_in_volume_5m"]
+    net_in_diff = net_in_volume_5m - net_in_volume_1m
+    return (
+        markect_cap >= mc_range[0]
+        and markect_cap < mc_range[1]
+        and net_in_volume_1m >= net_in_1min_range[0]
+        and net_in_volume_1m < net_in_1min_range[1]
+        and net_in_volume_5m >= net_in_5min_range[0]
+        and net_in_volume_5m < net_in_5min_range[1]
+        and net_in_diff >= net_in_diff_range[0]
+        and net_in_diff < net_in_diff_range[1]
+    )
+
+
+def buy_and_close_judge(parsed_result, wallets_num=4):
+    """判断连续买入，不清仓，连续买入次数大于等于4"""
+    trade_history = parsed_result["trade_history"]
+    if (
+        trade_history["all_wallets"] >= wallets_num
+        and trade_history["close_wallets"] < 1
+    ):
+        return True
+    return False
+
+
+def token_safe_judge(parsed_result):
+    """判断币种安全性"""
+    token_info = parsed_result["token_info"]
+    if (
+        int(token_info["renounced_mint"])
+        and int(token_info["renounced_freeze_account"])
+        and float(token_info["burn_ratio"]) > 0
+        and str(token_info["burn_status"]) == "burn"
+    ):
+        return True
+    return False
+
+
+def filter_token_strategy_2(parsed_result, now_time):
+    """策略2"""
+    token_id = parsed_result["token_address"]
+    trade_history = parsed_result["trade_history"]
+    origin_history = parsed_result["origin_history"]
+    token_info = parsed_result["token_info"]
+    # kline = parsed_result['kline']
+    # token_create_time = datetime.strptime(token_info['create_time'], '%Y-%m-%d %H:%M:%S').astimezone(pytz.timezone(time_zone))
+    # token_open_time = datetime.strptime(
+    #     token_info["open_time"], "%Y-%m-%d %H:%M:%S"
+    # ).astimezone(pytz.timezone(time_zone))
+    launchpad = None
+    launchpad_status = 1  # launchpad_status: 0:内盘，1:外盘
+    # 钱包数大于等于2，这次信号比上次信号，价格增加了75%
+    if_price_increase, price_increase, the_last_buy_price, last_second_buy_price, first_buy_price = (
+        judge_price_increase(parsed_result)
+    )
+    
+    first_buy_mc = first_buy_price * (
+                token_info["market_cap"] / token_info["price"]
+            ) if first_buy_price is not None else None
+    
+    the_last_buy_mc = the_last_buy_price * (
+        token_info["market_cap"] / token_info["price"]
+    ) if the_last_buy_price is not None else None
+    
+    last_second_buy_mc = last_second_buy_price * (
+        token_info["market_cap"] / token_info["price"]
+    ) if last_second_buy_price is not None else None
+    
+
+    # 1. 价格上涨满足条件
+    if if_price_increase:
+        # 1.1 300k以下慢拉性净流入1min净流入300-1k，5min大于3k小于5k
+        if quatify_mc_and_net_change(
+            parsed_result,
+            mc_range=(0, 300000),
+            net_in_1min_range=(300, 1000),
+            net_in_5min_range=(3000, 5000),
+        ):
+            logger.info(
+                f"token: {token_id} passed regular 1.1 Market cap: {token_info['market_cap']}"
+            )
+            return {"pass": True, "strategy": "1.1"}
+        # 1.2 100k以下快拉性净流入1min大于3k，5min大于9k,并且5min减去1min的差值大于3.5k
+        if quatify_mc_and_net_change(
+            parsed_result,
+            mc_range=(0, 100000),
+            net_in_1min_range=(3000, 1e9),
+            net_in_5min_range=(9000, 1e9),
+            net_in_diff_range=(3500, 1e9),
+        ):
+            logger.info(
+                f"token: {token_id} passed regular 1.2 Market cap: {token_info['market_cap']}"
+            )
+            return {"pass": True, "strategy": "1.2"}
+        # 1.3 100k以上300k以下，1min净流入2k-7k，5min净流入大于6.5k小于15.5k，或者5min减去1min的差值大于12k小于20k
+        if quatify_mc_and_net_change(
+            parsed_result,
+            mc_range=(100000, 300000),
+            net_in_1min_range=(2000, 7000),
+            net_in_5min_range=(6500, 15500),
+            net_in_diff_range=(0, 1e9),
+        ) or quatify_mc_and_net_change(
+            parsed_result,
+            mc_range=(100000, 300000),
+            net_in_1min_range=(0, 1e9),
+            net_in_5min_range=(0, 1e9),
+            net_in_diff_range=(12000, 20000),
+        ):
+            logger.info(
+                f"token: {token_id} passed regular 1.3 Market cap: {token_info['market_cap']}"
+            )
+            return {"pass": True, "strategy": "1.3"}
+    logger.info(f"Failed to pass regular 1.")
+
+    # 2. 钱包数大于等于4，且无清仓信号，也过一遍上面的三个量化策略
+    if buy_and_close_judge(parsed_result):
+        # 2.1 300k以下慢拉性净流入1min净流入300-1k，5min大于3k小于5k
+        if quatify_mc_and_net_change(
+            parsed_result,
+            mc_range=(0, 300000),
+            net_in_1min_range=(300, 1000),
+            net_in_5min_range=(3000, 5000),
+        ):
+            logger.info(
+                f"token: {token_id} passed regular 2.1 Market cap: {token_info['market_cap']}"
+            )
+            return {"pass": True, "strategy": "2.1"}
+        # 2.2 100k以下快拉性净流入1min大于3k，5min大于9k,并且5min减去1min的差值大于3.5k
+        if quatify_mc_and_net_change(
+            parsed_result,
+            mc_range=(0, 100000),
+            net_in_1min_range=(3000, 1e9),
+            net_in_5min_range=(9000, 1e9),
+            net_in_diff_range=(3500, 1e9),
+        ):
+            logger.info(
+                f"token: {token_id} passed regular 2.2 Market cap: {token_info['market_cap']}"
+            )
+            return {"pass": True, "strategy": "2.2"}
+        # 2.3 100k以上300k以下，1min净流入2k-6.5k，5min净流入大于6.5k小于15k，或者5min减去1min的差值大于8.5k
+        if quatify_mc_and_net_change(
+            parsed_result,
+            mc_range=(100000, 300000),
+            net_in_1min_range=(2000, 6500),
+            net_in_5min_range=(6500, 15000),
+            net_in_diff_range=(0, 1e9),
+        ) or quatify_mc_and_net_change(
+            parsed_result,
+            mc_range=(100000, 300000),
+            net_in_1min_range=(0, 1e9),
+            net_in_5min_range=(0, 1e9),
+            net_in_diff_range=(8500, 1e9),
+        ):
+            logger.info(
+                f"token: {token_id} passed regular 2.3 Market cap: {token_info['market_cap']}"
+            )
+            return {"pass": True, "strategy": "2.3"}
+    logger.info(f"Failed to pass regular 2.")
+
+    # 3. 当前是第一个信号，且市值大于300k，满足5min-1min净流入大于10k
+    # if (
+    #     trade_history["all_wallets"] == 1
+    #     and token_info["market_cap"] >= 300000
+    #     and token_info["net_in_volume_5m"] - token_info["net_in_volume_1m"] > 10000
+    # ):
+    #     logger.info(
+    #         f"token: {token_id} passed regular 3. Market cap: {token_info['market_cap']}"
+    #     )
+    #     return {"pass": True, "strategy": "3"}
+    # logger.info(f"Failed to pass regular 3.")
+
+    # 4. 100k以下快拉性净流入1min大于3k，5min大于15k,并且5min减去1min的差值大于5k. 并且钱包数只有1个
+    if quatify_mc_and_net_change(
+        parsed_result,
+        mc_range=(0, 100000),
+        net_in_1min_range=(3000, 1e9),
+        net_in_5min_range=(15000, 1e9),
+        net_in_diff_range=(5000, 1e9),
+    ) and trade_history["all_wallets"] == 1:
+        logger.info(
+            f"token: {token_id} passed regular 4. Market cap: {token_info['market_cap']}"
+        )
+        return {"pass": True, "strategy": "4"}
+    logger.info(f"Failed to pass regular 4.")
+
+    # 5. 如果当前是第二个或者第三个信号都行，第一个信号超过100k，且当前信号相比上一个信号，价格增加了75%以上，5min>0
+    if trade_history["all_wallets"] == 2 or trade_history["all_wallets"] == 3:
+        # 计算第一个信号的市值
+        if the_last_buy_price is not None and last_second_buy_price is not None:
+            # last_second_buy_mc = last_second_buy_price * (
+            #     token_info["market_cap"] / token_info["price"]
+            # )
+            if first_buy_mc > 100000 and price_increase >= 1.75 and token_info["net_in_volume_5m"] > 0:
+                logger.info(
+                    f"token: {token_id} passed regular 5. Market cap: {token_info['market_cap']}"
+                )
+                return {"pass": True, "strategy": "5"}
+    logger.info(f"Failed to pass regular 5.")
+
+    # 6.信号超过500k，加安全性检测,限制市值在500k-2M
+    if (
+        token_info["market_cap"] >= 500000
+        and token_info["market_cap"] <= 2000000
+        and token_safe_judge(parsed_result)
+        # and trade_history["all_wallets"] <= 2
+    ):
+        # 1. 慢拉性1min<0 5min>7.5k或者0<1min<1k 5min>7.5k
+        # 2. 快拉性2k<1min 5min>5k 但是如果5min-1min>13.5k不行
+        # 3. 热度盘5min>100k
+        result_6_1 = quatify_mc_and_net_change(
+            parsed_result,
+            mc_range=(500000, 2000000),
+            net_in_1min_range=(0, 1000),
+            net_in_5min_range=(7500, 1e9),
+        )
+        result_6_2 = quatify_mc_and_net_change(
+            parsed_result,
+            mc_range=(500000, 2000000),
+            net_in_1min_range=(2000, 1e9),
+            net_in_5min_range=(5000, 1e9),
+            net_in_diff_range=(0, 13500),
+        )
+        result_6_3 = token_info["net_in_volume_5m"] > 100000
+        if result_6_1 or result_6_2 or result_6_3:
+            logger.info(
+                f"token: {token_id} passed regular 6. Market cap: {token_info['market_cap']}"
+            )
+            return {"pass": True, "strategy": "6"}
+    logger.info(f"Failed to pass regular 6.")
+    
+    # 7.前一个信号小于60k,后面一个信号大于100k进行推送
+    if the_last_buy_mc is not None and last_second_buy_mc is not None:
+        if last_second_buy_mc < 60000 and the_last_buy_mc > 100000:
+            logger.info(
+                f"token: {token_id} passed regular 7. Market cap: {token_info['market_cap']}"
+            )
+            return {"pass": True, "strategy": "7"}
+    logger.info(f"Failed to pass regular 7.")
+    
+    # 8.市值大于100k小于200k，1min净流入300-1k或者1min净流入小于等于0，5min大于3k小于5k.
+    
+    if quatify_mc_and_net_change(
+        parsed_result,
+        mc_range=(100000, 200000),
+        net_in_1min_range=(300, 1000),
+        net_in_5min_range=(3000, 5000),
+    ):
+        logger.info(
+            f"token: {token_id} passed regular 8. Market cap: {token_info['market_cap']}"
+        )
+        return {"pass": True, "strategy": "8"}
+    logger.info(f"Failed to pass regular 8.")
+    
+
+    return {"pass": False, "strategy": "None"}
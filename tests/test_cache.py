@@ -0,0 +1,108 @@
+import asyncio
+import pytest
+from utils.cache import TokenInfoCache, field_ttl
+
+
+def make_fetch(calls, gate=None):
+    async def fetch(token_address):
+        calls.append(token_address)
+        if gate is not None:
+            await gate.wait()
+        return {"total_supply": 1000, "net_in_volume_1m": len(calls)}
+
+    return fetch
+
+
+def test_concurrent_misses_share_one_request(fake_clock):
+    calls = []
+
+    async def main():
+        gate = asyncio.Event()
+        cache = TokenInfoCache(make_fetch(calls, gate), use_db=False)
+        tasks = [asyncio.create_task(cache.get("T")) for _ in range(3)]
+        await asyncio.sleep(0)
+        gate.set()
+        return cache, await asyncio.gather(*tasks)
+
+    cache, results = asyncio.run(main())
+    assert calls == ["T"]
+    assert results == [{"total_supply": 1000, "net_in_volume_1m": 1}] * 3
+    assert cache.stats["misses"] == 1
+    assert cache.stats["coalesced"] == 2
+    assert cache.inflight == {}
+
+
+def test_fetch_error_reaches_every_waiter_and_is_not_cached(fake_clock):
+    calls = []
+
+    async def fetch(token_address):
+        calls.append(token_address)
+        await asyncio.sleep(0)
+        raise Exception("fetch failed")
+
+    async def main():
+        cache = TokenInfoCache(fetch, use_db=False)
+        results = await asyncio.gather(cache.get("T"), cache.get("T"), return_exceptions=True)
+        return cache, results
+
+    cache, results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(isinstance(result, Exception) for result in results)
+    assert cache.peek("T") is None
+    assert cache.inflight == {}
+
+
+def test_static_fields_outlive_volatile_ttl(fake_clock):
+    calls = []
+    cache = TokenInfoCache(make_fetch(calls), use_db=False)
+    volatile_ttl = field_ttl("net_in_volume_1m")
+    assert field_ttl("total_supply") > volatile_ttl
+
+    async def main():
+        await cache.get("T")
+        fake_clock.advance(volatile_ttl + 1)
+        # 只需要静态字段时，短TTL字段过期也直接命中
+        static = await cache.get("T", fields=("total_supply",))
+        assert calls == ["T"]
+        assert static["total_supply"] == 1000
+        # 需要短TTL字段或全部字段时重新请求
+        volatile = await cache.get("T", fields=("net_in_volume_1m",))
+        assert volatile["net_in_volume_1m"] == 2
+        assert len(calls) == 2
+        await cache.get("T")
+        assert len(calls) == 2
+
+    asyncio.run(main())
+    assert cache.stats["hits"] == 2
+    assert cache.stats["misses"] == 2
+
+
+def test_static_ttl_expires(fake_clock):
+    calls = []
+    cache = TokenInfoCache(make_fetch(calls), use_db=False)
+
+    async def main():
+        await cache.get("T")
+        fake_clock.advance(field_ttl("total_supply"))
+        await cache.get("T", fields=("total_supply",))
+
+    asyncio.run(main())
+    assert len(calls) == 2
+
+
+def test_missing_field_is_not_fresh(fake_clock):
+    cache = TokenInfoCache(make_fetch([]), use_db=False)
+    cache._store("T", {"total_supply": 1}, fake_clock.now)
+    assert cache.peek("T", ["total_supply"]) == {"total_supply": 1}
+    assert cache.peek("T", ["net_in_volume_1m"]) is None
+    # 没有完整请求过的token不能满足全部字段的请求
+    assert cache.peek("T") is None
+
+
+@pytest.mark.parametrize("max_size", [1, 2])
+def test_lru_eviction(fake_clock, max_size):
+    cache = TokenInfoCache(make_fetch([]), max_size=max_size, use_db=False)
+    for token_address in ("A", "B", "C"):
+        cache._store(token_address, {"total_supply": 1}, fake_clock.now, complete=True)
+    assert list(cache.entries) == ["A", "B", "C"][-max_size:]
+    assert cache.complete == set(cache.entries)
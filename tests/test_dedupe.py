@@ -0,0 +1,54 @@
+from utils.dedupe import ActivityDeduper, activity_key
+
+
+def activity(tx_hash="tx1", wallet_address="W1", **fields):
+    return {"tx_hash": tx_hash, "wallet_address": wallet_address, "token_address": "T", "timestamp": 1, **fields}
+
+
+def test_activity_key():
+    assert activity_key(activity()) == ("tx1", "W1")
+    # 没有交易哈希时使用 钱包+token+时间+事件
+    data = {"wallet_address": "W1", "token": {"address": "T"}, "timestamp": 5, "event_type": "buy"}
+    assert activity_key(data) == ("W1", "T", 5, "buy")
+
+
+def test_duplicate_within_window():
+    deduper = ActivityDeduper(max_size=10, window=60)
+    assert not deduper.is_duplicate("k", now=0)
+    assert deduper.is_duplicate("k", now=59)
+    # 窗口按首次出现的时间计算
+    assert not deduper.is_duplicate("k", now=60)
+    assert deduper.stats == {"activities": 3, "duplicates": 1}
+    assert deduper.duplicate_rate() == 1 / 3
+
+
+def test_max_size_evicts_oldest():
+    deduper = ActivityDeduper(max_size=2, window=60)
+    for key in ("a", "b", "c"):
+        assert not deduper.is_duplicate(key, now=0)
+    assert list(deduper.seen) == ["b", "c"]
+    assert not deduper.is_duplicate("a", now=1)
+
+
+def test_filter_message():
+    deduper = ActivityDeduper(max_size=10, window=60)
+    first = {"channel": "c", "data": [activity("tx1"), activity("tx2")]}
+    assert deduper.filter_message(first) is first
+
+    # 另一个账号推送的同一笔交易
+    second = {"channel": "c", "data": [activity("tx2"), activity("tx3")]}
+    filtered = deduper.filter_message(second)
+    assert filtered == {"channel": "c", "data": [activity("tx3")]}
+    assert len(second["data"]) == 2
+
+    assert deduper.filter_message({"channel": "c", "data": [activity("tx1")]}) is None
+    # 同一笔交易不同钱包不算重复
+    assert deduper.filter_message({"data": [activity("tx1", "W2")]}) is not None
+
+
+def test_filter_message_passes_non_trade_frames():
+    deduper = ActivityDeduper(max_size=10, window=60)
+    pong = {"type": "pong"}
+    assert deduper.filter_message(pong) is pong
+    assert deduper.filter_message({"data": []}) == {"data": []}
+    assert deduper.stats["activities"] == 0
@@ -0,0 +1,115 @@
+from utils.ledger import TradeLedger
+
+
+def push(wallet_address, event, timestamp, tx_hash=None, **fields):
+    """websocket推送的交易"""
+    data = {
+        "token_address": "T",
+        "wallet_address": wallet_address,
+        "event_type": event,
+        "timestamp": timestamp,
+        "tx_hash": tx_hash,
+        "price_usd": "0.1",
+        "cost_usd": "10",
+    }
+    data.update(fields)
+    return data
+
+
+def rest_trade(maker, event, timestamp, tx_hash, balance, bought, sold=0):
+    """交易历史接口返回的交易"""
+    return {
+        "maker": maker,
+        "event": event,
+        "timestamp": timestamp,
+        "tx_hash": tx_hash,
+        "price_usd": "0.1",
+        "is_open_or_close": 0,
+        "token_amount": "100",
+        "cost_usd": "10",
+        "balance": balance,
+        "history_bought_amount": bought,
+        "history_sold_amount": sold,
+    }
+
+
+def test_record_with_position_fields(fake_clock):
+    ledger = TradeLedger(max_tokens=10, resync_seconds=60)
+    ledger.record(push("W1", "buy", 1, "tx1", balance="100", history_bought_amount="100"))
+    ledger.record(push("W2", "buy", 2, "tx2", balance="50", history_bought_amount="50"))
+    ledger.record(push("W1", "buy", 1, "tx1", balance="100", history_bought_amount="100"))
+    history = ledger.history("T")
+    assert [trade["tx_hash"] for trade in history] == ["tx2", "tx1"]
+    assert history[1]["balance"] == "100"
+    assert ledger.stats["recorded"] == 2
+    assert ledger.stats["duplicates"] == 1
+    # 未对账前不能直接使用
+    assert not ledger.is_warm("T")
+
+
+def test_position_derived_from_previous_trades(fake_clock):
+    ledger = TradeLedger(max_tokens=10, resync_seconds=60)
+    ledger.record(push("W1", "buy", 1, "tx1", token_amount="100", is_open_or_close=1))
+    ledger.record(push("W1", "buy", 2, "tx2", token_amount="50"))
+    ledger.record(push("W1", "sell", 3, "tx3", token_amount="30"))
+    latest = ledger.history("T")[0]
+    assert latest["balance"] == 120
+    assert latest["history_bought_amount"] == 150
+    assert latest["history_sold_amount"] == 30
+    ledger.record(push("W1", "sell", 4, "tx4", token_amount="10", is_open_or_close=1))
+    assert ledger.history("T")[0]["balance"] == 0
+
+
+def test_unknown_position_marks_gap(fake_clock):
+    ledger = TradeLedger(max_tokens=10, resync_seconds=60)
+    ledger.reconcile("T", [rest_trade("W1", "buy", 1, "tx1", "100", "100")])
+    assert ledger.is_warm("T")
+    # 没有仓位字段，也不是开仓买入，无法推算
+    ledger.record(push("W2", "sell", 2, "tx2", token_amount="10"))
+    assert not ledger.is_warm("T")
+    assert ledger.stats["gaps"] == 1
+
+
+def test_reconcile_keeps_trades_after_snapshot(fake_clock):
+    ledger = TradeLedger(max_tokens=10, resync_seconds=60)
+    ledger.record(push("W1", "buy", 1, None, token_amount="100", is_open_or_close=1))
+    ledger.record(push("W2", "buy", 3, "tx3", balance="20", history_bought_amount="20"))
+    history = [
+        rest_trade("W2", "buy", 2, "tx2", "10", "10"),
+        rest_trade("W1", "buy", 1, "tx1", "100", "100"),
+    ]
+    ledger.reconcile("T", history)
+    trades = ledger.history("T")
+    # 没有tx_hash的推送按 钱包+时间+事件 判断已包含在REST结果中
+    assert [trade["tx_hash"] for trade in trades] == ["tx3", "tx2", "tx1"]
+    assert ledger.tokens["T"]["positions"]["W2"]["balance"] == 20
+    assert ledger.is_warm("T")
+    assert ledger.stats["reconciled"] == 1
+
+
+def test_warm_expires_and_mark_all_stale(fake_clock):
+    ledger = TradeLedger(max_tokens=10, resync_seconds=60)
+    ledger.reconcile("T", [])
+    assert ledger.is_warm("T")
+    fake_clock.advance(60)
+    assert not ledger.is_warm("T")
+
+    ledger.reconcile("T", [])
+    ledger.mark_all_stale()
+    assert not ledger.is_warm("T")
+
+    # 有上游未连接时，重新对账后也不可用，直到上游恢复
+    ledger.mark_all_stale(degraded=True)
+    ledger.reconcile("T", [])
+    assert not ledger.is_warm("T")
+    ledger.mark_all_stale(degraded=False)
+    ledger.reconcile("T", [])
+    assert ledger.is_warm("T")
+
+
+def test_max_tokens_evicts_least_recent(fake_clock):
+    ledger = TradeLedger(max_tokens=2, resync_seconds=60)
+    for token_address in ("A", "B", "C"):
+        ledger.reconcile(token_address, [])
+    assert list(ledger.tokens) == ["B", "C"]
+    assert ledger.history("A") == []
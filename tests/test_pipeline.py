@@ -0,0 +1,136 @@
+import asyncio
+from utils.pipeline import EnrichPipeline
+
+
+async def wait_idle(pipeline):
+    await pipeline.queue.join()
+    await asyncio.sleep(0)
+
+
+def test_same_token_in_order_and_tokens_concurrent():
+    processed = []
+    running = {"now": 0, "max": 0}
+
+    async def handler(data):
+        token_address, index = data
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(0.01 * (3 - index % 3))
+        running["now"] -= 1
+        processed.append(data)
+
+    async def main():
+        pipeline = EnrichPipeline(handler, workers=4)
+        pipeline.start()
+        for index in range(6):
+            for token_address in ("A", "B", "C"):
+                pipeline.submit(token_address, (token_address, index))
+        await wait_idle(pipeline)
+        await pipeline.stop()
+        return pipeline
+
+    pipeline = asyncio.run(main())
+    for token_address in ("A", "B", "C"):
+        assert [index for token, index in processed if token == token_address] == list(range(6))
+    assert running["max"] > 1
+    assert pipeline.stats["processed"] == 18
+    assert pipeline.pending == {} and pipeline.pending_count == 0
+
+
+def test_events_during_processing_coalesce_to_latest():
+    processed = []
+
+    async def main():
+        gate = asyncio.Event()
+
+        async def handler(data):
+            processed.append(data)
+            if data == 1:
+                await gate.wait()
+
+        pipeline = EnrichPipeline(handler, workers=2, coalesce_window=60)
+        pipeline.start()
+        pipeline.submit("A", 1)
+        await asyncio.sleep(0.01)
+        # 处理中到达的事件在本次处理结束后立即合并处理，不等合并窗口
+        for data in (2, 3, 4):
+            pipeline.submit("A", data)
+        pipeline.submit("B", 10)
+        await asyncio.sleep(0.01)
+        assert processed == [1, 10]
+        gate.set()
+        await wait_idle(pipeline)
+        await pipeline.stop()
+        return pipeline
+
+    pipeline = asyncio.run(main())
+    assert processed == [1, 10, 4]
+    assert pipeline.stats["coalesced"] == 2
+    assert pipeline.stats["processed"] == 3
+    assert pipeline.pending_count == 0
+
+
+def test_events_after_processing_wait_for_window():
+    processed = []
+
+    async def handler(data):
+        processed.append(data)
+
+    async def main():
+        pipeline = EnrichPipeline(handler, workers=2, coalesce_window=0.1)
+        pipeline.start()
+        pipeline.submit("A", 1)
+        await wait_idle(pipeline)
+        # 刚处理完的token，窗口内到达的事件等窗口结束后合并为一次处理
+        pipeline.submit("A", 2)
+        pipeline.submit("A", 3)
+        await asyncio.sleep(0.02)
+        assert processed == [1]
+        await asyncio.sleep(0.15)
+        await wait_idle(pipeline)
+        await pipeline.stop()
+        return pipeline
+
+    pipeline = asyncio.run(main())
+    assert processed == [1, 3]
+    assert pipeline.stats["coalesced"] == 1
+
+
+def test_full_buffer_drops_events():
+    async def handler(data):
+        await asyncio.sleep(0)
+
+    async def main():
+        pipeline = EnrichPipeline(handler, workers=1, max_pending=2)
+        results = [pipeline.submit("A", index) for index in range(3)]
+        pipeline.start()
+        await wait_idle(pipeline)
+        await pipeline.stop()
+        return pipeline, results
+
+    pipeline, results = asyncio.run(main())
+    assert results == [True, True, False]
+    assert pipeline.stats["dropped"] == 1
+    assert pipeline.stats["processed"] == 2
+
+
+def test_handler_error_does_not_stop_worker():
+    processed = []
+
+    async def handler(data):
+        if data == "bad":
+            raise ValueError("bad event")
+        processed.append(data)
+
+    async def main():
+        pipeline = EnrichPipeline(handler, workers=1)
+        pipeline.start()
+        pipeline.submit("A", "bad")
+        pipeline.submit("A", "good")
+        await wait_idle(pipeline)
+        await pipeline.stop()
+        return pipeline
+
+    pipeline = asyncio.run(main())
+    assert processed == ["good"]
+    assert pipeline.stats["failed"] == 1
@@ -0,0 +1,98 @@
+"""parse_history和策略2规则文件与重构前的实现（tests/reference.py）结果一致"""
+import random
+import pytest
+import pytz
+from datetime import datetime
+from config.conf import time_zone
+from utils import gmgn
+from utils.util import filter_token
+from tests import reference
+
+NOW = datetime.fromtimestamp(1_700_000_000, pytz.timezone(time_zone))
+WALLETS = [f"W{index}" for index in range(6)]
+
+
+def random_history(rng):
+    """随机的交易历史（最新的在前），包含now之后、3min内、10min内和更早的交易"""
+    now_timestamp = int(NOW.timestamp())
+    trades = []
+    for _ in range(rng.randint(0, 25)):
+        bought = rng.choice([100, 250.5, 1000])
+        trades.append(
+            {
+                "maker": rng.choice(WALLETS),
+                "event": rng.choice(["buy", "buy", "sell"]),
+                "timestamp": now_timestamp - rng.choice([-30, 0, 60, 180, 181, 400, 600, 601, 1200]) - rng.randint(0, 5),
+                "is_open_or_close": rng.choice([0, 1, "0", "1", "", None]),
+                "balance": rng.choice([None, "", "0", "1e-11", str(bought / 2), str(bought), str(bought * 2)]),
+                "history_bought_amount": str(bought),
+                "history_sold_amount": rng.choice(["0", "50"]),
+            }
+        )
+    trades.sort(key=lambda trade: trade["timestamp"], reverse=True)
+    return trades
+
+
+@pytest.mark.parametrize("numpy_threshold", [0, 1])
+def test_parse_history_matches_reference(monkeypatch, numpy_threshold):
+    if numpy_threshold and gmgn.np is None:
+        pytest.skip("numpy is not installed")
+    monkeypatch.setattr(gmgn, "parse_history_numpy_threshold", numpy_threshold)
+    rng = random.Random(20240601)
+    for _ in range(300):
+        history = random_history(rng)
+        assert gmgn.parse_history(history, NOW) == reference.parse_history(history, NOW)
+
+
+def random_parsed_result(rng):
+    """随机的过滤输入，市值、净流入取规则边界附近的值"""
+    all_wallets = rng.randint(1, 6)
+    price = rng.choice([0.0001, 0.001, 0.01])
+    market_cap = rng.choice([50000, 99999, 100000, 150000, 200000, 299999, 300000, 499999, 500000, 2000000, 2000001])
+    net_in_1m = rng.choice([-500, 0, 299, 300, 999, 1000, 2000, 3000, 6500, 7000])
+    net_in_5m = net_in_1m + rng.choice([-100, 0, 3000, 3500, 5000, 8500, 12000, 13500, 20000, 120000])
+    buys = []
+    buy_price = price / rng.choice([1, 2, 5, 20])
+    for _ in range(max(all_wallets, 2) if rng.random() < 0.95 else 1):
+        buys.append(buy_price)
+        buy_price = buy_price * rng.choice([0.5, 1, 1.75, 2, 3])
+    origin_history = []
+    for timestamp, buy in enumerate(reversed(buys)):
+        if rng.random() < 0.3:
+            origin_history.append({"event": "sell", "price_usd": str(buy)})
+        origin_history.append({"event": "buy", "price_usd": str(buy), "timestamp": timestamp})
+    return {
+        "token_address": "T",
+        "token_info": {
+            "market_cap": market_cap,
+            "price": price,
+            "net_in_volume_1m": net_in_1m,
+            "net_in_volume_5m": net_in_5m,
+            "renounced_mint": rng.choice([0, 1]),
+            "renounced_freeze_account": rng.choice([0, 1]),
+            "burn_ratio": rng.choice(["0", "0.5"]),
+            "burn_status": rng.choice(["burn", "none"]),
+        },
+        "trade_history": {"all_wallets": all_wallets, "close_wallets": rng.choice([0, 0, 1])},
+        "origin_history": origin_history,
+    }
+
+
+def evaluate(func, *args):
+    try:
+        return func(*args)
+    except Exception as e:
+        return type(e)
+
+
+def test_strategy_2_rules_match_reference():
+    rng = random.Random(20240602)
+    passed = set()
+    for _ in range(3000):
+        parsed_result = random_parsed_result(rng)
+        expected = evaluate(reference.filter_token_strategy_2, parsed_result, NOW)
+        assert evaluate(filter_token, parsed_result, NOW, 2) == expected, parsed_result
+        if isinstance(expected, dict) and expected["pass"]:
+            passed.add(expected["strategy"])
+    # 随机输入覆盖了大部分规则
+    assert len(passed) >= 8, passed
@@ -1,11 +1,11 @@
 import requests
 import json
 from loguru import logger
-from config.conf import dbot_token
+from config.conf import dbot_token, dbot_api_base
 
 
 def get_wallet_id(dbot_token, chain="solana"):
-    url = f"https://api-bot-v1.dbotx.com/account/wallets?type={chain}"
+    url = f"{dbot_api_base}/account/wallets?type={chain}"
     header = {
         "Content-Type": "application/json",
         "X-API-KEY": dbot_token
@@ -28,7 +28,7 @@ def get_wallet_id(dbot_token, chain="solana"):
     return wallet_ids
 
 def dbot_swap(wallet_id, token_address, dbot_token, amountOrPercent, swap_type='buy', chain="solana", retries=2):
-    url = f"https://api-bot-v1.dbotx.com/automation/swap_order"
+    url = f"{dbot_api_base}/automation/swap_order"
     header = {
         "Content-Type": "application/json",
         "X-API-KEY": dbot_token
@@ -65,7 +65,7 @@ def dbot_swap(wallet_id, token_address, dbot_token, amountOrPercent, swap_type='
 
 
 def dbot_simulate_swap(wallet_id, token_address, dbot_token, amountOrPercent=0.2, swap_type='buy', chain="solana"):
-    url = f"https://api-bot-v1.dbotx.com/simulator/sim_swap_order"
+    url = f"{dbot_api_base}/simulator/sim_swap_order"
     header = {
         "Content-Type": "application/json",
         "X-API-KEY": dbot_token
@@ -99,7 +99,7 @@ def dbot_simulate_swap(wallet_id, token_address, dbot_token, amountOrPercent=0.2
 def dbot_simulate_limit_order(wallet_id, token_address, dbot_token, trade_type, trigger_price_usd, trigger_direction, 
                               currencyAmountUI, maxSlippage, priorityFee="", chain="solana"):
     
-    url = f"https://api-bot-v1.dbotx.com/simulator/limit_orders"
+    url = f"{dbot_api_base}/simulator/limit_orders"
     data = { 
         "chain": chain, 
         "pair": token_address, 
@@ -0,0 +1,136 @@
+import json
+import asyncio
+from collections import OrderedDict
+from loguru import logger
+from utils import clock
+from databases.database import get_token_static_info, upsert_token_static_info
+from config.conf import (
+    token_info_static_ttl,
+    token_info_volatile_ttl,
+    token_info_cache_size,
+    token_info_cache_db,
+)
+
+# token创建后基本不会变化的字段，长时间缓存；其余字段（净流入、持有人数等）使用短TTL
+STATIC_FIELDS = (
+    "total_supply",
+    "creation_timestamp",
+    "open_timestamp",
+    "pool_initial_reverse",
+    "renounced_mint",
+    "renounced_freeze_account",
+    "burn_status",
+)
+
+
+def field_ttl(field):
+    if field in STATIC_FIELDS:
+        return token_info_static_ttl
+    return token_info_volatile_ttl
+
+
+class TokenInfoCache:
+    """token信息的进程内缓存
+
+    每个字段单独记录获取时间，按字段的TTL判断是否新鲜；只需要静态字段（如total_supply）时，
+    即使短TTL字段已过期也可以直接命中。同一个token并发未命中时只发出一个请求。
+    开启TOKEN_INFO_CACHE_DB后，静态字段会写入sqlite，重启后仍可使用。
+    """
+
+    def __init__(self, fetch, max_size=token_info_cache_size, use_db=token_info_cache_db):
+        self.fetch = fetch
+        self.max_size = max_size
+        self.use_db = use_db
+        # token_address -> {field: (value, fetched_at)}
+        self.entries = OrderedDict()
+        # 通过HTTP完整获取过的token；从sqlite加载的只有静态字段，不能满足fields=None的请求
+        self.complete = set()
+        self.inflight = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "db_hits": 0}
+
+    def _fresh(self, token_address, fields, now):
+        entry = self.entries.get(token_address, None)
+        if entry is None:
+            return False
+        if fields is None:
+            if token_address not in self.complete:
+                return False
+            fields = entry.keys()
+            if not fields:
+                return False
+        for field in fields:
+            if field not in entry:
+                return False
+            value, fetched_at = entry[field]
+            if now - fetched_at >= field_ttl(field):
+                return False
+        return True
+
+    def _store(self, token_address, data, fetched_at, complete=False):
+        entry = self.entries.get(token_address, {})
+        for field, value in data.items():
+            entry[field] = (value, fetched_at)
+        self.entries[token_address] = entry
+        self.entries.move_to_end(token_address)
+        if complete:
+            self.complete.add(token_address)
+        while len(self.entries) > self.max_size:
+            evicted, _ = self.entries.popitem(last=False)
+            self.complete.discard(evicted)
+
+    def peek(self, token_address, fields=None):
+        """只查缓存，不发请求；缓存不新鲜时返回None"""
+        if not self._fresh(token_address, fields, clock.now()):
+            return None
+        entry = self.entries[token_address]
+        return {field: value for field, (value, _) in entry.items()}
+
+    async def get(self, token_address, fields=None):
+        """获取token信息，fields为需要保证新鲜的字段，None表示完整请求返回的全部字段"""
+        result = self.peek(token_address, fields)
+        if result is not None:
+            self.stats["hits"] += 1
+            self.entries.move_to_end(token_address)
+            return result
+
+        if self.use_db and fields is not None and all(field in STATIC_FIELDS for field in fields):
+            result = await self._load_from_db(token_address, fields)
+            if result is not None:
+                self.stats["db_hits"] += 1
+                return result
+
+        task = self.inflight.get(token_address, None)
+        if task is None:
+            self.stats["misses"] += 1
+            task = asyncio.create_task(self._fetch_and_store(token_address))
+            self.inflight[token_address] = task
+            task.add_done_callback(lambda _: self.inflight.pop(token_address, None))
+        else:
+            self.stats["coalesced"] += 1
+        # shield: 某个调用方被取消时，不影响其他等待同一请求的调用方
+        data = await asyncio.shield(task)
+        return dict(data)
+
+    async def _fetch_and_store(self, token_address):
+        data = await self.fetch(token_address)
+        now = clock.now()
+        self._store(token_address, data, now, complete=True)
+        if self.use_db:
+            static_data = {field: data[field] for field in STATIC_FIELDS if field in data}
+            try:
+                await upsert_token_static_info(token_address, json.dumps(static_data), now)
+            except Exception as e:
+                logger.warning(f"Failed to save token info cache for {token_address}: {e}")
+        return data
+
+    async def _load_from_db(self, token_address, fields):
+        try:
+            row = await get_token_static_info(token_address)
+        except Exception as e:
+            logger.warning(f"Failed to load token info cache for {token_address}: {e}")
+            return None
+        if row is None:
+            return None
+        data, update_time = json.loads(row[0]), row[1]
+        self._store(token_address, data, update_time)
+        return self.peek(token_address, fields)
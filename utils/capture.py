@@ -0,0 +1,149 @@
+import os
+import time
+import glob
+import gzip
+import json
+from collections import deque
+from urllib.parse import urlsplit
+from loguru import logger
+from config.conf import capture_dir, capture_segment_records
+
+
+class CaptureWriter:
+    """把websocket推送和HTTP响应按时间顺序追加写入gzip压缩的JSONL分段文件
+
+    每条记录包含时间戳ts和类型kind（ws/http），每个分段最多segment_records条记录。
+    """
+
+    def __init__(self, directory, segment_records=capture_segment_records):
+        self.directory = directory
+        self.segment_records = segment_records
+        self.file = None
+        self.records = 0
+        self.segment = 0
+        self.stats = {"ws": 0, "http": 0, "segments": 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def _open_segment(self):
+        if self.file is not None:
+            self.file.close()
+        name = f"capture-{time.strftime('%Y%m%d-%H%M%S')}-{self.segment:04d}.jsonl.gz"
+        self.file = gzip.open(os.path.join(self.directory, name), "at", encoding="utf-8")
+        self.segment += 1
+        self.records = 0
+        self.stats["segments"] += 1
+        logger.info(f"Capture segment opened: {name}")
+
+    def write(self, kind, **fields):
+        if self.file is None or self.records >= self.segment_records:
+            self._open_segment()
+        self.file.write(json.dumps({"ts": time.time(), "kind": kind, **fields}, ensure_ascii=False) + "\n")
+        self.records += 1
+        self.stats[kind] += 1
+        # 定期刷盘，进程异常退出时最多丢失少量记录
+        if self.records % 100 == 0:
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+# CAPTURE_DIR为空时不录制
+writer = CaptureWriter(capture_dir) if capture_dir else None
+# 回放时设置为ReplayResponder，HTTP请求直接从录制数据返回
+replayer = None
+
+
+def record_ws(message):
+    """录制解析后的websocket推送"""
+    if writer is not None:
+        writer.write("ws", data=message)
+
+
+def record_http(method, url, response, wallet_address=None):
+    """录制HTTP响应，包括失败的响应，回放时可以重现重试过程"""
+    if writer is None or response is None:
+        return
+    try:
+        writer.write(
+            "http",
+            method=method,
+            url=url,
+            wallet=wallet_address,
+            status=response.status_code,
+            body=response.text,
+        )
+    except Exception as e:
+        logger.warning(f"Failed to capture response of {url}: {e}")
+
+
+def read_capture(directory):
+    """按时间顺序读取录制目录下的所有记录"""
+    for path in sorted(glob.glob(os.path.join(directory, "capture-*.jsonl.gz"))):
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        logger.warning(f"Skip broken capture record in {path}")
+        except (EOFError, OSError) as e:
+            # 进程异常退出时分段没有正常关闭，读取到最后一次刷盘的位置
+            logger.warning(f"Capture segment {path} is truncated: {e}")
+
+
+class CapturedResponse:
+    """与requests/curl_cffi响应接口兼容的录制响应"""
+
+    def __init__(self, record):
+        self.url = record["url"]
+        self.status_code = record["status"]
+        self.text = record["body"]
+        self.content = self.text.encode("utf-8")
+        self.headers = {}
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise Exception(f"HTTP Error {self.status_code}: {self.url}")
+
+
+class ReplayResponder:
+    """从录制的HTTP响应中回放
+
+    按 (账号, 方法, URL) 匹配，同一个请求多次录制时按录制顺序返回，用完后重复最后一个；
+    URL中带时间参数（如k线）无法精确匹配时，按 (账号, 方法, 路径) 匹配。
+    """
+
+    def __init__(self, records):
+        self.responses = {}
+        self.path_responses = {}
+        self.stats = {"hits": 0, "path_hits": 0, "misses": 0}
+        for record in records:
+            if record.get("kind", None) != "http":
+                continue
+            key = (record.get("wallet", None), record["method"], record["url"])
+            path_key = (record.get("wallet", None), record["method"], urlsplit(record["url"]).path)
+            self.responses.setdefault(key, deque()).append(record)
+            self.path_responses.setdefault(path_key, deque()).append(record)
+
+    def _next(self, responses):
+        record = responses.popleft() if len(responses) > 1 else responses[0]
+        return CapturedResponse(record)
+
+    def respond(self, method, url, wallet_address=None):
+        responses = self.responses.get((wallet_address, method, url), None)
+        if responses:
+            self.stats["hits"] += 1
+            return self._next(responses)
+        responses = self.path_responses.get((wallet_address, method, urlsplit(url).path), None)
+        if responses:
+            self.stats["path_hits"] += 1
+            return self._next(responses)
+        self.stats["misses"] += 1
+        logger.warning(f"No captured response for {method} {url}")
+        return None
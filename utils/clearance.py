@@ -0,0 +1,93 @@
+import time
+import asyncio
+import threading
+from loguru import logger
+from config.conf import cf_clearance_ttl, gmgn_api_base
+
+GAS_PRICE_URL = f"{gmgn_api_base}/defi/quotation/v1/chains/sol/gas_price"
+CF_COOKIE_NAME = "__cf_bm"
+
+
+def is_challenge_response(response):
+    """判断是否为cloudflare拦截/质询页面，此时需要重新获取cookie"""
+    if response is None:
+        return False
+    if response.headers.get("cf-mitigated", None) == "challenge":
+        return True
+    return response.status_code == 403
+
+
+def has_clearance_cookie(session):
+    """session是否持有cloudflare cookie"""
+    return any(cookie.name == CF_COOKIE_NAME for cookie in session.cookies.jar)
+
+
+class ClearanceManager:
+    """管理每个session的cloudflare cookie有效期
+
+    cookie在有效期内不再额外请求gas_price预热，只有过期、遇到403/质询、或者session被重建时才刷新。
+    同一个session并发刷新时只会发出一个请求，其余调用方等待并共享结果。
+    """
+
+    def __init__(self, ttl=cf_clearance_ttl):
+        self.ttl = ttl
+        self.expires_at = {}
+        self.sync_locks = {}
+        self.async_locks = {}
+        self.locks_guard = threading.Lock()
+        self.stats = {"refresh": 0, "invalidate": 0}
+
+    def is_valid(self, key):
+        return time.time() < self.expires_at.get(key, 0)
+
+    def mark_valid(self, key, session):
+        """请求成功后更新有效期，cookie自带过期时间时取两者中较早的"""
+        expires_at = time.time() + self.ttl
+        for cookie in session.cookies.jar:
+            if cookie.name == CF_COOKIE_NAME and cookie.expires:
+                expires_at = min(expires_at, cookie.expires)
+        self.expires_at[key] = expires_at
+
+    def invalidate(self, key):
+        self.stats["invalidate"] += 1
+        self.expires_at.pop(key, None)
+
+    def _sync_lock(self, key):
+        with self.locks_guard:
+            if key not in self.sync_locks:
+                self.sync_locks[key] = threading.Lock()
+            return self.sync_locks[key]
+
+    def _async_lock(self, key):
+        if key not in self.async_locks:
+            self.async_locks[key] = asyncio.Lock()
+        return self.async_locks[key]
+
+    def ensure(self, key, session):
+        """同步session：cookie过期时请求一次gas_price刷新cookie"""
+        if self.is_valid(key):
+            return
+        with self._sync_lock(key):
+            if self.is_valid(key):
+                return
+            resp = session.get(GAS_PRICE_URL)
+            self.stats["refresh"] += 1
+            logger.info(f"Refreshed clearance for {key}, status: {resp.status_code}")
+            if resp.status_code == 200:
+                self.mark_valid(key, session)
+
+    async def ensure_async(self, key, session, timeout=None):
+        """异步session：cookie过期时请求一次gas_price刷新cookie，并发调用方共享同一次刷新"""
+        if self.is_valid(key):
+            return
+        async with self._async_lock(key):
+            if self.is_valid(key):
+                return
+            if timeout is None:
+                resp = await session.get(GAS_PRICE_URL)
+            else:
+                resp = await session.get(GAS_PRICE_URL, timeout=timeout)
+            self.stats["refresh"] += 1
+            logger.info(f"Refreshed clearance for {key}, status: {resp.status_code}")
+            if resp.status_code == 200:
+                self.mark_valid(key, session)
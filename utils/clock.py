@@ -0,0 +1,18 @@
+"""可替换的时钟
+
+token信息缓存、交易账本和信号处理流水线的TTL/合并窗口都按该时钟计算，
+回放时替换为录制时间，使缓存命中和请求情况与录制时一致，不受回放速度影响。
+"""
+import time
+
+_now = time.time
+
+
+def now():
+    return _now()
+
+
+def set_clock(func=None):
+    """func为返回当前时间戳的函数，None时恢复为time.time"""
+    global _now
+    _now = func or time.time
@@ -0,0 +1,70 @@
+import time
+from collections import OrderedDict
+from config.conf import relay_dedupe_size, relay_dedupe_window
+
+
+def activity_key(activity):
+    """推送交易的唯一标识：交易哈希+钱包，没有哈希时使用 钱包+token+时间+事件"""
+    wallet_address = activity.get("wallet_address", None)
+    tx_hash = activity.get("tx_hash", None)
+    if tx_hash:
+        return (tx_hash, wallet_address)
+    token_address = activity.get("token_address", None)
+    if token_address is None and "token" in activity:
+        token_address = activity["token"].get("address", None)
+    return (wallet_address, token_address, activity.get("timestamp", None), activity.get("event_type", None))
+
+
+class ActivityDeduper:
+    """有界、带时间窗口的LRU，用于过滤多个账号重复推送的同一笔交易"""
+
+    def __init__(self, max_size=relay_dedupe_size, window=relay_dedupe_window):
+        self.max_size = max_size
+        self.window = window
+        # key -> 首次出现时间，按插入顺序即时间顺序排列
+        self.seen = OrderedDict()
+        self.stats = {"activities": 0, "duplicates": 0}
+
+    def _expire(self, now):
+        while self.seen:
+            key, seen_at = next(iter(self.seen.items()))
+            if now - seen_at < self.window:
+                break
+            self.seen.popitem(last=False)
+
+    def is_duplicate(self, key, now=None):
+        now = time.time() if now is None else now
+        self._expire(now)
+        self.stats["activities"] += 1
+        if key in self.seen:
+            self.stats["duplicates"] += 1
+            return True
+        self.seen[key] = now
+        if len(self.seen) > self.max_size:
+            self.seen.popitem(last=False)
+        return False
+
+    def filter_message(self, message):
+        """过滤消息中重复的交易，返回过滤后的消息；全部重复时返回None
+
+        非交易推送（pong、订阅回执等）原样返回。
+        """
+        data = message.get("data", None) if isinstance(message, dict) else None
+        if not isinstance(data, list) or len(data) == 0:
+            return message
+        now = time.time()
+        activities = [
+            activity
+            for activity in data
+            if not (isinstance(activity, dict) and self.is_duplicate(activity_key(activity), now))
+        ]
+        if not activities:
+            return None
+        if len(activities) != len(data):
+            message = {**message, "data": activities}
+        return message
+
+    def duplicate_rate(self):
+        if self.stats["activities"] == 0:
+            return 0.0
+        return self.stats["duplicates"] / self.stats["activities"]
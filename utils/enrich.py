@@ -0,0 +1,105 @@
+import asyncio
+from datetime import datetime
+import pytz
+from loguru import logger
+from config.conf import time_zone
+from utils.gmgn import parse_history, build_trade_info
+
+# 策略依赖声明的键：history为交易历史，token_info为需要保证新鲜的token字段（None表示全部字段），kline为k线
+HISTORY = "history"
+TOKEN_INFO = "token_info"
+KLINE = "kline"
+
+# 推送消息需要的全部数据
+FULL_REQUIREMENTS = {HISTORY: True, TOKEN_INFO: None}
+# 市值由价格和total_supply计算，未声明token_info时也需要
+DEFAULT_TOKEN_FIELDS = ("total_supply",)
+
+# 实际发出的加载次数，未被使用的数据不会加载
+stats = {"history": 0, "token_info": 0, "kline": 0, "gas_price": 0}
+
+
+class EnrichedTrade:
+    """惰性加载的交易信号
+
+    交易历史、token信息、k线、gas价格在首次访问时才加载，同一个信号内只加载一次；
+    策略可以事先声明依赖（requirements），由prefetch并发加载。
+    """
+
+    def __init__(self, event, now_timestamp, load_history, load_token_info, load_kline, load_gas_price, gass_price=None):
+        self.event = event
+        self.token_address = event["token_address"]
+        self.now_timestamp = now_timestamp
+        self.load_history = load_history
+        self.load_token_info = load_token_info
+        self.load_kline = load_kline
+        self.load_gas_price = load_gas_price
+        self.gass_price = gass_price
+        # 加载任务，key -> asyncio.Task
+        self.tasks = {}
+
+    def _memoize(self, key, stat, factory):
+        task = self.tasks.get(key, None)
+        if task is None:
+            stats[stat] += 1
+            task = asyncio.ensure_future(factory())
+            self.tasks[key] = task
+        return task
+
+    async def history(self):
+        """返回 (原始交易历史, parse_history的统计结果)"""
+        return await self._memoize(HISTORY, "history", self._history)
+
+    async def _history(self):
+        trade_history = await self.load_history(self.token_address, now_timestamp=self.now_timestamp)
+        parsed_trade_history = parse_history(trade_history, now_time=self.event["local_time"])
+        return trade_history, parsed_trade_history
+
+    async def token_info(self, fields=None):
+        """fields为需要保证新鲜的字段，已经在加载全部字段时直接复用"""
+        full_task = self.tasks.get((TOKEN_INFO, None), None)
+        if full_task is not None:
+            return dict(await full_task)
+        key = (TOKEN_INFO, tuple(sorted(fields)) if fields is not None else None)
+        return dict(await self._memoize(key, "token_info", lambda: self.load_token_info(self.token_address, fields=fields)))
+
+    async def kline(self, resolution="1m"):
+        return await self._memoize((KLINE, resolution), "kline", lambda: self._kline(resolution))
+
+    async def _kline(self, resolution):
+        token_info = await self.token_info(("creation_timestamp",))
+        local_time = self.event["local_time"]
+        try:
+            create_time = datetime.fromtimestamp(token_info["creation_timestamp"], pytz.timezone(time_zone))
+        except Exception:
+            create_time = local_time
+        return await self.load_kline(self.token_address, create_time, local_time, resolution=resolution)
+
+    async def gas_price(self):
+        if self.gass_price is not None:
+            return self.gass_price
+        return await self._memoize("gas_price", "gas_price", self.load_gas_price)
+
+    async def prefetch(self, requirements):
+        """按依赖声明并发加载"""
+        loads = []
+        if requirements.get(HISTORY, False):
+            loads.append(self.history())
+        loads.append(self.token_info(requirements.get(TOKEN_INFO, DEFAULT_TOKEN_FIELDS)))
+        if requirements.get(KLINE, False):
+            loads.append(self.kline())
+        await asyncio.gather(*loads)
+
+    async def build(self, requirements):
+        """加载依赖并生成与build_trade_info相同格式的trade_info，未声明的部分为空"""
+        loads = [self.gas_price(), self.prefetch(requirements)]
+        gass_price, _ = await asyncio.gather(*loads)
+        trade_history, parsed_trade_history = None, None
+        if requirements.get(HISTORY, False):
+            trade_history, parsed_trade_history = await self.history()
+        token_info = await self.token_info(requirements.get(TOKEN_INFO, DEFAULT_TOKEN_FIELDS))
+        trade_info = build_trade_info(self.event, token_info, trade_history, parsed_trade_history, gass_price)
+        if requirements.get(KLINE, False):
+            trade_info["kline"] = await self.kline()
+        logger.debug(f"Enriched trade {self.token_address} with requirements {requirements}")
+        return trade_info
@@ -0,0 +1,62 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# 转发服务支持的帧编码：raw为上游原始JSON帧（默认），msgpack为二进制紧凑编码
+ENCODING_RAW = "raw"
+ENCODING_MSGPACK = "msgpack"
+ENCODINGS = (ENCODING_RAW, ENCODING_MSGPACK)
+
+
+def loads(data):
+    """解析JSON，安装了orjson时使用orjson，orjson解析失败时回退到标准库"""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+def dumps(obj):
+    """序列化为紧凑的JSON字符串"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode()
+        except TypeError:
+            pass
+    return json.dumps(obj, separators=(",", ":"))
+
+
+def resolve_encoding(encoding):
+    """校验编码名称，不支持或msgpack未安装时使用raw"""
+    if encoding == ENCODING_MSGPACK and msgpack is not None:
+        return ENCODING_MSGPACK
+    return ENCODING_RAW
+
+
+def encode_frame(message, encoding, raw=None):
+    """按订阅者的编码生成发送的帧，raw编码且有上游原始帧时直接复用"""
+    if encoding == ENCODING_MSGPACK:
+        return msgpack.packb(message, use_bin_type=True)
+    if raw is not None:
+        return raw
+    return dumps(message)
+
+
+def decode_frame(frame):
+    """解析转发服务发来的帧：二进制帧为msgpack，文本帧为JSON"""
+    if isinstance(frame, bytes) and msgpack is not None:
+        try:
+            return msgpack.unpackb(frame, raw=False)
+        except Exception:
+            pass
+    return loads(frame)
@@ -9,6 +9,7 @@ from curl_cffi import requests
 import datetime
 from loguru import logger
 import base58
+import time
 import traceback
 from urllib.parse import quote
 import nacl.signing
@@ -16,66 +17,62 @@ import nacl.encoding
 import pytz
 from datetime import datetime, timedelta
 from utils.util import filter_token
+from utils.clearance import ClearanceManager, is_challenge_response, has_clearance_cookie
+from utils import capture
+from utils import metrics
+from utils import log
 from config.conf import *
 import config.conf as configuration
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+clearance = ClearanceManager()
+
 
 def request_with_retry(url, headers, json=None, method="GET", retries=3, wallet_address=None):
     for i in range(retries):
+        if capture.replayer is not None:
+            # 回放模式：直接返回录制的响应
+            response = capture.replayer.respond(method, url, wallet_address)
+            if response is not None and response.status_code < 400:
+                return response
+            continue
         if wallet_address is None:
-            resp = configuration.session.get(
-                "https://gmgn.ai/defi/quotation/v1/chains/sol/gas_price",
-                # impersonate=impersonate,
-            )
+            session = configuration.session
         else:
-            resp = configuration.sessions[wallet_address].get(
-                "https://gmgn.ai/defi/quotation/v1/chains/sol/gas_price",
-                # impersonate=impersonate,
-            )
-            # configuration.cookie = configuration.session.cookies.get_dict()
-            # headers["Cookie"] = f"__cf_bm={configuration.cookie['__cf_bm']}"
-        logger.info(f"Retry: {i}, get gas price: {resp.text}")
+            session = configuration.sessions[wallet_address]
+        response = None
+        start = time.perf_counter()
         try:
+            # 只有cookie过期时才预热，不再每次请求前都请求gas_price
+            clearance.ensure(wallet_address, session)
             if method == "GET":
-                if wallet_address is None:
-                    response = configuration.session.get(url, headers=headers, 
-                                                         # impersonate=impersonate,
-                                                         )
-                    
-                else:
-                    response = configuration.sessions[wallet_address].get(url, headers=headers, 
-                                                                          # impersonate=impersonate,
-                                                                          )
+                response = session.get(url, headers=headers)
             elif method == "POST":
-                if wallet_address is None:
-                    response = configuration.session.post(
-                        url, headers=headers, json=json, 
-                        # impersonate=impersonate,
-                    )
-                else:
-                    response = configuration.sessions[wallet_address].post(
-                        url, headers=headers, json=json, 
-                        # impersonate=impersonate,
-                    )
+                response = session.post(url, headers=headers, json=json)
+            capture.record_http(method, url, response, wallet_address)
+            if is_challenge_response(response):
+                clearance.invalidate(wallet_address)
             response.raise_for_status()
+            # 只有拿到cloudflare cookie时才按cookie延长有效期
+            if has_clearance_cookie(session):
+                clearance.mark_valid(wallet_address, session)
+            metrics.record_gmgn_request(url, wallet_address, i, time.perf_counter() - start, failed=False)
             return response
         except Exception as e:
             logger.error(f"Failed to request url: {url}, error: {str(e)}, retry: {i}")
-            if wallet_address is None:
-                configuration.session = requests.Session()
-                resp = configuration.session.get(
-                    "https://gmgn.ai/defi/quotation/v1/chains/sol/gas_price",
-                    # impersonate=impersonate,
-                )
-            else:
-                configuration.sessions[wallet_address] = requests.Session()
-                resp = configuration.sessions[wallet_address].get(
-                    "https://gmgn.ai/defi/quotation/v1/chains/sol/gas_price",
-                    # impersonate=impersonate,
-                )
-            logger.info(f"Retry: {i}, get gas price: {resp.text}")
-            # configuration.cookie = configuration.session.cookies.get_dict()
-            # headers["Cookie"] = f"__cf_bm={configuration.cookie['__cf_bm']}"
+            metrics.record_gmgn_request(url, wallet_address, i, time.perf_counter() - start, failed=True)
+            # 429/5xx不需要重新预热；没有收到响应（连接异常）时重建session，下次请求前会重新获取cookie
+            if response is None:
+                clearance.invalidate(wallet_address)
+                session = requests.Session(ja3=ja3_text, akamai=akamai_text, headers={"User-Agent": user_agent})
+                if wallet_address is None:
+                    configuration.session = session
+                else:
+                    configuration.sessions[wallet_address] = session
             if i == retries - 1:
                 return None
             continue
@@ -86,7 +83,7 @@ def get_login_nonce(wallet_address):
     try:
         headers = {"Content-Type": "application/json"}
         response = request_with_retry(
-            f"https://gmgn.ai/defi/auth/v1/login_nonce?address={wallet_address}",
+            f"{gmgn_api_base}/defi/auth/v1/login_nonce?address={wallet_address}",
             headers=headers,
             wallet_address=wallet_address,
         )
@@ -129,7 +126,7 @@ def login(message, signature, wallet_address):
     try:
         headers = {"Content-Type": "application/json"}
         response = request_with_retry(
-            "https://gmgn.ai/defi/auth/v1/login",
+            f"{gmgn_api_base}/defi/auth/v1/login",
             headers=headers,
             json=payload,
             method="POST",
@@ -166,7 +163,7 @@ def get_gas_price(chain="sol"):
     try:
         headers = {"Content-Type": "application/json"}
         response = request_with_retry(
-            f"https://gmgn.ai/defi/quotation/v1/chains/{chain}/gas_price",
+            f"{gmgn_api_base}/defi/quotation/v1/chains/{chain}/gas_price",
             headers=headers,
         )
         response.raise_for_status()
@@ -183,11 +180,16 @@ def get_gas_price(chain="sol"):
 
 
 def get_token_info(token_address):
-    url = f"https://gmgn.ai/defi/quotation/v1/tokens/sol/{token_address}"
+    url = f"{gmgn_api_base}/defi/quotation/v1/tokens/sol/{token_address}"
     headers = {"Content-Type": "application/json"}
     response = request_with_retry(url, headers=headers)
     token_info = response.json()
-    logger.info(f"gmgn original token info: {token_info}")
+    log.payload("gmgn original token info: {}", token_info)
+    return extract_token_info(token_info)
+
+
+def extract_token_info(token_info):
+    """从gmgn token接口的原始返回中提取需要的字段"""
     result = {}
     result["total_supply"] = int(token_info["data"]["token"]["total_supply"])
     try:
@@ -264,7 +266,7 @@ def get_token_kline(
 
     start_time_timestamp = int(start_time.timestamp())
     end_time_timestamp = int(end_time.timestamp())
-    url = f"https://gmgn.ai/defi/quotation/v1/tokens/kline/sol/{token_address}?resolution={resolution}&from={start_time_timestamp}&to={end_time_timestamp}"
+    url = f"{gmgn_api_base}/defi/quotation/v1/tokens/kline/sol/{token_address}?resolution={resolution}&from={start_time_timestamp}&to={end_time_timestamp}"
     headers = {"Content-Type": "application/json"}
     response = request_with_retry(url, headers=headers)
 
@@ -289,8 +291,8 @@ def get_token_kline(
     #     },
 
 
-def parse_token_info(data, gass_price=None):
-    logger.info("Enter parse_token_info")
+def parse_follow_event(data):
+    """解析websocket推送的交易信号，清仓/减仓信号不需要推送，返回None"""
     event_type = data["event_type"]
     wallet_address = data["wallet_address"]
     token_address = (
@@ -313,7 +315,8 @@ def parse_token_info(data, gass_price=None):
             event_type = "🟢建仓"
         elif event_type == "sell":
             event_type = "🔴清仓"
-            logger.info(f"清仓信号，不推送，交易信息为：{data}")
+            logger.info("清仓信号，不推送: {}", token_address)
+            log.payload("清仓信号，交易信息为：{}", data)
             return None
     else:
         if event_type == "buy":
@@ -321,45 +324,38 @@ def parse_token_info(data, gass_price=None):
         elif event_type == "sell":
             event_type = "🔴减仓"
             # 如果是减仓，不需要再获取交易历史，也不需要推送消息
-            logger.info(f"减仓信号，不推送，交易信息为：{data}")
+            logger.info("减仓信号，不推送: {}", token_address)
+            log.payload("减仓信号，交易信息为：{}", data)
             return None
-    if gass_price is None:
-        gass_price = get_gas_price()
+    return {
+        "event_type": event_type,
+        "wallet_address": wallet_address,
+        "token_address": token_address,
+        "local_time": local_time,
+        "token_symbol": token_symbol,
+        "token_name": token_name,
+        "token_price": token_price,
+        "price_change": price_change,
+        "cost_usd": cost_usd,
+        "is_open_or_close": is_open_or_close,
+    }
 
-    trade_history = []
 
-    for self_wallet_address in private_key_dict.keys():
-        access_token = access_token_dict.get(self_wallet_address, None)
-        if access_token is None:
-            access_token = get_gmgn_token(
-                self_wallet_address, private_key_dict[self_wallet_address]
-            )
-            access_token_dict[self_wallet_address] = access_token
-        logger.info(f"Get trade history for wallet: {self_wallet_address}")
-        trade_history_ = get_trade_history(
-            token_address, access_token, self_wallet_address
-        )
-        logger.info(f"Length of trade history: {len(trade_history_)}")
-        if len(trade_history_) == 0:
-            continue
-        trade_history.extend(trade_history_)
-
-    # trade_history = get_trade_history(token_address, access_token)
-    parsed_trade_history = parse_history(trade_history, now_time=local_time)
-    # {'all_wallets': 7, 'full_wallets': 1, 'hold_wallets': 1, 'close_wallets': 5}
+def build_trade_info(event, token_info, trade_history, parsed_trade_history, gass_price):
+    """合并交易信号、token信息与交易历史，生成推送和过滤使用的trade_info"""
+    local_time = event["local_time"]
+    token_price = event["token_price"]
 
-    cost_sol = float(cost_usd) / float(gass_price["eth_usd_price"])
+    cost_sol = float(event["cost_usd"]) / float(gass_price["eth_usd_price"])
 
-    token_info = get_token_info(token_address)
-    logger.info(f"Token info get complete, token_info: {token_info}")
-    token_info["address"] = token_address
-    token_info["symbol"] = token_symbol
-    token_info["name"] = token_name
+    token_info["address"] = event["token_address"]
+    token_info["symbol"] = event["token_symbol"]
+    token_info["name"] = event["token_name"]
     token_info["price"] = float(token_price)
 
     # 避免交易监听与交易历史api时间差，导致的市值不准确，这里重新计算市值
     token_info["market_cap"] = float(token_price) * token_info["total_supply"]
-    token_info["price_change"] = price_change
+    token_info["price_change"] = event["price_change"]
     try:
         create_time = datetime.fromtimestamp(
             token_info["creation_timestamp"], pytz.timezone(time_zone)
@@ -384,9 +380,9 @@ def parse_token_info(data, gass_price=None):
     # kline = get_token_kline(token_address, create_time, local_time)
 
     trade_info = {
-        "event_type": event_type,
-        "wallet_address": wallet_address,
-        "token_address": token_address,
+        "event_type": event["event_type"],
+        "wallet_address": event["wallet_address"],
+        "token_address": event["token_address"],
         "token_info": token_info,
         # 'kline': kline,
         "time": local_time.strftime("%Y-%m-%d %H:%M:%S"),
@@ -394,16 +390,23 @@ def parse_token_info(data, gass_price=None):
         "origin_history": trade_history,
         "trade_history": parsed_trade_history,
         "cost_sol": f"{cost_sol:.3f}",
-        "is_open_or_close": is_open_or_close,
+        "is_open_or_close": event["is_open_or_close"],
     }
-    logger.info(f"Total trade info: {trade_info}")
-    logger.info("Entering filter_token")
+    return trade_info
+
+
+def apply_filter(trade_info, local_time, strategy_type=None):
+    """对trade_info执行过滤策略，通过时返回需要推送的结果，否则返回None
+
+    strategy_type为None时使用当前推送的策略。
+    """
+    logger.debug("Entering filter_token")
     filter_result = True
     if if_filter:
-        filter_result = filter_token(trade_info, local_time)
+        filter_result = filter_token(trade_info, local_time, strategy_type)
 
     if filter_result is None:
-        logger.info(f"Failed to pass filter.")
+        logger.debug("Failed to pass filter.")
         return None
 
     if isinstance(filter_result, dict):
@@ -418,11 +421,52 @@ def parse_token_info(data, gass_price=None):
     return None
 
 
+def parse_token_info(data, gass_price=None):
+    logger.debug("Enter parse_token_info")
+    event = parse_follow_event(data)
+    if event is None:
+        return None
+    token_address = event["token_address"]
+    local_time = event["local_time"]
+    if gass_price is None:
+        gass_price = get_gas_price()
+
+    trade_history = []
+
+    for self_wallet_address in private_key_dict.keys():
+        access_token = access_token_dict.get(self_wallet_address, None)
+        if access_token is None:
+            access_token = get_gmgn_token(
+                self_wallet_address, private_key_dict[self_wallet_address]
+            )
+            access_token_dict[self_wallet_address] = access_token
+        logger.info(f"Get trade history for wallet: {self_wallet_address}")
+        trade_history_ = get_trade_history(
+            token_address, access_token, self_wallet_address
+        )
+        logger.info(f"Length of trade history: {len(trade_history_)}")
+        if len(trade_history_) == 0:
+            continue
+        trade_history.extend(trade_history_)
+
+    # trade_history = get_trade_history(token_address, access_token)
+    parsed_trade_history = parse_history(trade_history, now_time=local_time)
+    # {'all_wallets': 7, 'full_wallets': 1, 'hold_wallets': 1, 'close_wallets': 5}
+
+    token_info = get_token_info(token_address)
+    log.payload("Token info get complete, token_info: {}", token_info)
+    trade_info = build_trade_info(
+        event, token_info, trade_history, parsed_trade_history, gass_price
+    )
+    log.payload("Total trade info: {}", trade_info)
+    return apply_filter(trade_info, local_time)
+
+
 def follow_wallet(wallet_address, self_wallet_address, token, network="sol", retry=3):
     access_token = access_token_dict.get(self_wallet_address, None)
     if token != access_token:
         token = access_token
-    url = f"https://gmgn.ai/defi/quotation/v1/follow/sol/follow_wallet"
+    url = f"{gmgn_api_base}/defi/quotation/v1/follow/sol/follow_wallet"
     payload = {"address": wallet_address, "network": network}
     headers = {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
     response = request_with_retry(url, headers=headers, json=payload, method="POST")
@@ -451,7 +495,7 @@ def unfollow_wallet(wallet_address, self_wallet_address, token, network="sol", r
     access_token = access_token_dict.get(self_wallet_address, None)
     if token != access_token:
         token = access_token
-    url = f"https://gmgn.ai/defi/quotation/v1/follow/sol/unfollow_wallet"
+    url = f"{gmgn_api_base}/defi/quotation/v1/follow/sol/unfollow_wallet"
     payload = {"address": wallet_address, "network": network}
     headers = {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
     response = request_with_retry(url, headers=headers, json=payload, method="POST")
@@ -481,7 +525,7 @@ def get_following_wallets(token, self_wallet_address, network="sol", retry=3):
     access_token = access_token_dict.get(self_wallet_address, None)
     if token != access_token:
         token = access_token
-    url = f"https://gmgn.ai/defi/quotation/v1/follow/{network}/following_wallets?network={network}"
+    url = f"{gmgn_api_base}/defi/quotation/v1/follow/{network}/following_wallets?network={network}"
     headers = {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
     response = request_with_retry(url, headers=headers)
 
@@ -506,7 +550,7 @@ def get_following_wallets(token, self_wallet_address, network="sol", retry=3):
 
 
 def tag_wallet_state(token_address, access_token, network="sol"):
-    url = f"https://gmgn.ai/defi/quotation/v1/tokens/tag_wallet_count/{network}/{token_address}"
+    url = f"{gmgn_api_base}/defi/quotation/v1/tokens/tag_wallet_count/{network}/{token_address}"
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {access_token}",
@@ -536,7 +580,7 @@ def tag_wallet_state(token_address, access_token, network="sol"):
 
 
 def get_pnl_wallets(token, network="sol"):
-    url = f"https://gmgn.ai/defi/quotation/v1/rank/{network}/wallets/7d?orderby=realized_profit_7d&direction=desc"
+    url = f"{gmgn_api_base}/defi/quotation/v1/rank/{network}/wallets/7d?orderby=realized_profit_7d&direction=desc"
     headers = {"Content-Type": "application", "Authorization": f"Bearer {token}"}
     response = request_with_retry(url, headers=headers)
 
@@ -559,7 +603,7 @@ def get_trade_history(
         token = access_token
     filter_event_ = f"&event={filter_event}" if filter_event is not None else ""
     cursor_ = f"&cursor={quote(cursor)}" if cursor is not None else ""
-    url = f"https://gmgn.ai/defi/quotation/v1/trades/{network}/{token_address}?limit=100{cursor_}{filter_event_}&maker=&following=true"
+    url = f"{gmgn_api_base}/defi/quotation/v1/trades/{network}/{token_address}?limit=100{cursor_}{filter_event_}&maker=&following=true"
     headers = {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
     response = request_with_retry(url, headers=headers, wallet_address=self_wallet_address)
 
@@ -615,39 +659,96 @@ def get_trade_history(
             return []
 
 
-def parse_history(history, now_time=None):
-    """解析交易历史，获取每个钱包当前持仓比例，计算总购买钱包数、当前仍持仓钱包数，清仓钱包数；
-    并计算10min内购买钱包数、10min内清仓钱包数
-    """
-    result = {
+def trade_key(trade):
+    """交易的唯一标识，优先使用交易哈希，没有时使用 钱包+时间+事件"""
+    tx_hash = trade.get("tx_hash", None)
+    if tx_hash:
+        return tx_hash
+    return (trade.get("maker"), trade.get("timestamp"), trade.get("event"))
+
+
+def merge_trade_histories(histories):
+    """合并多个账号的交易历史：按交易去重，并按时间倒序（最新的在前）排列"""
+    merged = {}
+    for history in histories:
+        for trade in history:
+            key = trade_key(trade)
+            if key not in merged:
+                merged[key] = trade
+    return sorted(merged.values(), key=lambda trade: trade["timestamp"], reverse=True)
+
+
+def _new_history_result(total_trades):
+    return {
         "all_wallets": 0,
         "full_wallets": 0,
         "hold_wallets": 0,
         "close_wallets": 0,
         "10min_buys": 0,
         "10min_close": 0,
-        "total_trades": len(history),
+        "total_trades": total_trades,
         "3min_buys": 0,
         "3min_close": 0,
         "total_buy": 0,
         "total_sell": 0,
     }
-    first_trade_time = now_time
-    wallet_info = {}
-    recorded_10min_wallets = []
-    recorded_10min_buy_wallets = []
-    recorded_10min_sell_wallets = []
-    recorded_3min_wallets = []
-    recorded_3min_buy_wallets = []
-    recorded_3min_sell_wallets = []
-    for trade in history:
-        trade_time_stamp = trade["timestamp"]
-        trade_local_time = datetime.fromtimestamp(
-            trade_time_stamp, pytz.timezone(time_zone)
-        )
 
+
+def _is_close(trade):
+    is_open_or_close = trade["is_open_or_close"]
+    if is_open_or_close is None or is_open_or_close == "":
+        return False
+    return int(is_open_or_close) == 1
+
+
+def _count_wallet_position(result, trade):
+    """按钱包最近一笔交易的仓位，统计全仓、减仓、清仓钱包数"""
+    balance = (
+        float(trade["balance"])
+        if (trade["balance"] is not None) and (trade["balance"] != "")
+        else 0
+    )
+    bought_amount = float(trade["history_bought_amount"])
+    if balance >= bought_amount:
+        result["full_wallets"] += 1
+    elif balance <= 1e-10:
+        result["close_wallets"] += 1
+    else:
+        result["hold_wallets"] += 1
+    result["all_wallets"] += 1
+
+
+def _format_first_trade_time(first_timestamp, now_time):
+    if first_timestamp is None or first_timestamp >= now_time.timestamp():
+        return now_time.strftime("%Y-%m-%d %H:%M:%S")
+    return datetime.fromtimestamp(first_timestamp, pytz.timezone(time_zone)).strftime(
+        "%Y-%m-%d %H:%M:%S"
+    )
+
+
+def parse_history(history, now_time=None):
+    """解析交易历史，获取每个钱包当前持仓比例，计算总购买钱包数、当前仍持仓钱包数，清仓钱包数；
+    并计算10min内购买钱包数、10min内清仓钱包数
+
+    history为最新在前的交易列表，每个钱包以其最近一笔交易统计仓位，时间窗口内每个钱包只统计一次。
+    """
+    if (
+        np is not None
+        and parse_history_numpy_threshold > 0
+        and len(history) >= parse_history_numpy_threshold
+    ):
+        return _parse_history_numpy(history, now_time)
+
+    result = _new_history_result(len(history))
+    now_timestamp = now_time.timestamp()
+    first_timestamp = None
+    seen_wallets = set()
+    recorded_10min_wallets = set()
+    recorded_3min_wallets = set()
+    for trade in history:
+        trade_timestamp = trade["timestamp"]
         # 避免api时间差，过滤掉now_time之后的交易
-        if trade_local_time > now_time:
+        if trade_timestamp > now_timestamp:
             continue
 
         wallet_address = trade["maker"]
@@ -657,57 +758,78 @@ def parse_history(history, now_time=None):
         elif event == "sell":
             result["total_sell"] += 1
 
-        is_open_or_close = trade["is_open_or_close"]
-        if is_open_or_close is None or is_open_or_close == "":
-            is_open_or_close = 0
-        is_open_or_close = int(is_open_or_close)
-        logger.info(
-            f"wallet_address: {wallet_address}, Event: {event}, is_open_or_close: {is_open_or_close}"
-        )
-        balance = (
-            float(trade["balance"])
-            if (trade["balance"] is not None) and (trade["balance"] != "")
-            else 0
-        )
-        bought_amount = float(trade["history_bought_amount"])
-        sold_amount = float(trade["history_sold_amount"])
-
-        if trade_local_time < first_trade_time:
-            first_trade_time = trade_local_time
+        if first_timestamp is None or trade_timestamp < first_timestamp:
+            first_timestamp = trade_timestamp
 
-        trade_time_delta = (now_time - trade_local_time).total_seconds() / 60
-
-        if trade_time_delta <= 10.0 and trade_time_delta > 3.0:
-            if wallet_address not in recorded_10min_wallets:
-                recorded_10min_wallets.append(wallet_address)
-                if event == "buy":
-                    result["10min_buys"] += 1
-                elif event == "sell" and is_open_or_close == 1:
-                    result["10min_close"] += 1
+        trade_time_delta = (now_timestamp - trade_timestamp) / 60
         if trade_time_delta <= 3.0:
             if wallet_address not in recorded_3min_wallets:
-                recorded_3min_wallets.append(wallet_address)
+                recorded_3min_wallets.add(wallet_address)
                 if event == "buy":
                     result["3min_buys"] += 1
-                elif event == "sell" and is_open_or_close == 1:
+                elif event == "sell" and _is_close(trade):
                     result["3min_close"] += 1
+        elif trade_time_delta <= 10.0:
+            if wallet_address not in recorded_10min_wallets:
+                recorded_10min_wallets.add(wallet_address)
+                if event == "buy":
+                    result["10min_buys"] += 1
+                elif event == "sell" and _is_close(trade):
+                    result["10min_close"] += 1
 
-        if wallet_address not in wallet_info:
-            wallet_info[wallet_address] = {
-                "balance": balance,
-                "bought_amount": bought_amount,
-                "sold_amount": sold_amount,
-            }
-            if balance >= bought_amount:
-                result["full_wallets"] += 1
-            elif balance <= 1e-10:
-                result["close_wallets"] += 1
-            else:
-                result["hold_wallets"] += 1
-            result["all_wallets"] += 1
-        else:
-            continue
-    result["first_trade_time"] = first_trade_time.strftime("%Y-%m-%d %H:%M:%S")
+        if wallet_address not in seen_wallets:
+            seen_wallets.add(wallet_address)
+            _count_wallet_position(result, trade)
+    result["first_trade_time"] = _format_first_trade_time(first_timestamp, now_time)
+    logger.debug("Parsed {} trades: {}", len(history), result)
+    return result
+
+
+def _first_index_per_wallet(wallet_codes, indices):
+    """indices中每个钱包第一次出现的位置（保持原顺序）"""
+    if len(indices) == 0:
+        return indices
+    _, first = np.unique(wallet_codes[indices], return_index=True)
+    return indices[np.sort(first)]
+
+
+def _parse_history_numpy(history, now_time):
+    """parse_history的列式实现，用于交易数很多的token，结果与逐条解析一致"""
+    result = _new_history_result(len(history))
+    now_timestamp = now_time.timestamp()
+    count = len(history)
+    wallet_index = {}
+    timestamps = np.fromiter((trade["timestamp"] for trade in history), dtype=np.float64, count=count)
+    wallet_codes = np.fromiter(
+        (wallet_index.setdefault(trade["maker"], len(wallet_index)) for trade in history),
+        dtype=np.int64,
+        count=count,
+    )
+    events = [trade["event"] for trade in history]
+    is_buy = np.fromiter((event == "buy" for event in events), dtype=bool, count=count)
+    is_sell = np.fromiter((event == "sell" for event in events), dtype=bool, count=count)
+
+    valid = timestamps <= now_timestamp
+    result["total_buy"] = int(np.count_nonzero(is_buy & valid))
+    result["total_sell"] = int(np.count_nonzero(is_sell & valid))
+    first_timestamp = float(timestamps[valid].min()) if valid.any() else None
+
+    deltas = (now_timestamp - timestamps) / 60
+    windows = (
+        ("3min", valid & (deltas <= 3.0)),
+        ("10min", valid & (deltas > 3.0) & (deltas <= 10.0)),
+    )
+    for name, mask in windows:
+        first = _first_index_per_wallet(wallet_codes, np.flatnonzero(mask))
+        result[f"{name}_buys"] = int(np.count_nonzero(is_buy[first]))
+        result[f"{name}_close"] = sum(
+            1 for i in first[is_sell[first]] if _is_close(history[i])
+        )
+
+    for i in _first_index_per_wallet(wallet_codes, np.flatnonzero(valid)):
+        _count_wallet_position(result, history[i])
+    result["first_trade_time"] = _format_first_trade_time(first_timestamp, now_time)
+    logger.debug("Parsed {} trades: {}", len(history), result)
     return result
 
 
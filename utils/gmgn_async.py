@@ -0,0 +1,603 @@
+"""gmgn接口的异步版本
+
+与utils.gmgn中的同步函数一一对应，使用curl_cffi的AsyncSession，
+保持相同的浏览器指纹（ja3/akamai/user agent），每个账号一个连接池，
+请求可以在事件循环中并发执行。
+"""
+import os
+import sys
+
+# 加上级目录 ../
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from curl_cffi.requests import AsyncSession
+from loguru import logger
+import time
+import asyncio
+import base58
+from urllib.parse import quote
+from datetime import datetime
+from utils.cache import TokenInfoCache
+from utils.ledger import TradeLedger
+from utils.token_manager import token_manager
+from utils.clearance import ClearanceManager, is_challenge_response, has_clearance_cookie
+from utils import capture
+from utils import metrics
+from utils import log
+from utils.enrich import EnrichedTrade, FULL_REQUIREMENTS
+from utils.shadow import strategy_runner
+from utils.gmgn import (
+    generate_message,
+    sign_message,
+    extract_token_info,
+    parse_follow_event,
+    apply_filter,
+    merge_trade_histories,
+)
+from config.conf import (
+    user_agent,
+    ja3_text,
+    akamai_text,
+    access_token_dict,
+    private_key_dict,
+    gmgn_request_timeout,
+    gmgn_max_clients,
+    history_account_timeout,
+    history_max_buys,
+    history_horizon_minutes,
+    ledger_enabled,
+    if_filter,
+    gmgn_api_base,
+)
+
+# 异步session与同步session的cookie互相独立，分开管理
+clearance = ClearanceManager()
+
+# 每个账号一个AsyncSession，key为None时为不需要登录的公共session
+async_sessions = {}
+# session -> 进行中的请求数；被替换的session等请求全部结束后再关闭
+session_users = {}
+retired_sessions = set()
+
+
+def new_async_session():
+    return AsyncSession(
+        ja3=ja3_text,
+        akamai=akamai_text,
+        headers={"User-Agent": user_agent},
+        timeout=gmgn_request_timeout,
+        max_clients=gmgn_max_clients,
+    )
+
+
+def get_async_session(wallet_address=None):
+    session = async_sessions.get(wallet_address, None)
+    if session is None:
+        session = new_async_session()
+        async_sessions[wallet_address] = session
+    return session
+
+
+async def close_session(session, wallet_address=None):
+    try:
+        await session.close()
+    except Exception as e:
+        logger.warning(f"Failed to close session for {wallet_address}: {e}")
+
+
+def acquire_session(wallet_address=None):
+    session = get_async_session(wallet_address)
+    session_users[session] = session_users.get(session, 0) + 1
+    return session
+
+
+async def release_session(session, wallet_address=None):
+    count = session_users.pop(session, 1) - 1
+    if count > 0:
+        session_users[session] = count
+    elif session in retired_sessions:
+        retired_sessions.discard(session)
+        await close_session(session, wallet_address)
+
+
+async def reset_async_session(wallet_address=None, session=None):
+    """连接异常时换一个新session
+
+    旧session不会立即关闭，其他并发请求仍在使用时，等这些请求结束后再关闭。
+    传入session时，只有它仍是当前session才替换，避免并发失败的请求重复重建。
+    """
+    current = async_sessions.get(wallet_address, None)
+    if current is None or (session is not None and current is not session):
+        return get_async_session(wallet_address)
+    async_sessions.pop(wallet_address)
+    if session_users.get(current, 0) > 0:
+        retired_sessions.add(current)
+    else:
+        await close_session(current, wallet_address)
+    return get_async_session(wallet_address)
+
+
+async def close_async_sessions():
+    for wallet_address in list(async_sessions.keys()):
+        session = async_sessions.pop(wallet_address)
+        await session.close()
+    for session in list(retired_sessions):
+        retired_sessions.discard(session)
+        await close_session(session)
+
+
+async def request_with_retry(
+    url,
+    headers,
+    json=None,
+    method="GET",
+    retries=3,
+    wallet_address=None,
+    timeout=gmgn_request_timeout,
+):
+    for i in range(retries):
+        if capture.replayer is not None:
+            # 回放模式：直接返回录制的响应
+            response = capture.replayer.respond(method, url, wallet_address)
+            if response is not None and response.status_code < 400:
+                return response
+            continue
+        session = acquire_session(wallet_address)
+        response = None
+        start = time.perf_counter()
+        try:
+            # 只有cookie过期时才预热，并发请求共享同一次刷新
+            await clearance.ensure_async(wallet_address, session, timeout=timeout)
+            if method == "GET":
+                response = await session.get(url, headers=headers, timeout=timeout)
+            elif method == "POST":
+                response = await session.post(
+                    url, headers=headers, json=json, timeout=timeout
+                )
+            capture.record_http(method, url, response, wallet_address)
+            if is_challenge_response(response):
+                clearance.invalidate(wallet_address)
+            response.raise_for_status()
+            # 只有拿到cloudflare cookie时才按cookie延长有效期
+            if has_clearance_cookie(session):
+                clearance.mark_valid(wallet_address, session)
+            metrics.record_gmgn_request(url, wallet_address, i, time.perf_counter() - start, failed=False)
+            return response
+        except Exception as e:
+            logger.error(f"Failed to request url: {url}, error: {str(e)}, retry: {i}")
+            metrics.record_gmgn_request(url, wallet_address, i, time.perf_counter() - start, failed=True)
+            # 429/5xx/超时不需要重新预热，只有质询（上面已经处理）或连接异常换了新session时才需要
+            # 并发请求中只有第一个失败的请求换session
+            if response is None and async_sessions.get(wallet_address, None) is session:
+                clearance.invalidate(wallet_address)
+                await reset_async_session(wallet_address, session)
+            if i == retries - 1:
+                return None
+            continue
+        finally:
+            await release_session(session, wallet_address)
+    # 回放模式下没有可用的录制响应
+    return None
+
+
+# 步骤1：获取登录nonce
+async def get_login_nonce(wallet_address):
+    try:
+        headers = {"Content-Type": "application/json"}
+        response = await request_with_retry(
+            f"{gmgn_api_base}/defi/auth/v1/login_nonce?address={wallet_address}",
+            headers=headers,
+            wallet_address=wallet_address,
+        )
+        nonce = response.json()["data"]["nonce"]
+        return nonce
+    except Exception as error:
+        logger.info(f"获取登录nonce失败: {error}")
+        raise
+
+
+# 步骤4：发送签名
+async def login(message, signature, wallet_address):
+    payload = {
+        "message": message,
+        "signature": signature,
+    }
+    logger.info(f"发送登录请求: {payload}")
+    try:
+        headers = {"Content-Type": "application/json"}
+        response = await request_with_retry(
+            f"{gmgn_api_base}/defi/auth/v1/login",
+            headers=headers,
+            json=payload,
+            method="POST",
+            wallet_address=wallet_address,
+        )
+        response.raise_for_status()
+        result = response.json()
+        logger.info(f"登录成功, 返回结果: {result}")
+        return result
+    except Exception as error:
+        logger.info(f"登录失败: {error}")
+        return {"code": -1, "message": "登录失败"}
+
+
+async def get_gmgn_token(wallet_address, private_key):
+    logger.info(f"Get GMGN token for wallet: {wallet_address}")
+    access_token = None
+    nonce = await get_login_nonce(wallet_address)
+    message = generate_message(nonce, wallet_address)
+    signature = sign_message(message, base58.b58decode(private_key))
+    login_result = await login(message, signature, wallet_address=wallet_address)
+    if login_result["code"] == 0:
+        access_token = login_result["data"]["access_token"]
+    if access_token is None:
+        logger.info(f"Failed to get GMGN token for wallet: {wallet_address}")
+    else:
+        logger.info(f"Successfully get GMGN token for wallet: {wallet_address}")
+        access_token_dict[wallet_address] = access_token
+    return access_token
+
+
+async def get_gas_price(chain="sol"):
+    try:
+        headers = {"Content-Type": "application/json"}
+        response = await request_with_retry(
+            f"{gmgn_api_base}/defi/quotation/v1/chains/{chain}/gas_price",
+            headers=headers,
+        )
+        response.raise_for_status()
+        result = response.json()
+        if result["code"] != 0:
+            logger.info(f"获取Gas价格失败: {result}")
+            return None
+        else:
+            data = result["data"]
+            return data
+    except Exception as error:
+        logger.info(f"获取Gas价格失败: {error}")
+        return None
+
+
+async def fetch_token_info(token_address):
+    url = f"{gmgn_api_base}/defi/quotation/v1/tokens/sol/{token_address}"
+    headers = {"Content-Type": "application/json"}
+    response = await request_with_retry(url, headers=headers)
+    if response is None:
+        # 缓存是single-flight的，抛出异常让等待同一请求的调用方都失败，不缓存空结果
+        raise Exception(f"Failed to fetch token info for {token_address}")
+    token_info = response.json()
+    log.payload("gmgn original token info: {}", token_info)
+    return extract_token_info(token_info)
+
+
+token_info_cache = TokenInfoCache(fetch_token_info)
+
+
+async def get_token_info(token_address, fields=None):
+    """获取token信息（带缓存），fields为需要保证新鲜的字段，None表示全部字段"""
+    with metrics.stage("token_info"):
+        return await token_info_cache.get(token_address, fields=fields)
+
+
+async def get_token_kline(
+    token_address, start_time: datetime, end_time: datetime, resolution="1m"
+):
+    start_time_timestamp = int(start_time.timestamp())
+    end_time_timestamp = int(end_time.timestamp())
+    url = f"{gmgn_api_base}/defi/quotation/v1/tokens/kline/sol/{token_address}?resolution={resolution}&from={start_time_timestamp}&to={end_time_timestamp}"
+    headers = {"Content-Type": "application/json"}
+    response = await request_with_retry(url, headers=headers)
+
+    result = response.json() if response is not None else {}
+    if "code" in result and result["code"] == 0:
+        data = result["data"]
+        return data
+    else:
+        return []
+
+
+async def _get_account_trade_history(token_address, self_wallet_address, since_timestamp=None, stats=None):
+    access_token = await token_manager.get_token(self_wallet_address)
+    log.sampled("Get trade history for wallet: {wallet}", wallet=self_wallet_address)
+    with metrics.history_fetch(self_wallet_address):
+        return await get_trade_history(
+            token_address,
+            access_token,
+            self_wallet_address,
+            max_buys=history_max_buys,
+            since_timestamp=since_timestamp,
+            stats=stats,
+        )
+
+
+async def get_following_trade_history(token_address, now_timestamp=None, timeout=history_account_timeout):
+    """并发获取所有账号关注钱包的交易历史并合并去重
+
+    某个账号超时或出错时，只丢弃该账号的结果，返回其余账号的部分结果。
+    配置了HISTORY_HORIZON_MINUTES时，只获取now_timestamp之前这段时间内的交易。
+    """
+    since_timestamp = None
+    if history_horizon_minutes > 0 and now_timestamp is not None:
+        since_timestamp = now_timestamp - history_horizon_minutes * 60
+    wallet_addresses = list(private_key_dict.keys())
+    account_stats = [new_history_stats() for _ in wallet_addresses]
+    results = await asyncio.gather(
+        *[
+            asyncio.wait_for(
+                _get_account_trade_history(
+                    token_address,
+                    self_wallet_address,
+                    since_timestamp=since_timestamp,
+                    stats=stats,
+                ),
+                timeout=timeout,
+            )
+            for self_wallet_address, stats in zip(wallet_addresses, account_stats)
+        ],
+        return_exceptions=True,
+    )
+    histories = []
+    for self_wallet_address, result in zip(wallet_addresses, results):
+        if isinstance(result, BaseException):
+            logger.warning(
+                f"Failed to get trade history for wallet {self_wallet_address}: {result!r}"
+            )
+            continue
+        log.sampled("Length of trade history ({wallet}): {trades}", wallet=self_wallet_address, trades=len(result))
+        histories.append(result)
+    log.sampled(
+        "Trade history for {token}: {pages} pages, {bytes} bytes fetched",
+        token=token_address,
+        pages=sum(stats["pages"] for stats in account_stats),
+        bytes=sum(stats["bytes"] for stats in account_stats),
+    )
+    return merge_trade_histories(histories)
+
+
+trade_ledger = TradeLedger()
+
+
+async def get_token_trade_history(token_address, now_timestamp=None):
+    """优先从交易账本获取交易历史，账本冷启动或有缺口时通过REST获取并对账"""
+    with metrics.stage("history"):
+        if not ledger_enabled:
+            return await get_following_trade_history(token_address, now_timestamp=now_timestamp)
+        if trade_ledger.is_warm(token_address):
+            return trade_ledger.history(token_address)
+        history = await get_following_trade_history(token_address, now_timestamp=now_timestamp)
+        trade_ledger.reconcile(token_address, history)
+        return trade_ledger.history(token_address)
+
+
+def log_trade_info(trade_info):
+    """只输出摘要，完整的trade_info（包括origin_history）在LOG_PAYLOADS=1时输出"""
+    logger.info(
+        "Trade info for {token}: market cap {market_cap}, {wallets} wallets, {trades} trades",
+        token=trade_info["token_address"],
+        market_cap=trade_info["token_info"]["market_cap"],
+        wallets=trade_info["trade_history"]["all_wallets"],
+        trades=len(trade_info["origin_history"]),
+    )
+    log.payload("Total trade info: {}", trade_info)
+
+
+async def parse_token_info(data, gass_price=None):
+    """解析交易信号：先只加载当前策略过滤需要的数据，通过过滤后再加载推送需要的全部数据"""
+    log.sampled("Enter parse_token_info")
+    event = parse_follow_event(data)
+    if event is None:
+        return None
+    local_time = event["local_time"]
+    trade = EnrichedTrade(
+        event,
+        data["timestamp"],
+        load_history=get_token_trade_history,
+        load_token_info=get_token_info,
+        load_kline=get_token_kline,
+        load_gas_price=get_gas_price,
+        gass_price=gass_price,
+    )
+    if not if_filter:
+        trade_info = await trade.build(FULL_REQUIREMENTS)
+        log_trade_info(trade_info)
+        strategy_runner.record(event["token_address"], strategy_runner.run_shadows(trade_info, local_time))
+        with metrics.stage("filter"):
+            return apply_filter(trade_info, local_time)
+
+    # 当前策略和影子策略共用同一次加载的数据
+    trade_info = await trade.build(strategy_runner.requirements())
+    result, decision = strategy_runner.run_active(trade_info, local_time)
+    strategy_runner.record(event["token_address"], [decision] + strategy_runner.run_shadows(trade_info, local_time))
+    if result is None:
+        return None
+    # 保留过滤结果中的策略信息
+    filter_result = {key: value for key, value in result.items() if key not in trade_info}
+    trade_info = await trade.build(FULL_REQUIREMENTS)
+    log_trade_info(trade_info)
+    return {**trade_info, **filter_result}
+
+
+async def _follow_request(action, wallet_address, self_wallet_address, token, network, retry):
+    """follow_wallet/unfollow_wallet的公共实现，失败时重新登录并重试"""
+    access_token = access_token_dict.get(self_wallet_address, None)
+    if token != access_token:
+        token = access_token
+    url = f"{gmgn_api_base}/defi/quotation/v1/follow/sol/{action}"
+    payload = {"address": wallet_address, "network": network}
+    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
+    response = await request_with_retry(
+        url, headers=headers, json=payload, method="POST", wallet_address=self_wallet_address
+    )
+    result = response.json() if response is not None else {}
+    logger.info(f"{action} result: {result}")
+    # {"code":0,"msg":"success","data":{}}
+    if "code" in result and result["code"] == 0:
+        return True
+    logger.info(f"Failed to {action}: {result}, retry: {retry}")
+    access_token = await token_manager.refresh(self_wallet_address, stale_token=token)
+    if retry > 0:
+        return await _follow_request(
+            action, wallet_address, self_wallet_address, access_token, network, retry - 1
+        )
+    return False
+
+
+async def follow_wallet(wallet_address, self_wallet_address, token, network="sol", retry=3):
+    return await _follow_request(
+        "follow_wallet", wallet_address, self_wallet_address, token, network, retry
+    )
+
+
+async def unfollow_wallet(wallet_address, self_wallet_address, token, network="sol", retry=3):
+    return await _follow_request(
+        "unfollow_wallet", wallet_address, self_wallet_address, token, network, retry
+    )
+
+
+async def get_following_wallets(token, self_wallet_address, network="sol", retry=3):
+    access_token = access_token_dict.get(self_wallet_address, None)
+    if token != access_token:
+        token = access_token
+    url = f"{gmgn_api_base}/defi/quotation/v1/follow/{network}/following_wallets?network={network}"
+    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
+    response = await request_with_retry(url, headers=headers, wallet_address=self_wallet_address)
+
+    result = response.json() if response is not None else {}
+    address_list = []
+    if "code" in result and result["code"] == 0:
+        for wallet in result["data"]["followings"]:
+            address_list.append(wallet["address"])
+        return address_list
+    else:
+        logger.info(f"Failed to get following wallets: {result}")
+        access_token = await token_manager.refresh(self_wallet_address, stale_token=token)
+        if retry > 0:
+            return await get_following_wallets(
+                access_token, self_wallet_address, network=network, retry=retry - 1
+            )
+        else:
+            return address_list
+
+
+async def tag_wallet_state(token_address, access_token, network="sol"):
+    url = f"{gmgn_api_base}/defi/quotation/v1/tokens/tag_wallet_count/{network}/{token_address}"
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {access_token}",
+    }
+    response = await request_with_retry(url, headers=headers)
+
+    result = response.json() if response is not None else {}
+    if "code" in result and result["code"] == 0:
+        return result["data"]
+
+
+async def get_pnl_wallets(token, network="sol"):
+    url = f"{gmgn_api_base}/defi/quotation/v1/rank/{network}/wallets/7d?orderby=realized_profit_7d&direction=desc"
+    headers = {"Content-Type": "application", "Authorization": f"Bearer {token}"}
+    response = await request_with_retry(url, headers=headers)
+
+    result = response.json() if response is not None else {}
+    logger.info(f"PNL wallets: {result}")
+    return result
+
+
+def new_history_stats():
+    return {"pages": 0, "bytes": 0, "trades": 0}
+
+
+async def iter_trade_history_pages(
+    token_address,
+    token,
+    self_wallet_address,
+    network="sol",
+    filter_event: str = None,
+    cursor=None,
+    retry=3,
+    stats=None,
+):
+    """按页获取关注钱包的交易历史（最新的在前），每获取一页就yield一页
+
+    调用方可以在拿到足够数据后直接break，后续页不会再请求。
+    stats不为None时，累计记录请求的页数、字节数和交易数。
+    """
+    access_token = access_token_dict.get(self_wallet_address, None)
+    if token != access_token:
+        token = access_token
+    filter_event_ = f"&event={filter_event}" if filter_event is not None else ""
+    while True:
+        cursor_ = f"&cursor={quote(cursor)}" if cursor is not None else ""
+        url = f"{gmgn_api_base}/defi/quotation/v1/trades/{network}/{token_address}?limit=100{cursor_}{filter_event_}&maker=&following=true"
+        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
+        response = await request_with_retry(url, headers=headers, wallet_address=self_wallet_address)
+
+        result = response.json() if response is not None else {}
+
+        if "code" in result and result["code"] == 0:
+            history = result["data"]["history"]
+            if stats is not None:
+                stats["pages"] += 1
+                stats["bytes"] += len(response.content)
+                stats["trades"] += len(history)
+            yield history
+            cursor = result["data"].get("next", None)
+            if cursor is None or cursor == "":
+                return
+        else:
+            logger.info(f"Failed to get trade history: {result}, retry: {retry}")
+            if retry <= 0:
+                return
+            retry -= 1
+            token = await token_manager.refresh(self_wallet_address, stale_token=token)
+
+
+async def get_trade_history(
+    token_address,
+    token,
+    self_wallet_address,
+    network="sol",
+    filter_event: str = None,
+    cursor=None,
+    retry=3,
+    max_buys=0,
+    since_timestamp=None,
+    stats=None,
+):
+    """获取交易历史，可以提前停止分页
+
+    max_buys > 0 时，获取到最近的max_buys次买入后停止；
+    since_timestamp不为None时，获取到早于该时间的交易后停止。
+    """
+    if stats is None:
+        stats = new_history_stats()
+    history = []
+    buys = 0
+    pages = iter_trade_history_pages(
+        token_address,
+        token,
+        self_wallet_address,
+        network=network,
+        filter_event=filter_event,
+        cursor=cursor,
+        retry=retry,
+        stats=stats,
+    )
+    async for page in pages:
+        history.extend(page)
+        if max_buys > 0:
+            buys += sum(1 for trade in page if trade["event"] == "buy")
+            if buys >= max_buys:
+                break
+        if since_timestamp is not None and page and page[-1]["timestamp"] < since_timestamp:
+            break
+    # 提前结束时关闭生成器，不再请求后续页
+    await pages.aclose()
+    log.sampled(
+        "Trade history for {token} ({wallet}): {pages} pages, {bytes} bytes, {trades} trades",
+        token=token_address,
+        wallet=self_wallet_address,
+        pages=stats["pages"],
+        bytes=stats["bytes"],
+        trades=len(history),
+    )
+    return history
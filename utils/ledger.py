@@ -0,0 +1,158 @@
+from collections import OrderedDict
+from loguru import logger
+from utils.gmgn import trade_key
+from utils import clock
+from config.conf import ledger_max_tokens, ledger_resync_seconds
+
+
+def _to_float(value):
+    if value is None or value == "":
+        return None
+    return float(value)
+
+
+class TradeLedger:
+    """按token维护的关注钱包交易账本，由websocket推送的交易（包括卖出）增量更新
+
+    首次遇到某个token（冷启动）或检测到数据缺口时，才通过REST接口拉取完整历史进行对账；
+    其余时间直接从账本中得到与get_trade_history相同格式的交易历史（最新的在前）。
+    转发服务通知有上游未连接时（degraded），推送不完整，所有token都不使用账本。
+    """
+
+    def __init__(self, max_tokens=ledger_max_tokens, resync_seconds=ledger_resync_seconds):
+        self.max_tokens = max_tokens
+        self.resync_seconds = resync_seconds
+        # token_address -> {"trades": {key: trade}, "positions": {maker: {...}}, "synced_at": ts, "stale": bool}
+        self.tokens = OrderedDict()
+        self.degraded = False
+        self.stats = {"recorded": 0, "duplicates": 0, "reconciled": 0, "gaps": 0}
+
+    def _entry(self, token_address):
+        entry = self.tokens.get(token_address, None)
+        if entry is None:
+            entry = {"trades": {}, "positions": {}, "synced_at": None, "stale": True}
+            self.tokens[token_address] = entry
+            while len(self.tokens) > self.max_tokens:
+                self.tokens.popitem(last=False)
+        self.tokens.move_to_end(token_address)
+        return entry
+
+    def _mark_gap(self, token_address, entry, reason):
+        if not entry["stale"]:
+            self.stats["gaps"] += 1
+            logger.info(f"Ledger gap detected for {token_address}: {reason}")
+        entry["stale"] = True
+
+    def is_warm(self, token_address):
+        """账本是否可以直接使用：已对账、无缺口且未超过重新对账的时间"""
+        if self.degraded:
+            return False
+        entry = self.tokens.get(token_address, None)
+        if entry is None or entry["stale"] or entry["synced_at"] is None:
+            return False
+        return clock.now() - entry["synced_at"] < self.resync_seconds
+
+    def mark_all_stale(self, degraded=False):
+        """websocket重连、转发服务丢弃推送或上游断线时可能丢失推送，所有token下次使用前都需要重新对账
+
+        degraded为True时还有上游未连接，在下一次通知（上游恢复）之前账本都不可用。
+        """
+        self.degraded = degraded
+        for entry in self.tokens.values():
+            entry["stale"] = True
+
+    def _update_position(self, entry, trade):
+        maker = trade["maker"]
+        entry["positions"][maker] = {
+            "balance": _to_float(trade.get("balance")) or 0,
+            "bought_amount": _to_float(trade.get("history_bought_amount")) or 0,
+            "sold_amount": _to_float(trade.get("history_sold_amount")) or 0,
+            "timestamp": trade["timestamp"],
+        }
+
+    def _stream_event_to_trade(self, token_address, entry, data):
+        """把推送的交易转换为交易历史接口的格式，缺少仓位字段时根据该钱包上一笔交易推算"""
+        maker = data["wallet_address"]
+        event = data["event_type"]
+        trade = {
+            "maker": maker,
+            "event": event,
+            "timestamp": data["timestamp"],
+            "tx_hash": data.get("tx_hash", None),
+            "price_usd": data.get("price_usd", None),
+            "is_open_or_close": data.get("is_open_or_close", 0),
+            "token_amount": data.get("token_amount", None),
+            "cost_usd": data.get("cost_usd", None),
+        }
+        if data.get("history_bought_amount", None) is not None and data.get("balance", None) is not None:
+            trade["balance"] = data["balance"]
+            trade["history_bought_amount"] = data["history_bought_amount"]
+            trade["history_sold_amount"] = data.get("history_sold_amount", 0)
+            return trade
+
+        amount = _to_float(data.get("token_amount", None))
+        position = entry["positions"].get(maker, None)
+        is_open_or_close = int(data.get("is_open_or_close", 0) or 0)
+        if amount is None or (position is None and not (event == "buy" and is_open_or_close == 1)):
+            # 无法推算仓位，需要通过REST对账
+            return None
+        if position is None:
+            position = {"balance": 0, "bought_amount": 0, "sold_amount": 0}
+        balance = position["balance"]
+        bought_amount = position["bought_amount"]
+        sold_amount = position["sold_amount"]
+        if event == "buy":
+            balance += amount
+            bought_amount += amount
+        else:
+            sold_amount += amount
+            balance = 0 if is_open_or_close == 1 else max(balance - amount, 0)
+        trade["balance"] = balance
+        trade["history_bought_amount"] = bought_amount
+        trade["history_sold_amount"] = sold_amount
+        return trade
+
+    def record(self, data):
+        """记录一条websocket推送的交易"""
+        token_address = data["token"]["address"] if "token" in data else data["token_address"]
+        entry = self._entry(token_address)
+        trade = self._stream_event_to_trade(token_address, entry, data)
+        if trade is None:
+            self._mark_gap(token_address, entry, "position fields missing")
+            return
+        key = trade_key(trade)
+        if key in entry["trades"]:
+            self.stats["duplicates"] += 1
+            return
+        entry["trades"][key] = trade
+        position = entry["positions"].get(trade["maker"], None)
+        if position is None or trade["timestamp"] >= position["timestamp"]:
+            self._update_position(entry, trade)
+        self.stats["recorded"] += 1
+
+    def reconcile(self, token_address, history):
+        """用REST获取的完整历史对账，REST中的记录优先，保留REST快照之后才推送到的交易"""
+        entry = self._entry(token_address)
+        trades = {}
+        # 推送的交易可能没有tx_hash，同时用 钱包+时间+事件 判断是否已包含在REST结果中
+        rest_keys = set()
+        for trade in history:
+            trades[trade_key(trade)] = trade
+            rest_keys.add((trade["maker"], trade["timestamp"], trade["event"]))
+        for key, trade in entry["trades"].items():
+            if key not in trades and (trade["maker"], trade["timestamp"], trade["event"]) not in rest_keys:
+                trades[key] = trade
+        entry["trades"] = trades
+        entry["positions"] = {}
+        for trade in sorted(trades.values(), key=lambda trade: trade["timestamp"]):
+            self._update_position(entry, trade)
+        entry["synced_at"] = clock.now()
+        entry["stale"] = False
+        self.stats["reconciled"] += 1
+
+    def history(self, token_address):
+        """与get_trade_history相同格式的交易历史，最新的在前"""
+        entry = self.tokens.get(token_address, None)
+        if entry is None:
+            return []
+        return sorted(entry["trades"].values(), key=lambda trade: trade["timestamp"], reverse=True)
@@ -0,0 +1,26 @@
+"""日志辅助函数：完整数据日志和高频日志采样（配置见config.conf）
+
+消息使用loguru的 {} 占位符，只有真正输出时才格式化；关键字参数同时写入record["extra"]，LOG_JSON=1时作为结构化字段输出。
+"""
+from loguru import logger
+from config.conf import log_payloads, log_sample_every
+
+# 消息模板 -> 调用次数
+_counters = {}
+
+
+def payload(message, *args, **kwargs):
+    """完整的推送、响应、交易信息，只有LOG_PAYLOADS=1时以INFO级别输出，关闭时不做任何格式化
+
+    使用INFO而不是DEBUG，默认的LOG_LEVEL=INFO下只打开LOG_PAYLOADS即可输出；LOG_LEVELS中设为WARNING及以上的模块仍不输出。
+    """
+    if log_payloads:
+        logger.opt(depth=1).info(message, *args, **kwargs)
+
+
+def sampled(message, *args, level="INFO", **kwargs):
+    """每个事件都会输出的日志，同一个消息模板每LOG_SAMPLE_EVERY条输出一条（第一条总是输出）"""
+    count = _counters.get(message, 0)
+    _counters[message] = count + 1
+    if count % log_sample_every == 0:
+        logger.opt(depth=1).log(level, message, *args, **kwargs)
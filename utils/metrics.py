@@ -0,0 +1,163 @@
+"""Prometheus指标
+
+signal_stage_seconds按阶段记录信号处理各步骤的耗时，gmgn_*按接口和账号记录请求、重试、错误次数和耗时。
+bot在METRICS_PORT、转发服务在WALLET_SIGNAL_PORT上提供/metrics。未安装prometheus_client时所有指标为空操作。
+"""
+import time
+from contextlib import contextmanager, nullcontext
+from urllib.parse import urlsplit
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+    from prometheus_client.core import GaugeMetricFamily, REGISTRY
+except ImportError:
+    Counter = Gauge = Histogram = generate_latest = GaugeMetricFamily = REGISTRY = None
+    CONTENT_TYPE_LATEST = "text/plain; charset=utf-8"
+
+# 0.5ms ~ 30s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# 按路径识别gmgn接口，按顺序匹配第一个包含的片段（kline/tag_wallet_count在token_info之前）
+GMGN_ENDPOINTS = (
+    ("login_nonce", "/auth/v1/login_nonce"),
+    ("login", "/auth/v1/login"),
+    ("gas_price", "/gas_price"),
+    ("kline", "/tokens/kline/"),
+    ("tag_wallet_count", "/tokens/tag_wallet_count/"),
+    ("token_info", "/tokens/"),
+    ("trades", "/trades/"),
+    ("following_wallets", "/following_wallets"),
+    ("follow", "/follow/"),
+    ("rank", "/rank/"),
+)
+
+
+class _NoopMetric:
+    """未安装prometheus_client时使用的空指标"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def set_function(self, func):
+        pass
+
+    def time(self):
+        return nullcontext()
+
+
+def _metric(cls, *args, **kwargs):
+    return cls(*args, **kwargs) if cls is not None else _NoopMetric()
+
+
+STAGE_SECONDS = _metric(
+    Histogram,
+    "signal_stage_seconds",
+    "Time spent in each signal processing stage",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+HISTORY_FETCH_SECONDS = _metric(
+    Histogram,
+    "gmgn_history_fetch_seconds",
+    "Time to fetch the following trade history of a token per account",
+    ["account"],
+    buckets=LATENCY_BUCKETS,
+)
+GMGN_REQUEST_SECONDS = _metric(
+    Histogram,
+    "gmgn_request_seconds",
+    "Duration of a single gmgn HTTP attempt",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+GMGN_REQUESTS = _metric(Counter, "gmgn_requests_total", "gmgn HTTP attempts", ["endpoint", "account"])
+GMGN_RETRIES = _metric(Counter, "gmgn_retries_total", "gmgn HTTP attempts after the first", ["endpoint", "account"])
+GMGN_ERRORS = _metric(Counter, "gmgn_errors_total", "Failed gmgn HTTP attempts", ["endpoint", "account"])
+
+RELAY_SUBSCRIBERS = _metric(Gauge, "relay_subscribers", "Local websocket subscribers of the relay")
+RELAY_DROPPED = _metric(Counter, "relay_dropped_frames_total", "Frames dropped from slow subscriber queues")
+
+
+class StatsCollector:
+    """抓取时读取stats字典的当前值，每个数值字段导出为带key标签的一条记录
+
+    group_label不为None时stats为 {分组: {key: value}}，分组作为group_label标签。
+    """
+
+    def __init__(self, name, documentation, stats, group_label=None):
+        self.name = name
+        self.documentation = documentation
+        # stats为字典，或者返回字典的函数（对象延迟创建时）
+        self.stats = stats
+        self.group_label = group_label
+
+    def collect(self):
+        stats = self.stats() if callable(self.stats) else self.stats
+        if self.group_label is None:
+            groups = {None: stats or {}}
+            family = GaugeMetricFamily(self.name, self.documentation, labels=["key"])
+        else:
+            groups = stats or {}
+            family = GaugeMetricFamily(self.name, self.documentation, labels=[self.group_label, "key"])
+        for group, values in groups.items():
+            for key, value in values.items():
+                if isinstance(value, (int, float)):
+                    family.add_metric([key] if group is None else [group, key], value)
+        yield family
+
+
+def register_stats(name, documentation, stats, group_label=None):
+    """把模块内的统计字典导出为指标，例如 register_stats("enrich_pipeline_stats", "...", pipeline.stats)"""
+    if REGISTRY is not None:
+        REGISTRY.register(StatsCollector(name, documentation, stats, group_label=group_label))
+
+
+def stage(name):
+    """耗时统计的上下文管理器：with metrics.stage("prefilter"): ..."""
+    return STAGE_SECONDS.labels(stage=name).time()
+
+
+def observe_stage(name, seconds):
+    STAGE_SECONDS.labels(stage=name).observe(seconds)
+
+
+@contextmanager
+def history_fetch(account):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        HISTORY_FETCH_SECONDS.labels(account=account).observe(time.perf_counter() - start)
+
+
+def gmgn_endpoint(url):
+    path = urlsplit(url).path
+    for name, fragment in GMGN_ENDPOINTS:
+        if fragment in path:
+            return name
+    return "other"
+
+
+def record_gmgn_request(url, account, attempt, seconds, failed):
+    """记录一次gmgn请求，attempt从0开始，大于0时计为重试"""
+    endpoint = gmgn_endpoint(url)
+    account = account or "public"
+    GMGN_REQUESTS.labels(endpoint=endpoint, account=account).inc()
+    if attempt > 0:
+        GMGN_RETRIES.labels(endpoint=endpoint, account=account).inc()
+    if failed:
+        GMGN_ERRORS.labels(endpoint=endpoint, account=account).inc()
+    GMGN_REQUEST_SECONDS.labels(endpoint=endpoint).observe(seconds)
+
+
+def render():
+    """返回 (指标文本, Content-Type)"""
+    if generate_latest is None:
+        return b"# prometheus_client is not installed\n", CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
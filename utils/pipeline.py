@@ -0,0 +1,128 @@
+import asyncio
+import traceback
+from collections import deque, OrderedDict
+from loguru import logger
+from utils import clock
+
+
+class EnrichPipeline:
+    """信号处理流水线：有界缓冲 + N个异步worker
+
+    同一个token的事件串行处理（按到达顺序），不同token之间并发处理，
+    避免单个慢token阻塞其他信号、心跳以及Telegram命令。
+
+    coalesce_window大于0时按token合并：处理中到达的事件在本次处理结束后立即合并为一次处理，
+    刚处理完（window秒内）到达的事件等窗口结束后合并为一次处理，都只处理其中最新的事件
+    （交易账本已记录了全部推送，合并后的处理能看到所有新交易）。
+    """
+
+    def __init__(self, handler, workers=4, max_pending=200, coalesce_window=0):
+        self.handler = handler
+        self.workers = workers
+        self.max_pending = max_pending
+        self.coalesce_window = coalesce_window
+        # token -> 上次处理完成的时间，只保留window内的记录
+        self.last_done = OrderedDict()
+        # 待处理的token队列，同一个token在队列中最多出现一次
+        self.queue = asyncio.Queue()
+        # 每个token的待处理事件
+        self.pending = {}
+        self.pending_count = 0
+        self.tasks = []
+        self.stats = {
+            "submitted": 0,
+            "dropped": 0,
+            "processed": 0,
+            "failed": 0,
+            "coalesced": 0,
+        }
+
+    def start(self):
+        if self.tasks:
+            return
+        for i in range(self.workers):
+            self.tasks.append(asyncio.create_task(self._worker(i)))
+        logger.info(f"Enrich pipeline started with {self.workers} workers")
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def submit(self, token_address, data):
+        """提交事件，缓冲区满时丢弃该事件，返回是否成功入队"""
+        self.stats["submitted"] += 1
+        if self.pending_count >= self.max_pending:
+            self.stats["dropped"] += 1
+            logger.warning(
+                f"Enrich pipeline is full ({self.pending_count} pending), drop event for token {token_address}"
+            )
+            return False
+        self.pending_count += 1
+        if token_address in self.pending:
+            # token已在队列中或正在处理，等待当前处理结束后再处理
+            self.pending[token_address].append(data)
+        else:
+            self.pending[token_address] = deque([data])
+            delay = self._coalesce_delay(token_address)
+            if delay > 0:
+                # token刚处理完，等窗口结束后把这期间的事件合并处理
+                self._schedule(delay, token_address)
+            else:
+                self.queue.put_nowait(token_address)
+        return True
+
+    def _schedule(self, delay, token_address):
+        """delay秒后把token放入队列（回放时按录制时间释放，见replay.ReplayPipeline）"""
+        asyncio.get_running_loop().call_later(delay, self.queue.put_nowait, token_address)
+
+    def _coalesce_delay(self, token_address):
+        if self.coalesce_window <= 0:
+            return 0
+        now = clock.now()
+        while self.last_done:
+            done_at = next(iter(self.last_done.values()))
+            if now - done_at < self.coalesce_window:
+                break
+            self.last_done.popitem(last=False)
+        done_at = self.last_done.get(token_address, None)
+        if done_at is None:
+            return 0
+        return done_at + self.coalesce_window - now
+
+    def _take(self, events):
+        """取出本次要处理的事件：不合并时取最早的一个，合并时取最新的一个并丢弃其余的"""
+        if self.coalesce_window <= 0:
+            self.pending_count -= 1
+            return events.popleft()
+        data = events[-1]
+        self.pending_count -= len(events)
+        self.stats["coalesced"] += len(events) - 1
+        events.clear()
+        return data
+
+    async def _worker(self, index):
+        while True:
+            token_address = await self.queue.get()
+            events = self.pending[token_address]
+            data = self._take(events)
+            try:
+                await self.handler(data)
+                self.stats["processed"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error(f"Worker {index} failed to process token {token_address}: {e}")
+                traceback.print_exc()
+            finally:
+                if self.coalesce_window > 0:
+                    self.last_done[token_address] = clock.now()
+                    self.last_done.move_to_end(token_address)
+                if events:
+                    # 处理期间到达的事件立即重新入队，合并时_take只取最新的一个
+                    self.queue.put_nowait(token_address)
+                else:
+                    self.pending.pop(token_address, None)
+                self.queue.task_done()
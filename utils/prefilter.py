@@ -0,0 +1,104 @@
+from loguru import logger
+from utils.util import active_strategy, rule_strategy
+from config.conf import (
+    if_filter,
+    min_market_cap,
+    max_market_cap,
+    token_deny_list,
+    min_cost_usd,
+    max_cost_usd,
+)
+
+# 稳定币/wSOL，不推送
+STABLE_TOKENS = {"EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v"}
+WSOL_PREFIX = "So11111111"
+
+
+def strategy_market_cap_bounds(strategy_type):
+    """各策略可能通过的市值范围 (下限, 上限)，None表示不限
+
+    规则文件定义的策略（规则文件路径、策略2）由编译后的规则中market_cap的条件得到；
+    策略1的规则2不限制当前市值，所以不按市值预过滤。
+    """
+    rules = rule_strategy(strategy_type)
+    if rules is not None:
+        return rules.market_cap_bounds
+    if strategy_type == 1:
+        return (None, None)
+    if strategy_type == 3:
+        return (500000, None)
+    return (min_market_cap, max_market_cap if max_market_cap > 0 else None)
+
+
+def merge_market_cap_bounds(strategy_types):
+    """多个策略（当前策略+影子策略）中任意一个可能通过的市值范围"""
+    bounds = [strategy_market_cap_bounds(strategy_type) for strategy_type in strategy_types]
+    lows = [low for low, _ in bounds]
+    highs = [high for _, high in bounds]
+    low = None if any(not value for value in lows) else min(lows)
+    high = None if any(value is None for value in highs) else max(highs)
+    return (low, high)
+
+
+class PreFilter:
+    """enrichment之前的预过滤，只使用websocket推送的字段和缓存中的total_supply，不发出任何请求
+
+    拒绝：卖出信号、稳定币和黑名单token、cost_usd不在范围内、估算市值不可能通过当前策略的信号。
+    缓存中没有total_supply时无法估算市值，放行交给完整的过滤流程。
+    """
+
+    def __init__(self, token_info_cache, strategy_types=(active_strategy,)):
+        self.token_info_cache = token_info_cache
+        self.deny_list = STABLE_TOKENS | token_deny_list
+        # 影子策略也需要看到同样的信号，按所有策略的市值范围的并集过滤
+        self.market_cap_bounds = merge_market_cap_bounds(strategy_types) if if_filter else (None, None)
+        self.stats = {"passed": 0, "sell": 0, "deny_list": 0, "cost": 0, "market_cap": 0, "no_supply": 0}
+
+    def estimate_market_cap(self, token_address, data):
+        """市值 = 推送的price_usd * 缓存的total_supply，与build_trade_info的计算方式一致"""
+        token = data.get("token", None) or {}
+        total_supply = token.get("total_supply", None)
+        if total_supply is None:
+            cached = self.token_info_cache.peek(token_address, ["total_supply"])
+            if cached is None:
+                return None
+            total_supply = cached["total_supply"]
+        try:
+            return float(data["price_usd"]) * int(total_supply)
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def is_denied(self, token_address):
+        """wSOL、稳定币和黑名单token"""
+        return WSOL_PREFIX in token_address or token_address in self.deny_list
+
+    def reject_reason(self, token_address, data):
+        """返回拒绝原因，通过时返回None"""
+        if data.get("event_type", None) == "sell":
+            # 清仓/减仓信号不推送
+            return "sell"
+        if self.is_denied(token_address):
+            return "deny_list"
+        cost_usd = data.get("cost_usd", None)
+        if cost_usd is not None and (min_cost_usd > 0 or max_cost_usd > 0):
+            cost_usd = float(cost_usd)
+            if cost_usd < min_cost_usd or (max_cost_usd > 0 and cost_usd > max_cost_usd):
+                return "cost"
+        low, high = self.market_cap_bounds
+        if low or high is not None:
+            market_cap = self.estimate_market_cap(token_address, data)
+            if market_cap is None:
+                self.stats["no_supply"] += 1
+            elif (low and market_cap < low) or (high is not None and market_cap > high):
+                return "market_cap"
+        return None
+
+    def check(self, token_address, data):
+        """是否需要进入enrichment"""
+        reason = self.reject_reason(token_address, data)
+        if reason is None:
+            self.stats["passed"] += 1
+            return True
+        self.stats[reason] += 1
+        logger.debug("Prefilter rejected token {}: {}", token_address, reason)
+        return False
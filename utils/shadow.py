@@ -0,0 +1,118 @@
+import os
+import time
+import asyncio
+from datetime import datetime
+from loguru import logger
+from config.conf import shadow_strategies
+from databases.database import insert_strategy_decisions
+from utils import metrics
+from utils.gmgn import apply_filter
+from utils.util import active_strategy, filter_token, filter_requirements, merge_requirements
+
+
+def strategy_name(strategy_type):
+    """统计和记录中使用的策略名称"""
+    if isinstance(strategy_type, str):
+        return os.path.basename(strategy_type)
+    if strategy_type in (1, 2, 3):
+        return f"strategy_{strategy_type}"
+    return "default"
+
+
+class StrategyRunner:
+    """在同一次enrichment的数据上评估当前策略和影子策略
+
+    影子策略的结果只记录到数据库（strategy_decision表），不推送；每个策略统计评估次数、通过率和耗时。
+    """
+
+    def __init__(self, active=active_strategy, shadows=shadow_strategies):
+        self.active = active
+        self.shadows = [shadow for shadow in shadows if shadow != active]
+        self.strategies = [active] + self.shadows
+        self.stats = {
+            strategy_name(strategy_type): {"evaluated": 0, "passed": 0, "errors": 0, "seconds": 0.0}
+            for strategy_type in self.strategies
+        }
+
+    def requirements(self):
+        """所有策略的数据需求的并集，一次enrichment满足所有策略"""
+        return merge_requirements([filter_requirements(strategy_type) for strategy_type in self.strategies])
+
+    def _record_stats(self, name, passed, elapsed, error=False):
+        stats = self.stats[name]
+        stats["evaluated"] += 1
+        stats["seconds"] += elapsed
+        if passed:
+            stats["passed"] += 1
+        if error:
+            stats["errors"] += 1
+
+    def run_active(self, trade_info, local_time):
+        """评估当前策略，返回apply_filter的结果以及记录用的决策"""
+        name = strategy_name(self.active)
+        start = time.perf_counter()
+        try:
+            result = apply_filter(trade_info, local_time, self.active)
+        except Exception:
+            self._record_stats(name, False, time.perf_counter() - start, error=True)
+            raise
+        elapsed = time.perf_counter() - start
+        self._record_stats(name, result is not None, elapsed)
+        metrics.observe_stage("filter", elapsed)
+        rule = result.get("strategy", None) if isinstance(result, dict) else None
+        return result, (name, 0, result is not None, rule, elapsed)
+
+    def run_shadows(self, trade_info, local_time):
+        """评估影子策略，单个策略出错不影响其他策略和推送"""
+        decisions = []
+        for strategy_type in self.shadows:
+            name = strategy_name(strategy_type)
+            start = time.perf_counter()
+            try:
+                result = filter_token(trade_info, local_time, strategy_type)
+            except Exception as e:
+                self._record_stats(name, False, time.perf_counter() - start, error=True)
+                logger.warning(f"Shadow strategy {name} failed on token {trade_info['token_address']}: {e}")
+                continue
+            elapsed = time.perf_counter() - start
+            if isinstance(result, dict):
+                passed = bool(result.get("pass", False))
+                rule = result.get("strategy", None) if passed else None
+            else:
+                passed, rule = bool(result), None
+            self._record_stats(name, passed, elapsed)
+            decisions.append((name, 1, passed, rule, elapsed))
+        return decisions
+
+    def record(self, token_address, decisions):
+        """后台写入数据库，不阻塞推送"""
+        if not self.shadows or not decisions:
+            return
+        decision_time = datetime.now()
+        rows = [
+            (token_address, name, is_shadow, int(passed), rule, elapsed * 1000, decision_time)
+            for name, is_shadow, passed, rule, elapsed in decisions
+        ]
+        asyncio.create_task(self._insert(rows))
+
+    async def _insert(self, rows):
+        try:
+            await insert_strategy_decisions(rows)
+        except Exception as e:
+            logger.warning(f"Failed to record strategy decisions: {e}")
+
+    def summary(self):
+        """每个策略的评估次数、通过率和平均耗时（毫秒）"""
+        summary = {}
+        for name, stats in self.stats.items():
+            evaluated = stats["evaluated"]
+            summary[name] = {
+                "evaluated": evaluated,
+                "pass_rate": round(stats["passed"] / evaluated, 4) if evaluated else 0.0,
+                "avg_ms": round(stats["seconds"] * 1000 / evaluated, 3) if evaluated else 0.0,
+                "errors": stats["errors"],
+            }
+        return summary
+
+
+strategy_runner = StrategyRunner()
@@ -0,0 +1,223 @@
+import os
+import time
+import json
+import base64
+import asyncio
+from contextlib import contextmanager
+from loguru import logger
+try:
+    import fcntl
+except ImportError:
+    # Windows下没有fcntl，不加文件锁
+    fcntl = None
+from config.conf import (
+    access_token_dict,
+    private_key_dict,
+    token_cache_file,
+    token_refresh_ahead,
+    token_default_ttl,
+    token_login_cooldown,
+)
+
+
+def decode_token_expiry(token):
+    """从JWT中解析过期时间(exp)，无法解析时返回None"""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp", None)
+        return float(exp) if exp is not None else None
+    except Exception:
+        return None
+
+
+class AccessTokenManager:
+    """统一管理每个账号的gmgn access token
+
+    按账号记录过期时间，到期前在后台提前刷新；同一账号并发刷新时只登录一次，
+    登录失败后TOKEN_LOGIN_COOLDOWN秒内的刷新直接返回失败结果；token保存到磁盘，重启后未过期的token可以直接使用，不需要重新登录。
+    转发服务和机器人进程共用同一个token文件，写入时在文件锁内先读取并合并其他进程保存的token（同一账号保留过期时间较晚的），
+    登录前也会先读取文件，其他进程已经刷新过时直接使用。
+    """
+
+    def __init__(
+        self,
+        token_file=token_cache_file,
+        refresh_ahead=token_refresh_ahead,
+        default_ttl=token_default_ttl,
+        login_cooldown=token_login_cooldown,
+    ):
+        self.token_file = token_file
+        self.refresh_ahead = refresh_ahead
+        self.default_ttl = default_ttl
+        self.login_cooldown = login_cooldown
+        # wallet_address -> {"token": str, "expires_at": float}
+        self.tokens = {}
+        self.locks = {}
+        # wallet_address -> 最近一次登录失败的时间
+        self.last_failure_at = {}
+        self.stats = {"logins": 0, "login_failures": 0, "coalesced": 0}
+        self.load()
+
+    def load(self):
+        if not self.token_file or not os.path.exists(self.token_file):
+            return
+        self._merge(self._read_file())
+        logger.info(f"Loaded {len(self.tokens)} access tokens from {self.token_file}")
+
+    def _read_file(self):
+        """读取token文件，不存在或读取失败时返回空字典"""
+        if not self.token_file or not os.path.exists(self.token_file):
+            return {}
+        try:
+            with open(self.token_file) as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Failed to load access tokens from {self.token_file}: {e}")
+            return {}
+
+    def _merge(self, tokens):
+        """合并文件中的token，同一账号保留过期时间较晚的"""
+        now = time.time()
+        for wallet_address, item in tokens.items():
+            if wallet_address not in private_key_dict or item.get("expires_at", 0) <= now:
+                continue
+            current = self.tokens.get(wallet_address, None)
+            if current is None or item["expires_at"] > current["expires_at"]:
+                self.tokens[wallet_address] = item
+                access_token_dict[wallet_address] = item["token"]
+
+    @contextmanager
+    def _file_lock(self):
+        """进程间的token文件锁"""
+        directory = os.path.dirname(self.token_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(f"{self.token_file}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            # 关闭文件时释放锁
+            os.close(fd)
+
+    def save(self):
+        if not self.token_file:
+            return
+        tmp_file = f"{self.token_file}.tmp"
+        try:
+            with self._file_lock():
+                # 其他进程可能已经写入了其他账号或更新的token，先合并再写入
+                tokens = self._read_file()
+                self._merge(tokens)
+                now = time.time()
+                tokens = {
+                    wallet_address: item
+                    for wallet_address, item in tokens.items()
+                    if item.get("expires_at", 0) > now
+                }
+                tokens.update(self.tokens)
+                fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, "w") as f:
+                    json.dump(tokens, f)
+                os.replace(tmp_file, self.token_file)
+        except Exception as e:
+            logger.warning(f"Failed to save access tokens to {self.token_file}: {e}")
+
+    def _lock(self, wallet_address):
+        if wallet_address not in self.locks:
+            self.locks[wallet_address] = asyncio.Lock()
+        return self.locks[wallet_address]
+
+    def current(self, wallet_address):
+        item = self.tokens.get(wallet_address, None)
+        return item["token"] if item is not None else None
+
+    def is_valid(self, wallet_address):
+        item = self.tokens.get(wallet_address, None)
+        return item is not None and time.time() < item["expires_at"]
+
+    def expires_in(self, wallet_address):
+        item = self.tokens.get(wallet_address, None)
+        if item is None:
+            return 0
+        return item["expires_at"] - time.time()
+
+    async def get_token(self, wallet_address):
+        """获取有效的token，没有或已过期时登录"""
+        if self.is_valid(wallet_address):
+            return self.current(wallet_address)
+        return await self.refresh(wallet_address)
+
+    async def refresh(self, wallet_address, stale_token=None):
+        """重新登录获取token
+
+        stale_token为调用方认为失效的token；如果等待锁期间其他调用方已经换了新token，直接返回新token，
+        避免同一账号连续多次登录。最近一次登录在冷却时间内失败时不再登录，直接返回与失败时相同的结果。
+        """
+        lock = self._lock(wallet_address)
+        if lock.locked():
+            self.stats["coalesced"] += 1
+        async with lock:
+            current = self._usable(wallet_address, stale_token)
+            if current is not None:
+                return current
+            # 其他进程可能已经刷新并保存了token
+            self._merge(self._read_file())
+            current = self._usable(wallet_address, stale_token)
+            if current is not None:
+                return current
+            current = self.current(wallet_address)
+            if time.time() - self.last_failure_at.get(wallet_address, 0) < self.login_cooldown:
+                return current if self.is_valid(wallet_address) else None
+            return await self._login(wallet_address)
+
+    def _usable(self, wallet_address, stale_token=None):
+        """当前token不需要刷新时返回该token，否则返回None"""
+        current = self.current(wallet_address)
+        if current is None or not self.is_valid(wallet_address):
+            return None
+        if stale_token is None and self.expires_in(wallet_address) > self.refresh_ahead:
+            return current
+        if stale_token is not None and current != stale_token:
+            return current
+        return None
+
+    def invalidate(self, wallet_address):
+        self.tokens.pop(wallet_address, None)
+
+    async def _login(self, wallet_address):
+        from utils.gmgn_async import get_gmgn_token
+
+        self.stats["logins"] += 1
+        try:
+            token = await get_gmgn_token(wallet_address, private_key_dict[wallet_address])
+        except Exception as e:
+            logger.error(f"Failed to login wallet {wallet_address}: {e}")
+            token = None
+        if token is None:
+            self.stats["login_failures"] += 1
+            self.last_failure_at[wallet_address] = time.time()
+            return self.current(wallet_address) if self.is_valid(wallet_address) else None
+        expires_at = decode_token_expiry(token) or time.time() + self.default_ttl
+        self.tokens[wallet_address] = {"token": token, "expires_at": expires_at}
+        self.last_failure_at.pop(wallet_address, None)
+        access_token_dict[wallet_address] = token
+        self.save()
+        logger.info(f"Access token for {wallet_address} refreshed, expires in {expires_at - time.time():.0f}s")
+        return token
+
+    async def run_background_refresh(self, interval=60):
+        """后台任务：在token过期前提前刷新"""
+        while True:
+            for wallet_address in private_key_dict.keys():
+                try:
+                    if self.expires_in(wallet_address) <= self.refresh_ahead:
+                        await self.refresh(wallet_address)
+                except Exception as e:
+                    logger.error(f"Failed to refresh access token for {wallet_address}: {e}")
+            await asyncio.sleep(interval)
+
+
+token_manager = AccessTokenManager()
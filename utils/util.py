@@ -12,6 +12,7 @@ from config.conf import (
     max_ceate_time,
     min_buy_wallets,
     strategy,
+    strategy_rules_file,
 )
 
 
@@ -169,9 +170,7 @@ def filter_token_strategy_1(parsed_result, now_time):
 
     # 钱包数大于等于4，且无清仓信号，可以推送
     if trade_history["all_wallets"] >= 4 and trade_history["close_wallets"] < 1:
-        logger.info(
-            f"token: {token_id} passed regular 2. all wallets: {trade_history['all_wallets']}, close wallets: {trade_history['close_wallets']}"
-        )
+        logger.info("token: {} passed regular 2. all wallets: {}, close wallets: {}", token_id, trade_history['all_wallets'], trade_history['close_wallets'])
         return True
 
     # 市值在20k-1M之间，且如果这次买入比上次买入，价格增加了80%，可以推送
@@ -196,20 +195,14 @@ def filter_token_strategy_1(parsed_result, now_time):
         if the_last_buy_price > 0 and last_second_buy_price > 0:
             price_increase = the_last_buy_price / last_second_buy_price
             if price_increase >= 1.8:
-                logger.info(
-                    f"token: {token_id} passed regular 3. price increase: {price_increase}"
-                )
+                logger.info("token: {} passed regular 3. price increase: {}", token_id, price_increase)
                 return True
             else:
-                logger.info(
-                    f"token: {token_id} failed to filter price increase. price increase: {price_increase}"
-                )
+                logger.debug("token: {} failed to filter price increase. price increase: {}", token_id, price_increase)
                 return False
 
     else:
-        logger.info(
-            f"token: {token_id} failed to filter market cap. Market cap: {markect_cap}"
-        )
+        logger.debug("token: {} failed to filter market cap. Market cap: {}", token_id, markect_cap)
         return False
 
     return False
@@ -257,47 +250,6 @@ def judge_price_increase(parsed_result, threshold=0.75):
     return False, None, None, None, None
 
 
-def quatify_mc_and_net_change(
-    parsed_result,
-    mc_range=(0, 1e9),
-    net_in_1min_range=(0, 1e9),
-    net_in_5min_range=(0, 1e9),
-    net_in_diff_range=(0, 1e9),
-):
-    """量化市值和净流入的变化
-    其中， mc_range, net_in_1min_range, net_in_5min_range, net_in_diff_range分别是市值，1min净流入，5min净流入，5min-1min净流入的范围
-        例如: 300k以下慢拉性净流入1min净流入300-1k，5min大于3k小于5k
-        quatify_mc_and_net_change(parsed_result, mc_range=(0, 300000),
-                                        net_in_1min_range=(300, 1000), net_in_5min_range=(3000, 5000))
-    """
-    token_info = parsed_result["token_info"]
-    markect_cap = token_info["market_cap"]
-    net_in_volume_1m = token_info["net_in_volume_1m"]
-    net_in_volume_5m = token_info["net_in_volume_5m"]
-    net_in_diff = net_in_volume_5m - net_in_volume_1m
-    return (
-        markect_cap >= mc_range[0]
-        and markect_cap < mc_range[1]
-        and net_in_volume_1m >= net_in_1min_range[0]
-        and net_in_volume_1m < net_in_1min_range[1]
-        and net_in_volume_5m >= net_in_5min_range[0]
-        and net_in_volume_5m < net_in_5min_range[1]
-        and net_in_diff >= net_in_diff_range[0]
-        and net_in_diff < net_in_diff_range[1]
-    )
-
-
-def buy_and_close_judge(parsed_result, wallets_num=4):
-    """判断连续买入，不清仓，连续买入次数大于等于4"""
-    trade_history = parsed_result["trade_history"]
-    if (
-        trade_history["all_wallets"] >= wallets_num
-        and trade_history["close_wallets"] < 1
-    ):
-        return True
-    return False
-
-
 def token_safe_judge(parsed_result):
     """判断币种安全性"""
     token_info = parsed_result["token_info"]
@@ -311,225 +263,6 @@ def token_safe_judge(parsed_result):
     return False
 
 
-def filter_token_strategy_2(parsed_result, now_time):
-    """策略2"""
-    token_id = parsed_result["token_address"]
-    trade_history = parsed_result["trade_history"]
-    origin_history = parsed_result["origin_history"]
-    token_info = parsed_result["token_info"]
-    # kline = parsed_result['kline']
-    # token_create_time = datetime.strptime(token_info['create_time'], '%Y-%m-%d %H:%M:%S').astimezone(pytz.timezone(time_zone))
-    # token_open_time = datetime.strptime(
-    #     token_info["open_time"], "%Y-%m-%d %H:%M:%S"
-    # ).astimezone(pytz.timezone(time_zone))
-    launchpad = None
-    launchpad_status = 1  # launchpad_status: 0:内盘，1:外盘
-    # 钱包数大于等于2，这次信号比上次信号，价格增加了75%
-    if_price_increase, price_increase, the_last_buy_price, last_second_buy_price, first_buy_price = (
-        judge_price_increase(parsed_result)
-    )
-    
-    first_buy_mc = first_buy_price * (
-                token_info["market_cap"] / token_info["price"]
-            ) if first_buy_price is not None else None
-    
-    the_last_buy_mc = the_last_buy_price * (
-        token_info["market_cap"] / token_info["price"]
-    ) if the_last_buy_price is not None else None
-    
-    last_second_buy_mc = last_second_buy_price * (
-        token_info["market_cap"] / token_info["price"]
-    ) if last_second_buy_price is not None else None
-    
-
-    # 1. 价格上涨满足条件
-    if if_price_increase:
-        # 1.1 300k以下慢拉性净流入1min净流入300-1k，5min大于3k小于5k
-        if quatify_mc_and_net_change(
-            parsed_result,
-            mc_range=(0, 300000),
-            net_in_1min_range=(300, 1000),
-            net_in_5min_range=(3000, 5000),
-        ):
-            logger.info(
-                f"token: {token_id} passed regular 1.1 Market cap: {token_info['market_cap']}"
-            )
-            return {"pass": True, "strategy": "1.1"}
-        # 1.2 100k以下快拉性净流入1min大于3k，5min大于9k,并且5min减去1min的差值大于3.5k
-        if quatify_mc_and_net_change(
-            parsed_result,
-            mc_range=(0, 100000),
-            net_in_1min_range=(3000, 1e9),
-            net_in_5min_range=(9000, 1e9),
-            net_in_diff_range=(3500, 1e9),
-        ):
-            logger.info(
-                f"token: {token_id} passed regular 1.2 Market cap: {token_info['market_cap']}"
-            )
-            return {"pass": True, "strategy": "1.2"}
-        # 1.3 100k以上300k以下，1min净流入2k-7k，5min净流入大于6.5k小于15.5k，或者5min减去1min的差值大于12k小于20k
-        if quatify_mc_and_net_change(
-            parsed_result,
-            mc_range=(100000, 300000),
-            net_in_1min_range=(2000, 7000),
-            net_in_5min_range=(6500, 15500),
-            net_in_diff_range=(0, 1e9),
-        ) or quatify_mc_and_net_change(
-            parsed_result,
-            mc_range=(100000, 300000),
-            net_in_1min_range=(0, 1e9),
-            net_in_5min_range=(0, 1e9),
-            net_in_diff_range=(12000, 20000),
-        ):
-            logger.info(
-                f"token: {token_id} passed regular 1.3 Market cap: {token_info['market_cap']}"
-            )
-            return {"pass": True, "strategy": "1.3"}
-    logger.info(f"Failed to pass regular 1.")
-
-    # 2. 钱包数大于等于4，且无清仓信号，也过一遍上面的三个量化策略
-    if buy_and_close_judge(parsed_result):
-        # 2.1 300k以下慢拉性净流入1min净流入300-1k，5min大于3k小于5k
-        if quatify_mc_and_net_change(
-            parsed_result,
-            mc_range=(0, 300000),
-            net_in_1min_range=(300, 1000),
-            net_in_5min_range=(3000, 5000),
-        ):
-            logger.info(
-                f"token: {token_id} passed regular 2.1 Market cap: {token_info['market_cap']}"
-            )
-            return {"pass": True, "strategy": "2.1"}
-        # 2.2 100k以下快拉性净流入1min大于3k，5min大于9k,并且5min减去1min的差值大于3.5k
-        if quatify_mc_and_net_change(
-            parsed_result,
-            mc_range=(0, 100000),
-            net_in_1min_range=(3000, 1e9),
-            net_in_5min_range=(9000, 1e9),
-            net_in_diff_range=(3500, 1e9),
-        ):
-            logger.info(
-                f"token: {token_id} passed regular 2.2 Market cap: {token_info['market_cap']}"
-            )
-            return {"pass": True, "strategy": "2.2"}
-        # 2.3 100k以上300k以下，1min净流入2k-6.5k，5min净流入大于6.5k小于15k，或者5min减去1min的差值大于8.5k
-        if quatify_mc_and_net_change(
-            parsed_result,
-            mc_range=(100000, 300000),
-            net_in_1min_range=(2000, 6500),
-            net_in_5min_range=(6500, 15000),
-            net_in_diff_range=(0, 1e9),
-        ) or quatify_mc_and_net_change(
-            parsed_result,
-            mc_range=(100000, 300000),
-            net_in_1min_range=(0, 1e9),
-            net_in_5min_range=(0, 1e9),
-            net_in_diff_range=(8500, 1e9),
-        ):
-            logger.info(
-                f"token: {token_id} passed regular 2.3 Market cap: {token_info['market_cap']}"
-            )
-            return {"pass": True, "strategy": "2.3"}
-    logger.info(f"Failed to pass regular 2.")
-
-    # 3. 当前是第一个信号，且市值大于300k，满足5min-1min净流入大于10k
-    # if (
-    #     trade_history["all_wallets"] == 1
-    #     and token_info["market_cap"] >= 300000
-    #     and token_info["net_in_volume_5m"] - token_info["net_in_volume_1m"] > 10000
-    # ):
-    #     logger.info(
-    #         f"token: {token_id} passed regular 3. Market cap: {token_info['market_cap']}"
-    #     )
-    #     return {"pass": True, "strategy": "3"}
-    # logger.info(f"Failed to pass regular 3.")
-
-    # 4. 100k以下快拉性净流入1min大于3k，5min大于15k,并且5min减去1min的差值大于5k. 并且钱包数只有1个
-    if quatify_mc_and_net_change(
-        parsed_result,
-        mc_range=(0, 100000),
-        net_in_1min_range=(3000, 1e9),
-        net_in_5min_range=(15000, 1e9),
-        net_in_diff_range=(5000, 1e9),
-    ) and trade_history["all_wallets"] == 1:
-        logger.info(
-            f"token: {token_id} passed regular 4. Market cap: {token_info['market_cap']}"
-        )
-        return {"pass": True, "strategy": "4"}
-    logger.info(f"Failed to pass regular 4.")
-
-    # 5. 如果当前是第二个或者第三个信号都行，第一个信号超过100k，且当前信号相比上一个信号，价格增加了75%以上，5min>0
-    if trade_history["all_wallets"] == 2 or trade_history["all_wallets"] == 3:
-        # 计算第一个信号的市值
-        if the_last_buy_price is not None and last_second_buy_price is not None:
-            # last_second_buy_mc = last_second_buy_price * (
-            #     token_info["market_cap"] / token_info["price"]
-            # )
-            if first_buy_mc > 100000 and price_increase >= 1.75 and token_info["net_in_volume_5m"] > 0:
-                logger.info(
-                    f"token: {token_id} passed regular 5. Market cap: {token_info['market_cap']}"
-                )
-                return {"pass": True, "strategy": "5"}
-    logger.info(f"Failed to pass regular 5.")
-
-    # 6.信号超过500k，加安全性检测,限制市值在500k-2M
-    if (
-        token_info["market_cap"] >= 500000
-        and token_info["market_cap"] <= 2000000
-        and token_safe_judge(parsed_result)
-        # and trade_history["all_wallets"] <= 2
-    ):
-        # 1. 慢拉性1min<0 5min>7.5k或者0<1min<1k 5min>7.5k
-        # 2. 快拉性2k<1min 5min>5k 但是如果5min-1min>13.5k不行
-        # 3. 热度盘5min>100k
-        result_6_1 = quatify_mc_and_net_change(
-            parsed_result,
-            mc_range=(500000, 2000000),
-            net_in_1min_range=(0, 1000),
-            net_in_5min_range=(7500, 1e9),
-        )
-        result_6_2 = quatify_mc_and_net_change(
-            parsed_result,
-            mc_range=(500000, 2000000),
-            net_in_1min_range=(2000, 1e9),
-            net_in_5min_range=(5000, 1e9),
-            net_in_diff_range=(0, 13500),
-        )
-        result_6_3 = token_info["net_in_volume_5m"] > 100000
-        if result_6_1 or result_6_2 or result_6_3:
-            logger.info(
-                f"token: {token_id} passed regular 6. Market cap: {token_info['market_cap']}"
-            )
-            return {"pass": True, "strategy": "6"}
-    logger.info(f"Failed to pass regular 6.")
-    
-    # 7.前一个信号小于60k,后面一个信号大于100k进行推送
-    if the_last_buy_mc is not None and last_second_buy_mc is not None:
-        if last_second_buy_mc < 60000 and the_last_buy_mc > 100000:
-            logger.info(
-                f"token: {token_id} passed regular 7. Market cap: {token_info['market_cap']}"
-            )
-            return {"pass": True, "strategy": "7"}
-    logger.info(f"Failed to pass regular 7.")
-    
-    # 8.市值大于100k小于200k，1min净流入300-1k或者1min净流入小于等于0，5min大于3k小于5k.
-    
-    if quatify_mc_and_net_change(
-        parsed_result,
-        mc_range=(100000, 200000),
-        net_in_1min_range=(300, 1000),
-        net_in_5min_range=(3000, 5000),
-    ):
-        logger.info(
-            f"token: {token_id} passed regular 8. Market cap: {token_info['market_cap']}"
-        )
-        return {"pass": True, "strategy": "8"}
-    logger.info(f"Failed to pass regular 8.")
-    
-
-    return {"pass": False, "strategy": "None"}
-
-
 def filter_token_strategy_3(parsed_result, now_time):
     """大市值策略"""
     token_id = parsed_result["token_address"]
@@ -557,12 +290,10 @@ def filter_token_strategy_3(parsed_result, now_time):
         and float(token_info["burn_ratio"]) > 0
         and str(token_info["burn_status"]) == "burn"
     ):
-        logger.info(f"token: {token_id} passed regular 1. Market cap: {markect_cap}")
+        logger.info("token: {} passed regular 1. Market cap: {}", token_id, markect_cap)
         return True
     else:
-        logger.info(
-            f"token: {token_id} failed to filter strategy 3, part 1. Market cap: {markect_cap}"
-        )
+        logger.debug("token: {} failed to filter strategy 3, part 1. Market cap: {}", token_id, markect_cap)
 
     # 或者当前信号是第二个信号，且市值大于500k，相比上一个信号，价格增加了80%以上，安全性全通过, 5min-1min净流入大于3.5k   # token_info['net_in_volume_5m'] - token_info['net_in_volume_1m'] > 3500 and \
     if (
@@ -593,32 +324,94 @@ def filter_token_strategy_3(parsed_result, now_time):
         if the_last_buy_price > 0 and last_second_buy_price > 0:
             price_increase = the_last_buy_price / last_second_buy_price
             if price_increase >= 1.8:
-                logger.info(
-                    f"token: {token_id} passed regular 2. price increase: {price_increase}"
-                )
+                logger.info("token: {} passed regular 2. price increase: {}", token_id, price_increase)
                 return True
             else:
-                logger.info(
-                    f"token: {token_id} failed to filter price increase. price increase: {price_increase}"
-                )
+                logger.debug("token: {} failed to filter price increase. price increase: {}", token_id, price_increase)
                 return False
     else:
-        logger.info(
-            f"token: {token_id} failed to filter strategy 3, part 2. Market cap: {markect_cap}"
-        )
+        logger.debug("token: {} failed to filter strategy 3, part 2. Market cap: {}", token_id, markect_cap)
 
     return False
 
 
-def filter_token(parsed_result, now_time):
-    """简单过滤规则"""
+# 当前推送使用的策略：配置了STRATEGY_RULES_FILE时为规则文件路径，否则为STRATEGY
+# 策略可以是策略编号(int)或者规则文件路径(str)
+active_strategy = strategy_rules_file or strategy
 
-    if strategy == 1:
-        return filter_token_strategy_1(parsed_result, now_time)
 
-    elif strategy == 2:
-        return filter_token_strategy_2(parsed_result, now_time)
-    elif strategy == 3:
+def rule_strategy(strategy_type=None):
+    """规则文件定义的策略：规则文件路径直接加载，策略2使用内置的规则文件，其余返回None"""
+    # strategy.strategies依赖本模块，延迟导入
+    from strategy.strategies import get_rule_strategy, default_rules_file
+
+    if strategy_type is None:
+        strategy_type = active_strategy
+    if isinstance(strategy_type, str):
+        return get_rule_strategy(strategy_type)
+    if strategy_type == 2:
+        return get_rule_strategy(default_rules_file(strategy_type))
+    return None
+
+
+def filter_requirements(strategy_type=None):
+    """各策略过滤时需要的数据，未声明的数据在过滤阶段不会请求
+
+    history: 是否需要交易历史；token_info: 需要保证新鲜的token字段，None表示全部字段
+    """
+    if strategy_type is None:
+        strategy_type = active_strategy
+    rules = rule_strategy(strategy_type)
+    if rules is not None:
+        return rules.requirements()
+    if strategy_type == 1:
+        return {"history": True, "token_info": ("total_supply", "creation_timestamp")}
+    elif strategy_type == 3:
+        return {
+            "history": True,
+            "token_info": (
+                "total_supply",
+                "creation_timestamp",
+                "renounced_mint",
+                "renounced_freeze_account",
+                "burn_ratio",
+                "burn_status",
+            ),
+        }
+    fields = ["total_supply"]
+    if filter_dex_socials:
+        fields.append("dexscr_update_link")
+    if filter_dex_ads:
+        fields.append("dexscr_ad")
+    return {"history": min_buy_wallets > 0, "token_info": tuple(fields)}
+
+
+def merge_requirements(requirements_list):
+    """合并多个策略的数据需求，一次加载满足所有策略"""
+    history = False
+    fields = set()
+    for requirements in requirements_list:
+        history = history or requirements.get("history", False)
+        if "token_info" in requirements:
+            if requirements["token_info"] is None:
+                fields = None
+            elif fields is not None:
+                fields.update(requirements["token_info"])
+    return {"history": history, "token_info": tuple(sorted(fields)) if fields is not None else None}
+
+
+def filter_token(parsed_result, now_time, strategy_type=None):
+    """简单过滤规则，strategy_type为None时使用当前推送的策略"""
+    if strategy_type is None:
+        strategy_type = active_strategy
+
+    rules = rule_strategy(strategy_type)
+    if rules is not None:
+        return rules.evaluate(parsed_result)
+
+    if strategy_type == 1:
+        return filter_token_strategy_1(parsed_result, now_time)
+    elif strategy_type == 3:
         return filter_token_strategy_3(parsed_result, now_time)
 
     token_id = parsed_result["token_address"]
@@ -626,28 +419,20 @@ def filter_token(parsed_result, now_time):
     token_info = parsed_result["token_info"]
     # token_create_time = datetime.strptime(token_info['create_time'], '%Y-%m-%d %H:%M:%S').astimezone(pytz.timezone(time_zone))
 
-    if trade_history["all_wallets"] >= min_buy_wallets:
-        logger.info(f"token: {token_id} passwd filter min buy wallets")
+    if min_buy_wallets <= 0 or trade_history["all_wallets"] >= min_buy_wallets:
+        logger.debug("token: {} passwd filter min buy wallets", token_id)
     else:
-        logger.info(
-            f"token: {token_id} failed to filter min buy wallets, all wallets: {trade_history['all_wallets']}, min_buy_wallets: {min_buy_wallets}"
-        )
+        logger.debug("token: {} failed to filter min buy wallets, all wallets: {}, min_buy_wallets: {}", token_id, trade_history['all_wallets'], min_buy_wallets)
         return False
 
     if token_info["market_cap"] >= min_market_cap:
-        logger.info(
-            f"token: {token_id} passed filter min market cap. Market cap: {token_info['market_cap']}"
-        )
+        logger.debug("token: {} passed filter min market cap. Market cap: {}", token_id, token_info['market_cap'])
     else:
-        logger.info(
-            f"token: {token_id} failed filter min market cap. Market cap: {token_info['market_cap']}"
-        )
+        logger.debug("token: {} failed filter min market cap. Market cap: {}", token_id, token_info['market_cap'])
         return False
 
     if max_market_cap > 0 and token_info["market_cap"] > max_market_cap:
-        logger.info(
-            f"token: {token_id} passed filter max market cap. Market cap: {token_info['market_cap']}"
-        )
+        logger.debug("token: {} passed filter max market cap. Market cap: {}", token_id, token_info['market_cap'])
         return False
 
     # 过滤创建时间，旧盘不推送
@@ -657,27 +442,20 @@ def filter_token(parsed_result, now_time):
 
     if filter_dex_socials:
         if token_info["dexscr_update_link"]:
-            logger.info(
-                f"token: {token_id} passed filter dex socials. Dex socials: {token_info['dexscr_update_link']}"
-            )
+            logger.debug("token: {} passed filter dex socials. Dex socials: {}", token_id, token_info['dexscr_update_link'])
         else:
-            logger.info(
-                f"token: {token_id} failed filter dex socials. Dex socials: {token_info['dexscr_update_link']}"
-            )
+            logger.debug("token: {} failed filter dex socials. Dex socials: {}", token_id, token_info['dexscr_update_link'])
             return False
 
     if filter_dex_ads:
         if token_info["dexscr_ad"]:
-            logger.info(
-                f"token: {token_id} passed filter dex ads. Dex ads: {token_info['dexscr_ad']}"
-            )
+            logger.debug("token: {} passed filter dex ads. Dex ads: {}", token_id, token_info['dexscr_ad'])
         else:
-            logger.info(
-                f"token: {token_id} failed filter dex ads. Dex ads: {token_info['dexscr_ad']}"
-            )
+            logger.debug("token: {} failed filter dex ads. Dex ads: {}", token_id, token_info['dexscr_ad'])
             return False
 
     # ... 添加更多过滤条件
 
-    logger.info(f"token: {token_id} passed all filters.")
+    logger.info("token: {} passed all filters.", token_id)
     return True
+